@@ -0,0 +1,277 @@
+"""
+Children's Bank of Canada - Monthly Statements and Analytics
+
+Per-user monthly statements (deposit and withdrawal totals and counts,
+opening and closing balances, lowest and highest balance during the month)
+and bank-wide monthly rollups. Interest counts as a deposit and fees as a
+withdrawal. Archived months have no statements; a user's first month
+after their archive cutoff opens with the archived balance.
+
+Transactions are read as columns rather than rows: for each user, SQLite
+walks the (user_id, date) history index and packs the signed amounts,
+timestamps and IDs of their transactions into one comma-separated string
+each, so a chunk of users costs a few Python objects per user instead of
+one tuple per transaction. NumPy parses those strings into arrays, sorts
+each user's rows by (date, transaction_id) since group_concat() promises no
+order, and computes running balances, month boundaries and per-month totals
+with cumsum and reduceat.
+A bank-wide run splits the users into contiguous ID slices and folds them
+in parallel worker processes, each with its own connection.
+
+Usage:
+    python analytics.py [users.db] [--workers N] [--output rollup.json]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from bank import SIGNED_AMOUNT, connection, format_cents, get_db_name, process_pool
+
+# Users fetched from SQLite per round trip
+CHUNK_SIZE = 1000
+
+# Columns of a statement row
+FIELDS = ("user_id", "month", "deposits", "deposit_count", "withdrawals", "withdrawal_count",
+          "opening", "closing", "min_balance", "max_balance")
+
+# Columns of a rollup row
+ROLLUP_FIELDS = ("month", "deposits", "deposit_count", "withdrawals", "withdrawal_count",
+                 "active_accounts", "total_balance")
+
+
+def months_of(times):
+    """Convert an array of Unix timestamps to YYYYMM numbers."""
+    months = times.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    return (1970 + months // 12) * 100 + months % 12 + 1
+
+
+def in_order(counts, times, ids):
+    """
+    Check that every user's transactions are in (date, transaction_id) order.
+
+    Args:
+        counts: Number of transactions of each user
+        times: Unix timestamp of each transaction, one user after another
+        ids: Transaction ID of each transaction, in the same order
+    """
+    later = (times[1:] > times[:-1]) | ((times[1:] == times[:-1]) & (ids[1:] > ids[:-1]))
+    # Each user's first transaction need not follow the previous user's last
+    later[np.cumsum(counts)[:-1] - 1] = True
+    return bool(later.all())
+
+
+def fold(user_ids, counts, signed, months, opening=None):
+    """
+    Fold the transactions of a chunk of users, given as columns, into monthly statement rows.
+
+    Args:
+        user_ids: User IDs in ascending order
+        counts: Number of transactions of each user (at least one)
+        signed: Signed amounts of every user's transactions in date order,
+            one user after another
+        months: Month of each transaction as a YYYYMM number, in the same order
+        opening: Dict of user_id to the balance before their first row
+            (default: every user starts at zero)
+
+    Returns:
+        List of statement rows in FIELDS order, ordered by user and month
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    signed = np.asarray(signed, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    if not len(signed):
+        return []
+    opening = opening or {}
+    openings = np.array([opening.get(user_id, 0) for user_id in user_ids.tolist()], dtype=np.int64)
+    firsts = np.cumsum(counts) - counts
+
+    # Running balance after every transaction, restarting at each user's opening balance
+    running = np.cumsum(signed)
+    balance = running + np.repeat(openings - (running[firsts] - signed[firsts]), counts)
+
+    # A statement starts at each user's first transaction and wherever the month changes
+    starts = np.zeros(len(signed), dtype=bool)
+    starts[firsts] = True
+    starts[1:] |= months[1:] != months[:-1]
+    starts = np.flatnonzero(starts)
+
+    credit = signed > 0
+    deposits = np.add.reduceat(np.where(credit, signed, 0), starts)
+    deposit_counts = np.add.reduceat(credit.astype(np.int64), starts)
+    withdrawals = np.add.reduceat(np.where(credit, 0, -signed), starts)
+    withdrawal_counts = np.add.reduceat((~credit).astype(np.int64), starts)
+    opening_balances = balance[starts] - signed[starts]
+    closing_balances = balance[np.append(starts[1:], len(signed)) - 1]
+    min_balances = np.minimum(opening_balances, np.minimum.reduceat(balance, starts))
+    max_balances = np.maximum(opening_balances, np.maximum.reduceat(balance, starts))
+    statement_users = np.repeat(user_ids, counts)[starts]
+    statement_months = months[starts]
+    labels = {month: f"{month // 100:04d}-{month % 100:02d}" for month in np.unique(statement_months).tolist()}
+
+    return list(zip(
+        statement_users.tolist(), [labels[month] for month in statement_months.tolist()], deposits.tolist(),
+        deposit_counts.tolist(), withdrawals.tolist(), withdrawal_counts.tolist(), opening_balances.tolist(),
+        closing_balances.tolist(), min_balances.tolist(), max_balances.tolist()
+    ))
+
+
+def monthly_statements(first_user=None, end_user=None, chunk_size=CHUNK_SIZE, db_name=None):
+    """
+    Compute the monthly statements of a range of users.
+
+    Args:
+        first_user: Lowest user ID to include (default: no lower bound)
+        end_user: User ID to stop before (default: no upper bound)
+        chunk_size: Users fetched per round trip
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        List of statement rows in FIELDS order
+    """
+    conditions, params = [], []
+    if first_user is not None:
+        conditions.append('user_id >= ?')
+        params.append(first_user)
+    if end_user is not None:
+        conditions.append('user_id < ?')
+        params.append(end_user)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    statements = []
+    with connection(db_name) as conn:
+        opening = dict(conn.execute(f"SELECT user_id, balance FROM ledger_checkpoints {where}", params))
+        cursor = conn.execute(
+            f"SELECT user_id, COUNT(*), group_concat({SIGNED_AMOUNT}), group_concat(unixepoch(date)), "
+            f"group_concat(transaction_id) FROM transactions INDEXED BY idx_transactions_user_date {where} "
+            "GROUP BY user_id ORDER BY user_id", params
+        )
+        while rows := cursor.fetchmany(chunk_size):
+            user_ids, counts, *columns = zip(*rows)
+            signed, times, ids = (np.fromstring(','.join(column), dtype=np.int64, sep=',') for column in columns)
+            # group_concat() promises no order. The index walk nearly always
+            # yields (date, transaction_id) order, so only sort when it did not
+            if not in_order(counts, times, ids):
+                order = np.lexsort((ids, times, np.repeat(np.arange(len(counts)), counts)))
+                signed, times = signed[order], times[order]
+            statements.extend(fold(user_ids, counts, signed, months_of(times), opening))
+    return statements
+
+
+def monthly_statement(user_id, db_name=None):
+    """Return one user's monthly statement rows, oldest month first."""
+    return monthly_statements(int(user_id), int(user_id) + 1, db_name=db_name)
+
+
+def user_slices(count, db_name=None):
+    """
+    Split the users into at most `count` contiguous ID ranges of similar size.
+
+    Returns:
+        List of (first_user, end_user) bounds for monthly_statements(),
+        open-ended at both extremes
+    """
+    with connection(db_name) as conn:
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM users ORDER BY user_id')]
+    bounds = sorted({user_ids[len(user_ids) * i // count] for i in range(1, count)}) if user_ids else []
+    edges = [None, *bounds, None]
+    return list(zip(edges, edges[1:]))
+
+
+def _statements_for_slice(bounds, db_name):
+    first_user, end_user = bounds
+    return monthly_statements(first_user, end_user, db_name=db_name)
+
+
+def analyze(workers=None, db_name=None):
+    """
+    Compute every user's monthly statements.
+
+    Args:
+        workers: Worker processes to fold user slices in (default: one per CPU);
+            1 folds everything in this process
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        List of statement rows in FIELDS order, ordered by user and month
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return monthly_statements(db_name=db_name)
+
+    path = get_db_name(db_name)
+    statements = []
+    with process_pool(workers) as pool:
+        for rows in pool.map(_statements_for_slice, user_slices(workers, path), [path] * workers):
+            statements.extend(rows)
+    return statements
+
+
+def rollup(statements):
+    """
+    Roll statement rows up into bank-wide monthly totals.
+
+    total_balance is the sum of every account's balance at the end of the
+    month, including accounts with no activity that month.
+
+    Args:
+        statements: Statement rows ordered by user and month
+
+    Returns:
+        List of rows in ROLLUP_FIELDS order, oldest month first
+    """
+    months = {}
+    user = previous_closing = None
+    for user_id, month, deposits, deposit_count, withdrawals, withdrawal_count, _, closing, _, _ in statements:
+        if user_id != user:
+            user, previous_closing = user_id, 0
+        totals = months.get(month)
+        if totals is None:
+            totals = months[month] = [0, 0, 0, 0, 0, 0]
+        totals[0] += deposits
+        totals[1] += deposit_count
+        totals[2] += withdrawals
+        totals[3] += withdrawal_count
+        totals[4] += 1
+        # Balance change carried forward into every later month
+        totals[5] += closing - previous_closing
+        previous_closing = closing
+
+    result, total_balance = [], 0
+    for month in sorted(months):
+        totals = months[month]
+        total_balance += totals[5]
+        result.append((month, *totals[:5], total_balance))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute monthly statements and bank-wide rollups")
+    parser.add_argument('db', nargs='?', default=None, help="database file (default: users.db or $BANK_DB)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--output', help="write the rollup as JSON here instead of printing it")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    statements = analyze(args.workers, get_db_name(args.db))
+    months = rollup(statements)
+    seconds = time.perf_counter() - start
+    transactions = sum(row[3] + row[5] for row in statements)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump([dict(zip(ROLLUP_FIELDS, row)) for row in months], file, indent=2)
+    else:
+        for month, deposits, _, withdrawals, _, active, total in months:
+            print(f"{month}  deposits {format_cents(deposits):>14}  withdrawals {format_cents(withdrawals):>14}  "
+                  f"active {active:>7}  balances {format_cents(total):>16}")
+    print(f"{transactions} transactions, {len(statements)} statement rows in {seconds:.2f}s "
+          f"({transactions / seconds:.0f} transactions/s)")
+
+
+if __name__ == "__main__":
+    main()
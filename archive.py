@@ -0,0 +1,342 @@
+"""
+Children's Bank of Canada - Ledger Archive
+
+Moves old transactions out of the live database into a compressed archive
+file beside it (users.db -> users.archive.db), so history queries, backups
+and scans of the live ledger stop paying for rows that never change.
+
+Archived transactions are kept as one block per user and year: the
+block's columns (transaction IDs, types, amounts, dates) are JSON-encoded
+and zlib-compressed, at about 15 bytes per transaction. (Monthly blocks
+hold too few rows to compress well.)
+
+Transfers whose ledger rows are archived have their pairing (see the
+transfers table) moved to a transfers table in the archive file as well.
+
+For every user with archived transactions, ledger_checkpoints in the live
+database holds their net amount and count, and the cutoff the user has been
+archived up to. Ledger-based checks (the audit, daily balance rebuilds,
+statements) start from the checkpoint instead of zero. The history page,
+export and balance_as_of() paths read through to the archive when a query
+reaches back past a user's cutoff. Transactions dated before a user's
+cutoff are closed: the importer rejects them.
+
+A run works on ARCHIVE_CHUNK users at a time. Their transactions before the
+cutoff are merged into their archive blocks and committed there first, then
+deleted from the live database by transaction ID in one transaction that
+also moves the checkpoints. A run stopped between the two commits is
+finished by running it again: blocks are merged row by row, so nothing is
+archived twice, and a row already in a block is never replaced by another
+one with the same ID.
+
+Usage:
+    python archive.py CUTOFF [users.db] [--vacuum]     e.g. python archive.py 2023-01-01
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+
+from bank import CREDIT_TYPES, connection, get_connection, get_db_name
+
+# Users archived per pair of transactions
+ARCHIVE_CHUNK = 500
+
+CUTOFF_PATTERN = re.compile(r'\d{4}-\d{2}-01')
+
+# Schema of the archive file
+ARCHIVE_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS blocks(
+        user_id INTEGER,
+        year TEXT,
+        transactions INTEGER NOT NULL,
+        net INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY(user_id, year)
+    )
+    ''',
+    # Bank-wide exports read the blocks year by year
+    'CREATE INDEX IF NOT EXISTS idx_blocks_year ON blocks(year, user_id)',
+    '''
+    CREATE TABLE IF NOT EXISTS transfers(
+        debit_id INTEGER PRIMARY KEY,
+        credit_id INTEGER NOT NULL UNIQUE,
+        run_id TEXT
+    )
+    ''',
+)
+
+
+def archive_path(db_name=None):
+    """Return the archive file of a database, e.g. users.archive.db for users.db."""
+    stem, ext = os.path.splitext(get_db_name(db_name))
+    return f'{stem}.archive{ext}'
+
+
+def signed(row):
+    """Return an archived (transaction_id, user_id, transaction_type, amount, date) row's effect on the balance."""
+    return row[3] if row[2] in CREDIT_TYPES else -row[3]
+
+
+def encode_block(rows):
+    """Compress (transaction_id, user_id, transaction_type, amount, date) rows of one user into a block."""
+    columns = [[row[0] for row in rows], [row[2] for row in rows], [row[3] for row in rows], [row[4] for row in rows]]
+    return zlib.compress(json.dumps(columns, separators=(',', ':')).encode())
+
+
+def decode_block(data, user_id):
+    """Return the rows of a block, in (date, transaction_id) order."""
+    ids, types, amounts, dates = json.loads(zlib.decompress(data))
+    return [(transaction_id, user_id, transaction_type, amount, date)
+            for transaction_id, transaction_type, amount, date in zip(ids, types, amounts, dates)]
+
+
+def highest_archived_id(db_name=None):
+    """Return the highest transaction ID in a database's archive, or 0 if it has none."""
+    path = archive_path(db_name)
+    if not os.path.exists(path):
+        return 0
+    highest = 0
+    with connection(path) as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'blocks'").fetchone() is None:
+            return 0
+        for user_id, data in conn.execute('SELECT user_id, data FROM blocks'):
+            highest = max(highest, max(row[0] for row in decode_block(data, user_id)))
+    return highest
+
+
+def archived_history(user_id, through, before=None, limit=50, db_name=None):
+    """
+    Return a user's archived transactions, newest first, for a history page.
+
+    Args:
+        user_id: User's identification number
+        through: The user's cutoff from ledger_checkpoints
+        before: Keyset cursor (date, transaction_id) to continue after, or None
+        limit: Maximum number of rows
+        db_name: Live database file name (default: the configured database)
+
+    Returns:
+        List of (transaction_id, transaction_type, amount, date) rows
+    """
+    rows = []
+    year, inclusive = (before[0][:4], True) if before else (through[:4], True)
+    with connection(archive_path(db_name)) as conn:
+        while len(rows) < limit:
+            block = conn.execute(
+                f"SELECT year, data FROM blocks WHERE user_id = ? AND year {'<=' if inclusive else '<'} ? "
+                "ORDER BY year DESC LIMIT 1", (user_id, year)
+            ).fetchone()
+            if block is None:
+                break
+            for row in reversed(decode_block(block[1], user_id)):
+                if row[4] < through and (before is None or (row[4], row[0]) < tuple(before)):
+                    rows.append((row[0], *row[2:]))
+                    if len(rows) == limit:
+                        break
+            year, inclusive = block[0], False
+    return rows
+
+
+def archived_change(user_id, since, until, through, db_name=None):
+    """
+    Return the net amount of a user's archived transactions dated after `since` and at or before `until`.
+
+    Args:
+        through: The user's cutoff from ledger_checkpoints; later rows are
+            still in the live database and are not counted
+    """
+    total = 0
+    with connection(archive_path(db_name)) as conn:
+        for (data,) in conn.execute('SELECT data FROM blocks WHERE user_id = ? AND year >= ? AND year <= ?',
+                                    (user_id, since[:4], until[:4])):
+            total += sum(signed(row) for row in decode_block(data, user_id)
+                         if since < row[4] <= until and row[4] < through)
+    return total
+
+
+def iter_archived(throughs, user_id=None, start=None, end=None, db_name=None):
+    """
+    Stream archived transactions for an export, one block at a time.
+
+    Blocks are read in year order, and by user within a year, so a single
+    user's rows come out in date order.
+
+    Args:
+        throughs: Dict of user_id to cutoff, read from ledger_checkpoints in
+            the export's own read transaction; newer rows are not yielded
+        user_id: Only this user's transactions (default: everyone)
+        start: Earliest date to include (inclusive)
+        end: Date to stop at (exclusive)
+        db_name: Live database file name (default: the configured database)
+
+    Yields:
+        Lists of (transaction_id, user_id, transaction_type, amount, date) rows
+    """
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append('user_id = ?')
+        params.append(user_id)
+    if start is not None:
+        conditions.append('year >= ?')
+        params.append(start[:4])
+    if end is not None:
+        conditions.append('year <= ?')
+        params.append(end[:4])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with connection(archive_path(db_name)) as conn:
+        for block_user, data in conn.execute(f'SELECT user_id, data FROM blocks {where} ORDER BY year, user_id',
+                                             params):
+            through = throughs.get(block_user)
+            if through is None:
+                continue
+            rows = [row for row in decode_block(data, block_user) if row[4] < through
+                    and (start is None or row[4] >= start) and (end is None or row[4] < end)]
+            if rows:
+                yield rows
+
+
+def store_blocks(rows, pairs=(), db_name=None):
+    """
+    Merge rows into their users' archive blocks and commit them to the archive file.
+
+    Args:
+        rows: (transaction_id, user_id, transaction_type, amount, date) rows
+        pairs: (debit_id, credit_id, run_id) transfers rows pairing any of them
+        db_name: Live database file name (default: the configured database)
+
+    Returns:
+        Number of blocks written
+    """
+    years = {}
+    for row in rows:
+        years.setdefault((row[1], row[4][:4]), []).append(row)
+
+    with connection(archive_path(db_name), immediate=True) as conn:
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement)
+        for (user_id, year), new_rows in years.items():
+            existing = conn.execute('SELECT data FROM blocks WHERE user_id = ? AND year = ?',
+                                    (user_id, year)).fetchone()
+            # Whole rows are the key, so a row archived before is never replaced
+            merged = set(decode_block(existing[0], user_id)) if existing else set()
+            merged.update(tuple(row) for row in new_rows)
+            block = sorted(merged, key=lambda row: (row[4], row[0]))
+            conn.execute('INSERT OR REPLACE INTO blocks (user_id, year, transactions, net, data) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         (user_id, year, len(block), sum(signed(row) for row in block), encode_block(block)))
+        conn.executemany('INSERT OR IGNORE INTO transfers (debit_id, credit_id, run_id) VALUES (?, ?, ?)', pairs)
+    return len(years)
+
+
+def release_rows(rows, cutoff, pairs=(), db_name=None):
+    """
+    Delete archived rows and their transfers pairings from the live database and move their users' checkpoints.
+
+    Args:
+        rows: Rows already committed to the archive by store_blocks()
+        cutoff: Cutoff the rows were archived up to
+        pairs: Transfers rows committed to the archive with them
+        db_name: Live database file name (default: the configured database)
+    """
+    checkpoints = {}
+    for row in rows:
+        checkpoint = checkpoints.setdefault(row[1], [0, 0])
+        checkpoint[0] += signed(row)
+        checkpoint[1] += 1
+
+    with connection(db_name, immediate=True) as conn:
+        conn.executemany('DELETE FROM transactions WHERE transaction_id = ?', ((row[0],) for row in rows))
+        conn.executemany('DELETE FROM transfers WHERE debit_id = ?', ((pair[0],) for pair in pairs))
+        conn.executemany(
+            'INSERT INTO ledger_checkpoints (user_id, through, balance, transactions) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(user_id) DO UPDATE SET through = max(through, excluded.through), '
+            'balance = balance + excluded.balance, transactions = transactions + excluded.transactions',
+            ((user_id, cutoff, net, count) for user_id, (net, count) in checkpoints.items())
+        )
+
+
+def archive(cutoff, chunk_size=ARCHIVE_CHUNK, db_name=None):
+    """
+    Move every transaction dated before `cutoff` to the archive.
+
+    Args:
+        cutoff: First day of a month, "YYYY-MM-01", no later than the current month
+        chunk_size: Users archived per pair of transactions
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        Dict with the users and transactions archived, blocks written,
+        seconds, and the size of the archive file in bytes
+
+    Raises:
+        ValueError: If the cutoff is not the first day of a past or current month
+    """
+    if not isinstance(cutoff, str) or not CUTOFF_PATTERN.fullmatch(cutoff):
+        raise ValueError(f"Cutoff must be the first day of a month (YYYY-MM-01): {cutoff!r}")
+
+    began = time.perf_counter()
+    path = get_db_name(db_name)
+    with connection(path) as conn:
+        if cutoff > conn.execute("SELECT date('now', 'start of month')").fetchone()[0]:
+            raise ValueError("Cutoff cannot be later than the start of the current month")
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM users ORDER BY user_id')]
+
+    users = transactions = blocks = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        with connection(path) as conn:
+            rows = conn.execute(
+                'SELECT transaction_id, user_id, transaction_type, amount, date FROM transactions '
+                f'WHERE user_id IN ({",".join("?" * len(chunk))}) AND date < ? '
+                'ORDER BY user_id, date, transaction_id', (*chunk, cutoff)
+            ).fetchall()
+            # A transfer's two rows can belong to users in different chunks; its pairing moves with the first
+            ids = json.dumps([row[0] for row in rows])
+            pairs = conn.execute(
+                'SELECT debit_id, credit_id, run_id FROM transfers '
+                'WHERE debit_id IN (SELECT value FROM json_each(?)) OR credit_id IN (SELECT value FROM json_each(?))',
+                (ids, ids)
+            ).fetchall()
+        if not rows:
+            continue
+        blocks += store_blocks(rows, pairs, path)
+        release_rows(rows, cutoff, pairs, path)
+        users += len({row[1] for row in rows})
+        transactions += len(rows)
+
+    store = archive_path(path)
+    return {
+        'users': users,
+        'transactions': transactions,
+        'blocks': blocks,
+        'seconds': time.perf_counter() - began,
+        'archive_bytes': os.path.getsize(store) if os.path.exists(store) else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old transactions to a compressed archive file")
+    parser.add_argument('cutoff', help="archive transactions dated before this day (YYYY-MM-01)")
+    parser.add_argument('db', nargs='?', default=None, help="database file (default: users.db or $BANK_DB)")
+    parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK, help="users per transaction")
+    parser.add_argument('--vacuum', action='store_true',
+                        help="compact the live database afterwards (blocks writers while it runs)")
+    args = parser.parse_args()
+
+    db_name = get_db_name(args.db)
+    report = archive(args.cutoff, args.chunk_size, db_name)
+    print(f"Archived {report['transactions']} transactions of {report['users']} users into {report['blocks']} "
+          f"blocks in {report['seconds']:.1f}s; {archive_path(db_name)} is {report['archive_bytes']} bytes")
+    if args.vacuum:
+        get_connection(db_name).execute('VACUUM')
+        print(f"{db_name} is now {os.path.getsize(db_name)} bytes")
+
+
+if __name__ == "__main__":
+    main()
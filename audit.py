@@ -0,0 +1,162 @@
+"""
+Children's Bank of Canada - Reconciliation Audit
+
+Checks that the users table agrees with the transactions ledger:
+
+- mismatches: users whose balance differs from the sum of their ledger
+- orphans: ledger rows whose user_id has no users row (the FOREIGN KEY on
+  transactions.user_id is declared but SQLite does not enforce it)
+- negative balances
+
+The ledger is aggregated per user in one sequential scan of the
+transactions table (GROUP BY into a temporary b-tree, rather than a walk
+of the history index with a table lookup per row). On large databases the
+table is split into transaction_id ranges that worker processes aggregate
+in parallel, and their per-user sums are added together.
+
+Balances and the highest transaction_id are read together in one read
+transaction, and only ledger rows up to that ID are summed, so postings
+made while the audit runs do not show up as mismatches. Archived
+transactions (see archive.py) are counted through their users'
+checkpoints; parallel audits should not overlap an archive run, which
+moves rows out of the ranges the workers read.
+
+Usage:
+    python audit.py [users.db] [--workers N] [--output report.json]
+
+Exits with status 1 if anything was found.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from bank import SIGNED_AMOUNT, connection, format_cents, get_db_name, process_pool
+
+# Ledger rows below which the audit runs in a single process
+PARALLEL_THRESHOLD = 2000000
+
+# Problems of each kind listed in full in a report
+MAX_LISTED = 1000
+
+
+def ledger_sums(first_id, last_id, db_name=None):
+    """
+    Sum the ledger per user over a range of transaction IDs.
+
+    Args:
+        first_id: Lowest transaction_id to include
+        last_id: Highest transaction_id to include
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        Dict of user_id to (net amount in cents, ledger rows)
+    """
+    with connection(db_name) as conn:
+        return {user_id: (net, rows) for user_id, net, rows in conn.execute(
+            f'SELECT user_id, SUM({SIGNED_AMOUNT}), COUNT(*) FROM transactions NOT INDEXED '
+            'WHERE transaction_id BETWEEN ? AND ? GROUP BY user_id', (first_id, last_id)
+        )}
+
+
+def id_ranges(first_id, last_id, count):
+    """Split transaction IDs first_id..last_id into `count` contiguous (first, last) ranges."""
+    size = -(-(last_id - first_id + 1) // count)
+    return [(start, min(start + size - 1, last_id)) for start in range(first_id, last_id + 1, size)]
+
+
+def run_audit(workers=None, db_name=None):
+    """
+    Reconcile every balance against the ledger.
+
+    Args:
+        workers: Worker processes to aggregate the ledger in (default: one
+            per CPU on ledgers of PARALLEL_THRESHOLD rows or more, otherwise
+            1, which aggregates in this process)
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        Report dict with the counts of users and ledger rows checked, and
+        lists of mismatches (user_id, balance, ledger), orphans (user_id,
+        rows, net) and negative balances (user_id, balance), each cut to
+        MAX_LISTED entries with the full count alongside
+    """
+    began = time.perf_counter()
+    path = get_db_name(db_name)
+    with connection(path) as conn:
+        first_id, last_id, rows = conn.execute(
+            'SELECT COALESCE(MIN(transaction_id), 1), COALESCE(MAX(transaction_id), 0), COUNT(*) FROM transactions'
+        ).fetchone()
+        balances = dict(conn.execute('SELECT user_id, balance FROM users'))
+        # Archived transactions count through their checkpoints
+        ledger = {user_id: (net, count) for user_id, net, count
+                  in conn.execute('SELECT user_id, balance, transactions FROM ledger_checkpoints')}
+
+        if workers is None:
+            workers = (os.cpu_count() or 1) if rows >= PARALLEL_THRESHOLD else 1
+        ranges = id_ranges(first_id, last_id, workers) if last_id >= first_id else []
+        if workers == 1 or len(ranges) < 2:
+            # Summed in the same read transaction as the balances
+            partials = [ledger_sums(first, last, path) for first, last in ranges]
+
+    if workers > 1 and len(ranges) > 1:
+        with process_pool(len(ranges)) as pool:
+            partials = pool.map(ledger_sums, *zip(*ranges), [path] * len(ranges))
+    for partial in partials:
+        for user_id, (net, count) in partial.items():
+            total = ledger.get(user_id)
+            ledger[user_id] = (net, count) if total is None else (total[0] + net, total[1] + count)
+
+    mismatches = [(user_id, balance, ledger.get(user_id, (0, 0))[0]) for user_id, balance in balances.items()
+                  if balance != ledger.get(user_id, (0, 0))[0]]
+    orphans = [(user_id, count, net) for user_id, (net, count) in ledger.items() if user_id not in balances]
+    negative = [(user_id, balance) for user_id, balance in balances.items() if balance < 0]
+
+    def listed(problems):
+        problems.sort(key=lambda problem: (problem[0] is None, problem[0] or 0))
+        return {'count': len(problems), 'listed': problems[:MAX_LISTED]}
+
+    return {
+        'database': path,
+        'users': len(balances),
+        'transactions': sum(count for _, count in ledger.values()),
+        'last_transaction_id': last_id,
+        'workers': max(1, min(workers, len(ranges))),
+        'seconds': round(time.perf_counter() - began, 3),
+        'mismatches': listed(mismatches),
+        'orphans': listed(orphans),
+        'negative_balances': listed(negative),
+        'clean': not (mismatches or orphans or negative),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile account balances against the transaction ledger")
+    parser.add_argument('db', nargs='?', default=None, help="database file (default: users.db or $BANK_DB)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU on large ledgers)")
+    parser.add_argument('--output', help="also write the full report as JSON here")
+    args = parser.parse_args()
+
+    report = run_audit(args.workers, get_db_name(args.db))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    print(f"{report['database']}: {report['users']} users, {report['transactions']} transactions "
+          f"checked in {report['seconds']:.2f}s with {report['workers']} worker(s)")
+    for user_id, balance, ledger in report['mismatches']['listed']:
+        print(f"  mismatch: user {user_id} balance {format_cents(balance)}, ledger {format_cents(ledger)}")
+    for user_id, count, net in report['orphans']['listed']:
+        print(f"  orphan: {count} transactions ({format_cents(net)}) for missing user {user_id}")
+    for user_id, balance in report['negative_balances']['listed']:
+        print(f"  negative: user {user_id} balance {format_cents(balance)}")
+    print(f"{report['mismatches']['count']} mismatches, {report['orphans']['count']} users with orphaned "
+          f"transactions, {report['negative_balances']['count']} negative balances")
+    sys.exit(0 if report['clean'] else 1)
+
+
+if __name__ == "__main__":
+    main()
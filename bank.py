@@ -0,0 +1,934 @@
+"""
+Children's Bank of Canada - Data Access Layer
+
+Shared SQLite connection manager and posting engine used by every banking
+operation, money conversion helpers, plus an optional group-commit queue for high-volume posting and
+paginated transaction history, point-in-time balances, and a small
+read-through cache of account details.
+
+Instead of opening and closing a connection for each query, every thread keeps
+one long-lived connection per database file. Connections are tuned once when
+they are opened (WAL journal, relaxed fsync, larger page cache) and all work
+goes through the `connection()` context manager, which wraps it in a single
+transaction.
+
+Money is stored and passed around as integer cents. Dollar strings are
+converted with `to_cents()` where they enter the system (forms, import
+files) and back with `format_cents()` where they are shown.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import queue
+import re
+import sqlite3 as db
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+
+import instrumentation
+
+# Default database file used when no explicit path is given
+DB_NAME = os.environ.get('BANK_DB', 'users.db')
+
+# Seconds to wait on a locked database before raising
+BUSY_TIMEOUT = 5.0
+
+# Largest value an SQLite INTEGER column holds; larger amounts and IDs are rejected
+MAX_INTEGER = 2**63 - 1
+
+# Accounts kept by the read-through account cache
+ACCOUNT_CACHE_SIZE = 1024
+
+# Accepted by balance_as_of() and search_transactions()
+TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?')
+
+# Ledger entry types that add to a balance; every other type subtracts
+CREDIT_TYPES = ('Deposit', 'Interest', 'Transfer In')
+
+# SQL expression for a ledger row's effect on its user's balance
+SIGNED_AMOUNT = (f"CASE WHEN transaction_type IN ({', '.join(repr(t) for t in CREDIT_TYPES)}) "
+                 f"THEN amount ELSE -amount END")
+
+# Columns of the rows search_transactions() reads
+SEARCH_COLUMNS = ('transaction_id', 'transaction_type', 'amount', 'date')
+
+# Sort orders of search_transactions(): name -> (key columns, descending)
+SEARCH_SORTS = {
+    'newest': (('date', 'transaction_id'), True),
+    'oldest': (('date', 'transaction_id'), False),
+    'largest': (('amount', 'date', 'transaction_id'), True),
+    'smallest': (('amount', 'date', 'transaction_id'), False),
+}
+
+# Users whose daily balances are rebuilt per transaction
+SNAPSHOT_CHUNK = 500
+
+# Applied once to every new connection
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA temp_store=MEMORY',
+)
+
+_local = threading.local()
+_db_name = DB_NAME
+
+
+class BankError(Exception):
+    """Base class for errors raised by banking operations."""
+
+
+class UserNotFound(BankError):
+    """Raised when an operation refers to a user ID that does not exist."""
+
+
+class InsufficientFunds(BankError):
+    """Raised when a withdrawal is larger than the account balance."""
+
+
+class AccountCache:
+    """
+    Bounded LRU cache of (user_id, username, balance) rows, keyed by database and user ID.
+
+    Screens that only redisplay an account read it through this cache
+    instead of querying the users table each time. Every write path in this
+    process invalidates the entries it touches after committing. Writes made
+    by other processes are not seen until the entry is invalidated or
+    evicted.
+
+    A read that raced with a write is not stored: `generation` is bumped by
+    every invalidation, and `put()` drops rows read under an older one.
+    """
+
+    def __init__(self, max_size=ACCOUNT_CACHE_SIZE):
+        self.max_size = max_size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(user_id, db_name=None):
+        """Return the cache key for a user ID, or None if it is not a whole number."""
+        if isinstance(user_id, str):
+            try:
+                user_id = int(user_id)
+            except ValueError:
+                return None
+        elif not isinstance(user_id, int) or isinstance(user_id, bool):
+            return None
+        return get_db_name(db_name), user_id
+
+    def get(self, user_id, db_name=None):
+        """Return the cached row for a user, or None on a miss."""
+        key = self.key(user_id, db_name)
+        with self._lock:
+            row = self._entries.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return row
+
+    def put(self, row, generation, db_name=None):
+        """
+        Store a (user_id, username, balance) row read from the database.
+
+        Args:
+            row: The row as read
+            generation: Value of `generation` taken before the row was read
+            db_name: Database file name (default: the configured database)
+        """
+        key = self.key(row[0], db_name)
+        with self._lock:
+            if key is None or generation != self.generation:
+                return
+            self._entries[key] = tuple(row)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id, db_name=None):
+        """Drop a user's entry after their account has changed."""
+        key = self.key(user_id, db_name)
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry, e.g. after a bulk change to many accounts."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Return hits, misses, hit_rate and the current number of entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0, 'size': len(self._entries)}
+
+    def reset_stats(self):
+        """Zero the hit and miss counters."""
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+# Shared by the service layer and every write path
+account_cache = AccountCache()
+
+
+def to_cents(amount):
+    """
+    Convert a dollar amount to integer cents without going through float arithmetic.
+
+    Args:
+        amount: Dollars as a string ("12.50"), int, float or Decimal
+
+    Returns:
+        The amount in cents
+
+    Raises:
+        ValueError: If the amount is not a number, has more than two decimal places
+            or is too large to store
+    """
+    try:
+        value = Decimal(str(amount).strip())
+        cents = value.scaleb(2)
+        if not cents.is_finite() or cents != cents.to_integral_value() or abs(cents) > MAX_INTEGER:
+            raise ValueError
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid amount: {amount!r}") from None
+    return int(cents)
+
+
+def format_cents(cents):
+    """Format integer cents as a dollar string, e.g. 1250 -> "12.50"."""
+    sign = '-' if cents < 0 else ''
+    dollars, cents = divmod(abs(cents), 100)
+    return f"{sign}{dollars}.{cents:02d}"
+
+
+def check_amount(amount):
+    """Raise ValueError unless `amount` is a positive whole number of cents that SQLite can store."""
+    if not isinstance(amount, int) or isinstance(amount, bool) or not 0 < amount <= MAX_INTEGER:
+        raise ValueError("Amount must be a positive whole number of cents")
+
+
+def check_user_id(user_id):
+    """
+    Normalise a user ID given as an int or a string of digits, e.g. from a form or JSON body.
+
+    Returns:
+        The user ID as an int
+
+    Raises:
+        ValueError: If the ID is not a whole number SQLite can store
+    """
+    if isinstance(user_id, str):
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            raise ValueError(f"Invalid user ID: {user_id!r}") from None
+    if not isinstance(user_id, int) or isinstance(user_id, bool) or abs(user_id) > MAX_INTEGER:
+        raise ValueError(f"Invalid user ID: {user_id!r}")
+    return user_id
+
+
+def configure(db_name):
+    """
+    Set the database file used by default for all operations.
+
+    Args:
+        db_name: Path of the SQLite database file
+    """
+    global _db_name
+    _db_name = db_name
+
+
+def get_db_name(db_name=None):
+    """Return the database path to use, falling back to the configured default."""
+    return db_name or _db_name
+
+
+def get_connection(db_name=None):
+    """
+    Return this thread's connection to the database, opening it on first use.
+
+    Connections run in autocommit mode so transactions are controlled
+    explicitly by `connection()`, and are instrumented if query
+    instrumentation is enabled when they are opened.
+
+    Args:
+        db_name: Database file name (default: the configured database)
+    """
+    path = get_db_name(db_name)
+    connections = _local.__dict__.setdefault('connections', {})
+    conn = connections.get(path)
+    if conn is None:
+        conn = db.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                          factory=instrumentation.connection_factory())
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        connections[path] = conn
+    return conn
+
+
+def close_connections():
+    """Close every connection held by the current thread."""
+    connections = _local.__dict__.pop('connections', {})
+    for conn in connections.values():
+        conn.close()
+
+
+def process_pool(workers):
+    """
+    Return a ProcessPoolExecutor for fanning database work out over processes.
+
+    Workers are spawned rather than forked, so they never inherit (and
+    later close) this process's pooled SQLite connections; each opens its
+    own on first use.
+
+    Args:
+        workers: Number of worker processes
+    """
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+@contextmanager
+def connection(db_name=None, immediate=False):
+    """
+    Provide a pooled connection wrapped in a transaction.
+
+    The transaction is committed when the block exits normally and rolled
+    back if it raises. Nested blocks on the same database join the outer
+    transaction.
+
+    Args:
+        db_name: Database file name (default: the configured database)
+        immediate: Take the write lock up front (BEGIN IMMEDIATE)
+    """
+    conn = get_connection(db_name)
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def hash_password(password):
+    """Hash a password using SHA-256 for secure storage."""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def create_db(db_name=None):
+    """
+    Initialize the SQLite database, bringing its schema up to the latest version.
+    Tables:
+    - users: Stores user account information, with the balance in cents
+    - transactions: Stores transaction history in cents, indexed for per-user history pages
+
+    The schema changes themselves are registered in migrations.py. When the
+    database is already current this costs a single PRAGMA read.
+
+    Args:
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        List of (version, description, seconds) for the migrations applied
+    """
+    # Imported here because migrations.py is built on this module
+    import migrations
+
+    if migrations.current_version(db_name) >= migrations.latest_version():
+        return []
+    return migrations.upgrade(db_name)
+
+
+def apply_posting(conn, user_id, transaction_type, amount):
+    """
+    Apply one posting on a connection that is already inside a transaction.
+
+    The balance is changed in SQL so concurrent postings can never overwrite
+    each other, and withdrawals only succeed while the balance covers them.
+    The user's closing balance for today in daily_balances is set to the new
+    balance.
+
+    Args:
+        conn: Connection with an open write transaction
+        user_id: User's identification number
+        transaction_type: "Deposit" or "Withdraw"
+        amount: Positive amount to post, in cents
+
+    Returns:
+        The new account balance, in cents
+    """
+    if transaction_type == 'Deposit':
+        rows = conn.execute(
+            'UPDATE users SET balance = balance + ? WHERE user_id = ? RETURNING balance',
+            (amount, user_id)
+        ).fetchall()
+    elif transaction_type == 'Withdraw':
+        rows = conn.execute(
+            'UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ? RETURNING balance',
+            (amount, user_id, amount)
+        ).fetchall()
+    else:
+        raise ValueError(f"Unknown transaction type: {transaction_type}")
+
+    if not rows:
+        if conn.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,)).fetchone() is None:
+            raise UserNotFound(user_id)
+        raise InsufficientFunds(user_id)
+
+    balance = rows[0][0]
+    date = conn.execute(
+        "INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, datetime('now')) "
+        "RETURNING date",
+        (user_id, transaction_type, amount)
+    ).fetchone()[0]
+    conn.execute(
+        'INSERT INTO daily_balances (user_id, day, balance) VALUES (?, ?, ?) '
+        'ON CONFLICT(user_id, day) DO UPDATE SET balance = excluded.balance',
+        (user_id, date[:10], balance)
+    )
+    return balance
+
+
+def post_transaction(user_id, transaction_type, amount, db_name=None):
+    """
+    Post a deposit or withdrawal as a single atomic transaction.
+
+    The balance update and the ledger entry are written under one
+    BEGIN IMMEDIATE transaction, so each posting costs a single commit.
+
+    Args:
+        user_id: User's identification number
+        transaction_type: "Deposit" or "Withdraw"
+        amount: Positive amount to post, in cents
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        The new account balance, in cents
+
+    Raises:
+        ValueError: If the amount is not a positive number of cents or the type is unknown
+        UserNotFound: If the user does not exist
+        InsufficientFunds: If a withdrawal exceeds the balance
+    """
+    check_amount(amount)
+
+    try:
+        with connection(db_name, immediate=True) as conn:
+            return apply_posting(conn, user_id, transaction_type, amount)
+    finally:
+        account_cache.invalidate(user_id, db_name)
+
+
+def transfer(from_id, to_id, amount, db_name=None):
+    """
+    Move money from one account to another as a single atomic transaction.
+
+    The payer's balance is debited with a conditional UPDATE before anything
+    else is written, then the payee is credited. Both ledger rows ("Transfer
+    Out" and "Transfer In"), their pairing in transfers and both users'
+    closing balances for the day are written under the same BEGIN IMMEDIATE
+    transaction, so a transfer is applied entirely or not at all.
+
+    Args:
+        from_id: User ID of the payer
+        to_id: User ID of the payee
+        amount: Positive amount to move, in cents
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (payer's new balance, payee's new balance), in cents
+
+    Raises:
+        ValueError: If the amount is not a positive number of cents, a user ID
+            is not a whole number or both users are the same
+        UserNotFound: If either user does not exist
+        InsufficientFunds: If the payer's balance does not cover the amount
+    """
+    check_amount(amount)
+    # '5' and 5 are the same account
+    from_id, to_id = check_user_id(from_id), check_user_id(to_id)
+    if from_id == to_id:
+        raise ValueError("Cannot transfer to the same account")
+
+    try:
+        with connection(db_name, immediate=True) as conn:
+            rows = conn.execute(
+                'UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ? RETURNING balance',
+                (amount, from_id, amount)
+            ).fetchall()
+            if not rows:
+                if conn.execute('SELECT 1 FROM users WHERE user_id = ?', (from_id,)).fetchone() is None:
+                    raise UserNotFound(from_id)
+                raise InsufficientFunds(from_id)
+            payee = conn.execute('UPDATE users SET balance = balance + ? WHERE user_id = ? RETURNING balance',
+                                 (amount, to_id)).fetchone()
+            if payee is None:
+                # Rolls back the debit with the rest of the transaction
+                raise UserNotFound(to_id)
+
+            date = conn.execute("SELECT datetime('now')").fetchone()[0]
+            entries = [conn.execute('INSERT INTO transactions (user_id, transaction_type, amount, date) '
+                                    'VALUES (?, ?, ?, ?) RETURNING transaction_id',
+                                    (user_id, transaction_type, amount, date)).fetchone()[0]
+                       for user_id, transaction_type in ((from_id, 'Transfer Out'), (to_id, 'Transfer In'))]
+            conn.execute('INSERT INTO transfers (debit_id, credit_id) VALUES (?, ?)', entries)
+            conn.executemany(
+                'INSERT INTO daily_balances (user_id, day, balance) VALUES (?, ?, ?) '
+                'ON CONFLICT(user_id, day) DO UPDATE SET balance = excluded.balance',
+                ((from_id, date[:10], rows[0][0]), (to_id, date[:10], payee[0]))
+            )
+            return rows[0][0], payee[0]
+    finally:
+        account_cache.invalidate(from_id, db_name)
+        account_cache.invalidate(to_id, db_name)
+
+
+def transaction_history_page(user_id, page_size=50, cursor=None, db_name=None):
+    """
+    Fetch one page of a user's transaction history, newest first.
+
+    Pages are keyset-paginated on (date, transaction_id) and served from the
+    idx_transactions_user_date index, so every page costs the same no matter
+    how large the ledger is or how deep the user has scrolled. Once the live
+    rows run out, pages carry on into the user's archived transactions.
+
+    Args:
+        user_id: User's identification number
+        page_size: Maximum number of rows to return
+        cursor: Cursor returned with the previous page, or None for the first page
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (rows, next_cursor) where rows are (transaction_type, amount in cents, date)
+        tuples and next_cursor is None once the history is exhausted
+    """
+    with connection(db_name) as conn:
+        if cursor is None:
+            rows = conn.execute(
+                'SELECT transaction_id, transaction_type, amount, date FROM transactions '
+                'WHERE user_id = ? ORDER BY date DESC, transaction_id DESC LIMIT ?',
+                (user_id, page_size + 1)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                'SELECT transaction_id, transaction_type, amount, date FROM transactions '
+                'WHERE user_id = ? AND (date, transaction_id) < (?, ?) '
+                'ORDER BY date DESC, transaction_id DESC LIMIT ?',
+                (user_id, *cursor, page_size + 1)
+            ).fetchall()
+        checkpoint = None
+        if len(rows) <= page_size:
+            checkpoint = conn.execute('SELECT through FROM ledger_checkpoints WHERE user_id = ?',
+                                      (user_id,)).fetchone()
+
+    if checkpoint is not None:
+        # Imported here because archive.py is built on this module
+        import archive
+        before = (rows[-1][3], rows[-1][0]) if rows else cursor
+        rows += archive.archived_history(user_id, checkpoint[0], before, page_size + 1 - len(rows), db_name)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][3], rows[-1][0])
+    return [row[1:] for row in rows], next_cursor
+
+
+def change_marker(db_name=None):
+    """
+    Return a value that changes whenever a write commits to the database.
+
+    Combines PRAGMA data_version, which moves when another connection
+    commits, with this thread's connection's own change count. The pragma
+    reads no table or index, so open views can poll it often and run no
+    other query while the database is idle.
+
+    Args:
+        db_name: Database file name (default: the configured database)
+    """
+    conn = get_connection(db_name)
+    return conn.execute('PRAGMA data_version').fetchone()[0], conn.total_changes
+
+
+def latest_transaction_id(db_name=None):
+    """Return the highest transaction ID in the ledger, or 0 if it is empty."""
+    with connection(db_name) as conn:
+        return conn.execute('SELECT COALESCE(MAX(transaction_id), 0) FROM transactions').fetchone()[0]
+
+
+def transactions_since(user_id, last_seen, db_name=None):
+    """
+    Return a user's balance and their transactions committed after a known transaction ID.
+
+    Transaction IDs are AUTOINCREMENT (schema migration 8) and rows are only
+    inserted under the write lock, so IDs grow in commit order and are never
+    handed out again after archiving; the rows above `last_seen` are exactly
+    the ones an open view has not shown yet. They are found with a
+    range scan of the primary key from `last_seen`, filtering on the user as
+    it goes, which costs as much as the bank-wide postings since the last
+    call rather than the size of the user's history.
+
+    Args:
+        user_id: User's identification number
+        last_seen: Highest transaction ID already shown, from
+            latest_transaction_id() or the previous call
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (balance, rows, last_seen) where rows are (transaction_id,
+        transaction_type, amount in cents, date) in ID order and last_seen is
+        the value to pass next time
+
+    Raises:
+        UserNotFound: If the user does not exist
+    """
+    with connection(db_name) as conn:
+        user = conn.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        if user is None:
+            raise UserNotFound(user_id)
+        # The unary + keeps the planner off the user_id indexes
+        rows = conn.execute(
+            'SELECT transaction_id, transaction_type, amount, date FROM transactions '
+            'WHERE transaction_id > ? AND +user_id = ? ORDER BY transaction_id', (last_seen, user_id)
+        ).fetchall()
+        latest = conn.execute('SELECT MAX(transaction_id) FROM transactions').fetchone()[0]
+    return user[0], rows, max(last_seen, latest or 0)
+
+
+def search_query(user_id, transaction_type=None, start=None, end=None, min_amount=None, max_amount=None,
+                 sort='newest', page_size=50, cursor=None):
+    """
+    Build the SQL of one page of a live-ledger search; see search_transactions().
+
+    Returns:
+        (sql, params) selecting (transaction_id, transaction_type, amount, date)
+        rows, one more than `page_size` if there are further results
+
+    Raises:
+        ValueError: If the sort order or a date is not recognised
+    """
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f"Unknown sort order: {sort!r}")
+    for timestamp in (start, end):
+        if timestamp is not None and (not isinstance(timestamp, str) or not TIMESTAMP_PATTERN.fullmatch(timestamp)):
+            raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    keys, descending = SEARCH_SORTS[sort]
+
+    conditions, params = ['user_id = ?'], [user_id]
+    for condition, value in (('transaction_type = ?', transaction_type), ('date >= ?', start), ('date < ?', end),
+                             ('amount >= ?', min_amount), ('amount <= ?', max_amount)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    if cursor is not None:
+        conditions.append(f"({', '.join(keys)}) {'<' if descending else '>'} ({', '.join('?' * len(keys))})")
+        params.extend(cursor)
+    order = ', '.join(f"{key}{' DESC' if descending else ''}" for key in keys)
+    sql = (f"SELECT {', '.join(SEARCH_COLUMNS)} FROM transactions "
+           f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?")
+    return sql, (*params, page_size + 1)
+
+
+def search_transactions(user_id, transaction_type=None, start=None, end=None, min_amount=None, max_amount=None,
+                        sort='newest', page_size=50, cursor=None, db_name=None):
+    """
+    Search one user's transactions by type, date range and amount range.
+
+    Each combination of filters is answered from one of the covering
+    indexes added by migration 6, without reading the table rows. Pages are
+    keyset-paginated on the sort order's columns, so a page deep into the
+    results costs the same as the first. Archived transactions that match
+    are included.
+
+    Args:
+        user_id: User's identification number
+        transaction_type: Only transactions of this type, e.g. "Deposit" (default: every type)
+        start: Earliest date to include, "YYYY-MM-DD[ HH:MM:SS]" (inclusive)
+        end: Date to stop at (exclusive)
+        min_amount: Smallest amount to include, in cents
+        max_amount: Largest amount to include, in cents
+        sort: One of SEARCH_SORTS
+        page_size: Maximum number of rows to return
+        cursor: Cursor returned with the previous page, or None for the first page
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (rows, next_cursor) where rows are (transaction_type, amount in cents, date)
+        tuples and next_cursor is None once the results are exhausted
+
+    Raises:
+        ValueError: If the sort order or a date is not recognised
+    """
+    sql, params = search_query(user_id, transaction_type, start, end, min_amount, max_amount, sort, page_size,
+                               cursor)
+    keys, descending = SEARCH_SORTS[sort]
+    with connection(db_name) as conn:
+        rows = conn.execute(sql, params).fetchall()
+        checkpoint = conn.execute('SELECT through FROM ledger_checkpoints WHERE user_id = ?',
+                                  (user_id,)).fetchone()
+
+    def key(row):
+        return tuple(row[SEARCH_COLUMNS.index(column)] for column in keys)
+
+    # Archived rows all predate the live ones, so newest-first pages only
+    # need them once the live results run out
+    if (checkpoint is not None and (start is None or start < checkpoint[0])
+            and not (keys[0] == 'date' and descending and len(rows) > page_size)):
+        import archive  # built on this module
+        after = tuple(cursor) if cursor is not None else None
+        for block in archive.iter_archived({user_id: checkpoint[0]}, user_id, start, end, db_name):
+            rows += [row for row in ((row[0], *row[2:]) for row in block)
+                     if (transaction_type is None or row[1] == transaction_type)
+                     and (min_amount is None or row[2] >= min_amount)
+                     and (max_amount is None or row[2] <= max_amount)
+                     and (after is None or (key(row) < after if descending else key(row) > after))]
+        rows.sort(key=key, reverse=descending)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = key(rows[-1])
+    return [row[1:] for row in rows], next_cursor
+
+
+def balance_as_of(user_id, timestamp, db_name=None):
+    """
+    Return a user's balance at a point in time.
+
+    Starts from the user's closing balance on the latest day before the
+    requested one in daily_balances, and adds up only the transactions
+    after it, so the cost does not grow with the length of the history.
+    Transactions that have been archived are read from the archive.
+
+    Args:
+        user_id: User's identification number
+        timestamp: "YYYY-MM-DD HH:MM:SS" (UTC, inclusive), or "YYYY-MM-DD"
+            for the close of that day
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        The balance in cents after every transaction dated at or before `timestamp`
+
+    Raises:
+        ValueError: If the timestamp is not in one of the formats above
+        UserNotFound: If the user does not exist
+    """
+    if not isinstance(timestamp, str) or not TIMESTAMP_PATTERN.fullmatch(timestamp):
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    if len(timestamp) == 10:
+        timestamp += ' 23:59:59'
+    day = timestamp[:10]
+
+    with connection(db_name) as conn:
+        if conn.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,)).fetchone() is None:
+            raise UserNotFound(user_id)
+        checkpoint = conn.execute(
+            'SELECT day, balance FROM daily_balances WHERE user_id = ? AND day < ? ORDER BY day DESC LIMIT 1',
+            (user_id, day)
+        ).fetchone()
+        since, balance = (f'{checkpoint[0]} 24', checkpoint[1]) if checkpoint else ('', 0)
+        change = conn.execute(
+            f'SELECT COALESCE(SUM({SIGNED_AMOUNT}), 0) '
+            'FROM transactions WHERE user_id = ? AND date > ? AND date <= ?',
+            (user_id, since, timestamp)
+        ).fetchone()[0]
+        checkpoint = conn.execute('SELECT through FROM ledger_checkpoints WHERE user_id = ?',
+                                  (user_id,)).fetchone()
+
+    if checkpoint is not None and since < checkpoint[0]:
+        import archive
+        change += archive.archived_change(user_id, since, timestamp, checkpoint[0], db_name)
+    return balance + change
+
+
+def invalidate_balance_snapshots(conn, first_days):
+    """
+    Drop daily closing balances made stale by backdated transactions.
+
+    balance_as_of() stays correct without them, replaying from an earlier
+    snapshot instead; rebuild_balance_snapshots() puts them back.
+
+    Args:
+        conn: Connection with an open write transaction
+        first_days: Dict of user_id to the earliest day ("YYYY-MM-DD") changed
+    """
+    conn.executemany('DELETE FROM daily_balances WHERE user_id = ? AND day >= ?', first_days.items())
+
+
+def rebuild_balance_snapshots(user_ids=None, db_name=None):
+    """
+    Recompute daily closing balances from the ledger.
+
+    Users are processed SNAPSHOT_CHUNK at a time, each chunk in its own
+    short write transaction. For users with archived transactions only the
+    days from their archive cutoff on are rebuilt, starting from the
+    checkpoint balance.
+
+    Args:
+        user_ids: Users to rebuild (default: everyone)
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        Number of snapshot rows written
+    """
+    if user_ids is None:
+        with connection(db_name) as conn:
+            user_ids = [row[0] for row in conn.execute('SELECT user_id FROM users ORDER BY user_id')]
+    else:
+        user_ids = sorted(user_ids)
+
+    written = 0
+    for start in range(0, len(user_ids), SNAPSHOT_CHUNK):
+        chunk = user_ids[start:start + SNAPSHOT_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        with connection(db_name, immediate=True) as conn:
+            conn.execute(f'''
+                DELETE FROM daily_balances WHERE user_id IN ({placeholders}) AND day >= COALESCE(
+                    (SELECT through FROM ledger_checkpoints WHERE user_id = daily_balances.user_id), '')
+            ''', chunk)
+            written += conn.execute(f'''
+                INSERT INTO daily_balances (user_id, day, balance)
+                SELECT days.user_id, day,
+                       COALESCE(checkpoint.balance, 0) + SUM(net) OVER (PARTITION BY days.user_id ORDER BY day)
+                FROM (
+                    SELECT user_id, substr(date, 1, 10) AS day,
+                           SUM({SIGNED_AMOUNT}) AS net
+                    FROM transactions WHERE user_id IN ({placeholders}) AND date >= COALESCE(
+                        (SELECT through FROM ledger_checkpoints WHERE user_id = transactions.user_id), '')
+                    GROUP BY user_id, day
+                ) AS days LEFT JOIN ledger_checkpoints AS checkpoint ON checkpoint.user_id = days.user_id
+            ''', chunk).rowcount
+    return written
+
+
+class PostingQueue:
+    """
+    Group-commit writer for high-volume posting.
+
+    Callers submit postings from any thread and get a Future back. A single
+    writer thread drains the queue and commits each batch in one transaction,
+    so many postings share the cost of one commit. A batch is closed when it
+    reaches `max_batch` postings or `max_latency` seconds after its first one.
+
+    Usage:
+        with PostingQueue() as postings:
+            new_balance = postings.submit(1, "Deposit", 50).result()
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_name=None, max_batch=256, max_latency=0.001):
+        """
+        Start the writer thread.
+
+        Args:
+            db_name: Database file name (default: the configured database)
+            max_batch: Largest number of postings committed together
+            max_latency: Longest time in seconds a posting waits for its batch
+        """
+        self.db_name = get_db_name(db_name)
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="posting-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, user_id, transaction_type, amount):
+        """
+        Queue a posting.
+
+        Args:
+            user_id: User's identification number
+            transaction_type: "Deposit" or "Withdraw"
+            amount: Positive amount to post, in cents
+
+        Returns:
+            A Future resolving to the new balance, or raising the same errors
+            as post_transaction()
+        """
+        check_amount(amount)
+        future = Future()
+        self._queue.put((future, (user_id, transaction_type, amount)))
+        return future
+
+    def close(self):
+        """Commit everything already submitted and stop the writer thread."""
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        """Writer loop: collect a batch, commit it, repeat until stopped."""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+        close_connections()
+
+    def _commit(self, batch):
+        """Apply a batch in one transaction and resolve its futures."""
+        results = []
+        try:
+            with connection(self.db_name, immediate=True) as conn:
+                for future, posting in batch:
+                    try:
+                        results.append((future, apply_posting(conn, *posting), None))
+                    except (BankError, ValueError) as e:
+                        results.append((future, None, e))
+        except Exception as e:
+            for future, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            for _, posting in batch:
+                account_cache.invalidate(posting[0], self.db_name)
+
+        for future, balance, error in results:
+            if error is None:
+                future.set_result(balance)
+            else:
+                future.set_exception(error)
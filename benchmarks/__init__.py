@@ -0,0 +1,6 @@
+"""
+Performance benchmarks for the Children's Bank of Canada application.
+
+Run a benchmark as a module from the project root, for example:
+    python -m benchmarks.posting
+"""
@@ -0,0 +1,103 @@
+"""
+Seeded synthetic data generator.
+
+Fills a database with users and a transaction ledger at a configurable
+scale. The same seed always produces the same data, so benchmark runs on
+different commits are comparable. Every user's balance equals the sum of
+their ledger, and withdrawals never overdraw an account.
+
+Usage:
+    python -m benchmarks.generate bench.db [--users 10000] [--transactions 1000000] [--seed 42]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import bank
+
+# Ledger rows inserted per transaction
+BATCH_SIZE = 50000
+
+# Generated dates fall within this many days before START_DATE
+DAYS = 730
+START_DATE = datetime(2024, 1, 1)
+
+
+def password_for(user_id):
+    """The password given to a generated user."""
+    return f'pw{user_id}'
+
+
+def generate(db_name, users=10000, transactions=1000000, seed=42):
+    """
+    Create the schema and fill it with synthetic users and transactions.
+
+    Args:
+        db_name: Database file to fill (should be new or empty)
+        users: Number of users, with IDs 1..users
+        transactions: Number of ledger rows
+        seed: Random seed
+    """
+    rng = random.Random(seed)
+    bank.create_db(db_name)
+    conn = bank.get_connection(db_name)
+
+    with bank.connection(db_name, immediate=True):
+        conn.executemany(
+            'INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)',
+            ((user_id, f'user{user_id}', bank.hash_password(password_for(user_id)))
+             for user_id in range(1, users + 1))
+        )
+
+    balances = [0] * (users + 1)
+    checkpoint_interval = conn.execute('PRAGMA wal_autocheckpoint').fetchone()[0]
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    try:
+        for start in range(0, transactions, BATCH_SIZE):
+            rows = []
+            for _ in range(min(BATCH_SIZE, transactions - start)):
+                user_id = rng.randint(1, users)
+                amount = rng.randint(1, 50000)
+                if rng.random() < 0.35 and balances[user_id] >= amount:
+                    transaction_type = "Withdraw"
+                    balances[user_id] -= amount
+                else:
+                    transaction_type = "Deposit"
+                    balances[user_id] += amount
+                date = START_DATE - timedelta(seconds=rng.randrange(DAYS * 86400))
+                rows.append((user_id, transaction_type, amount, date.strftime('%Y-%m-%d %H:%M:%S')))
+
+            # Insert in index order, which is much faster than random order
+            rows.sort(key=lambda row: (row[0], row[3]))
+            with bank.connection(db_name, immediate=True):
+                conn.executemany(
+                    'INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, ?)', rows
+                )
+
+        with bank.connection(db_name, immediate=True):
+            conn.executemany('UPDATE users SET balance = ? WHERE user_id = ?',
+                             ((balances[user_id], user_id) for user_id in range(1, users + 1)))
+        bank.rebuild_balance_snapshots(db_name=db_name)
+    finally:
+        conn.execute(f'PRAGMA wal_autocheckpoint={checkpoint_interval}')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('db', help="database file to create")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.db, args.users, args.transactions, args.seed)
+    print(f"Generated {args.users} users and {args.transactions} transactions "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Open time and memory of the transaction history table.
+
+For each ledger size, seeds one account and builds the history table on a
+hidden Tk window, comparing the paged ttk.Treeview against the previous
+layout of one tk.Label per cell. Needs a display (or Xvfb).
+
+Usage:
+    python -m benchmarks.history_view [--sizes 1000 10000 100000] [--legacy-limit 10000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tkinter as tk
+import tracemalloc
+
+import bank
+from bank import create_db
+from project import history_table
+
+
+def seed(db_name, rows):
+    """Create a fresh database holding one user with `rows` transactions."""
+    bank.configure(db_name)
+    create_db()
+    with bank.connection() as conn:
+        conn.execute("INSERT INTO users (user_id, username, password) VALUES (1, 'bench', '')")
+        conn.executemany(
+            "INSERT INTO transactions (user_id, transaction_type, amount, date) "
+            "VALUES (1, 'Deposit', 1, datetime('2020-01-01', ? || ' minutes'))",
+            ((i,) for i in range(rows))
+        )
+
+
+def label_grid(parent, user_id):
+    """The previous history layout: fetch everything and grid one label per cell."""
+    with bank.connection() as conn:
+        transactions = conn.execute('SELECT transaction_type, amount, date FROM transactions '
+                                    'WHERE user_id = ? ORDER BY date DESC', (user_id,)).fetchall()
+    frame = tk.Frame(parent)
+    for row_idx, transaction in enumerate(transactions):
+        for col_idx, value in enumerate(transaction):
+            tk.Label(frame, text=value, borderwidth=1, relief="solid").grid(row=row_idx, column=col_idx)
+    return frame
+
+
+def measure(build, user_id):
+    """Build a history view on a hidden window; return (seconds, peak MiB)."""
+    root = tk.Tk()
+    root.withdraw()
+    tracemalloc.start()
+    start = time.perf_counter()
+    frame = build(root, user_id)
+    frame.grid()
+    root.update()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    root.destroy()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help="skip the label layout above this many rows")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            seed(os.path.join(tmp, f'history_{size}.db'), size)
+            elapsed, peak = measure(lambda parent, user_id: history_table(parent, user_id)[0], 1)
+            print(f"{size:>8} rows  treeview: {elapsed * 1000:8.1f} ms  {peak:7.2f} MiB")
+            if size <= args.legacy_limit:
+                elapsed, peak = measure(label_grid, 1)
+                print(f"{size:>8} rows  labels:   {elapsed * 1000:8.1f} ms  {peak:7.2f} MiB")
+            bank.close_connections()
+
+
+if __name__ == "__main__":
+    main()
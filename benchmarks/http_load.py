@@ -0,0 +1,138 @@
+"""
+Load test for the local JSON/HTTP API.
+
+Starts server.py in a separate process against a fresh database, registers
+a set of users, then drives it from many concurrent keep-alive connections
+with a mix of deposits, withdrawals, logins and history reads, and reports
+requests/sec and latency percentiles.
+
+Usage:
+    python -m benchmarks.http_load [--clients 64] [--requests 20000] [--users 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PORT = 8765
+
+# Share of each operation in the request mix
+MIX = (('/deposit', 0.4), ('/withdraw', 0.2), ('/authenticate', 0.2), ('/history', 0.2))
+
+
+async def request(reader, writer, path, body):
+    """Send one POST over an open connection and return the response status."""
+    payload = json.dumps(body).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    await reader.readexactly(length)
+    return status
+
+
+def make_body(path, users):
+    """Build a random request body for an endpoint."""
+    user_id = random.randint(1, users)
+    if path == '/authenticate':
+        return {'user_id': user_id, 'password': f'pw{user_id}'}
+    if path == '/history':
+        return {'user_id': user_id, 'page_size': 20}
+    return {'user_id': user_id, 'amount': random.randint(1, 20)}
+
+
+async def client(requests, users, latencies, statuses):
+    """One keep-alive client issuing `requests` calls back to back."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    paths, weights = zip(*MIX)
+    for _ in range(requests):
+        path = random.choices(paths, weights)[0]
+        start = time.perf_counter()
+        status = await request(reader, writer, path, make_body(path, users))
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    writer.close()
+
+
+async def wait_for_server(timeout=10):
+    """Wait until the server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', PORT)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run(args):
+    await wait_for_server()
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    for user_id in range(1, args.users + 1):
+        await request(reader, writer, '/register', {'user_id': user_id, 'username': f'user{user_id}',
+                                                    'password': f'pw{user_id}'})
+        await request(reader, writer, '/deposit', {'user_id': user_id, 'amount': 1000})
+    writer.close()
+
+    latencies, statuses = [], {}
+    per_client = args.requests // args.clients
+    start = time.perf_counter()
+    await asyncio.gather(*(client(per_client, args.users, latencies, statuses) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"requests:     {len(latencies)} over {args.clients} connections")
+    print(f"throughput:   {len(latencies) / elapsed:.0f} requests/sec")
+    print(f"latency p50:  {percentile(0.50):.2f} ms")
+    print(f"latency p99:  {percentile(0.99):.2f} ms")
+    print(f"statuses:     {dict(sorted(statuses.items()))}")
+
+
+def main():
+    global PORT
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8, help="server worker threads")
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+    PORT = args.port
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(root, 'server.py'), '--port', str(PORT),
+             '--workers', str(args.workers), '--db', os.path.join(tmp, 'load.db')],
+            stdout=subprocess.DEVNULL
+        )
+        try:
+            asyncio.run(run(args))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Screen switch latency and process memory over repeated navigation.
+
+Logs a seeded user in and cycles dashboard -> transaction -> dashboard ->
+history -> login through the single application window, timing each switch
+until it has been drawn. Needs a display (or Xvfb).
+
+Usage:
+    python -m benchmarks.navigation [--navigations 1000]
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+import bank
+import project
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--navigations', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bank.configure(os.path.join(tmp, 'navigation.db'))
+        project.create_db()
+        project.add_user(1, 'bench', 'bench', None)
+        bank.post_transaction(1, "Deposit", 10000)
+
+        steps = [
+            lambda: project.account_dashboard(1, 'bench', 10000),
+            lambda: project.make_transaction(1),
+            lambda: project.account_dashboard(1, 'bench', 10000),
+            lambda: project.view_transaction_history(1),
+            project.login_page,
+        ]
+
+        project.login_page()
+        app = project.get_app()
+        app.update()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        timings = []
+        for i in range(args.navigations):
+            start = time.perf_counter()
+            steps[i % len(steps)]()
+            app.update()
+            timings.append(time.perf_counter() - start)
+
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        project.close_window(app)
+        bank.close_connections()
+
+    timings.sort()
+    print(f"navigations:  {len(timings)}")
+    print(f"mean switch:  {statistics.mean(timings) * 1000:.2f} ms")
+    print(f"p99 switch:   {timings[int(len(timings) * 0.99) - 1] * 1000:.2f} ms")
+    print(f"peak RSS:     {rss_before / 1024:.1f} MiB -> {rss_after / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
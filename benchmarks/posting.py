@@ -0,0 +1,75 @@
+"""
+Throughput of per-transaction commits versus the group-commit PostingQueue.
+
+Several teller threads post deposits as fast as they can against a fresh
+database, first each committing its own posting and then all submitting to
+one PostingQueue.
+
+Usage:
+    python -m benchmarks.posting [--tellers 32] [--postings 500] [--users 100]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import bank
+from bank import create_db
+
+
+def setup(db_name, users):
+    """Create a fresh database with `users` empty accounts."""
+    bank.configure(db_name)
+    create_db()
+    with bank.connection() as conn:
+        conn.executemany('INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)',
+                         ((i, f'user{i}', '') for i in range(1, users + 1)))
+
+
+def run_tellers(tellers, postings, users, post):
+    """Run `tellers` threads that each call `post` `postings` times; return elapsed seconds."""
+    def teller(offset):
+        for i in range(postings):
+            post((offset + i) % users + 1)
+        bank.close_connections()
+
+    threads = [threading.Thread(target=teller, args=(n,)) for n in range(tellers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tellers', type=int, default=32)
+    parser.add_argument('--postings', type=int, default=500, help="postings per teller")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-latency', type=float, default=0.001)
+    parser.add_argument('--synchronous', choices=['OFF', 'NORMAL', 'FULL'], default='NORMAL',
+                        help="SQLite synchronous setting (FULL fsyncs every commit)")
+    args = parser.parse_args()
+    bank.PRAGMAS = bank.PRAGMAS + (f'PRAGMA synchronous={args.synchronous}',)
+    total = args.tellers * args.postings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(os.path.join(tmp, 'single.db'), args.users)
+        elapsed = run_tellers(args.tellers, args.postings, args.users,
+                              lambda user_id: bank.post_transaction(user_id, "Deposit", 1))
+        print(f"per-transaction commit: {total / elapsed:10.0f} postings/sec")
+
+        setup(os.path.join(tmp, 'grouped.db'), args.users)
+        with bank.PostingQueue(max_batch=args.max_batch, max_latency=args.max_latency) as postings:
+            elapsed = run_tellers(args.tellers, args.postings, args.users,
+                                  lambda user_id: postings.submit(user_id, "Deposit", 1).result())
+        print(f"group commit:           {total / elapsed:10.0f} postings/sec")
+        bank.close_connections()
+
+
+if __name__ == "__main__":
+    main()
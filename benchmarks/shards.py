@@ -0,0 +1,98 @@
+"""
+Write throughput of sharded storage as the number of shards grows.
+
+For each shard count, a fresh sharded bank is created and several teller
+processes post deposits to random users as fast as they can, each posting
+routed to its user's shard and committed on its own. With one shard every
+posting waits for the same write lock; with more, postings to different
+shards commit in parallel.
+
+Usage:
+    python -m benchmarks.shards [--shards 1 2 4 8] [--processes 8] [--postings 2000] [--users 10000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import bank
+from shards import ShardedBank
+
+
+def setup(base, shards, users):
+    """Create a fresh sharded bank with `users` empty accounts."""
+    sharded = ShardedBank(base, shards)
+    sharded.create()
+    by_shard = {}
+    for user_id in range(1, users + 1):
+        by_shard.setdefault(sharded.path_for(user_id), []).append((user_id, f'user{user_id}', ''))
+    for path, rows in by_shard.items():
+        with bank.connection(path, immediate=True) as conn:
+            conn.executemany('INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)', rows)
+    bank.close_connections()
+
+
+def teller(base, shards, users, postings, seed, synchronous, barrier):
+    """Post `postings` one-cent deposits to random users once every teller is ready."""
+    bank.PRAGMAS = bank.PRAGMAS + (f'PRAGMA synchronous={synchronous}',)
+    sharded = ShardedBank(base, shards)
+    rng = random.Random(seed)
+    user_ids = [rng.randint(1, users) for _ in range(postings)]
+    # Open every shard's connection before the clock starts
+    for path in sharded.paths:
+        bank.get_connection(path)
+    barrier.wait()
+    for user_id in user_ids:
+        sharded.deposit(user_id, 1)
+    bank.close_connections()
+
+
+def run(base, shards, processes, postings, users, synchronous):
+    """Run the tellers against one shard layout and return postings per second."""
+    setup(base, shards, users)
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(processes + 1)
+    tellers = [context.Process(target=teller, args=(base, shards, users, postings, n, synchronous, barrier))
+               for n in range(processes)]
+    for process in tellers:
+        process.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for process in tellers:
+        process.join()
+    elapsed = time.perf_counter() - start
+    if any(process.exitcode for process in tellers):
+        raise RuntimeError("A teller process failed")
+
+    totals = ShardedBank(base, shards).totals(workers=1)
+    assert totals['transactions'] == totals['balance'] == processes * postings
+    bank.close_connections()
+    return processes * postings / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--processes', type=int, default=8, help="teller processes")
+    parser.add_argument('--postings', type=int, default=2000, help="postings per teller")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--synchronous', choices=['OFF', 'NORMAL', 'FULL'], default='NORMAL',
+                        help="SQLite synchronous setting (FULL fsyncs every commit)")
+    args = parser.parse_args()
+
+    print(f"{args.processes} teller processes on {os.cpu_count()} CPUs, "
+          f"{args.postings} postings each, synchronous={args.synchronous}")
+    baseline = None
+    for shards in args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            rate = run(os.path.join(tmp, 'bank.db'), shards, args.processes, args.postings, args.users,
+                       args.synchronous)
+        baseline = baseline or rate
+        print(f"{shards:3d} shards: {rate:10.0f} postings/sec ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark suite for the non-GUI banking paths.
+
+Generates (or reuses) a seeded dataset, then times password hashing,
+credential lookup, balance posting, history queries and account creation,
+and prints ops/sec and latency percentiles as JSON so runs on different
+commits can be compared. Note that the posting and add_user benchmarks
+write to the database.
+
+Usage:
+    python -m benchmarks.suite [--users 10000] [--transactions 1000000] [--iterations 2000]
+                               [--db bench.db] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+
+import bank
+import service
+from benchmarks.generate import DAYS, START_DATE, generate, password_for
+
+
+def measure(operation, iterations):
+    """
+    Call `operation` repeatedly and summarize its latency.
+
+    Returns:
+        Dict with iterations, ops_per_sec and latency percentiles in microseconds
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        began = time.perf_counter_ns()
+        operation(i)
+        latencies.append(time.perf_counter_ns() - began)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1000, 2)
+
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / elapsed, 1),
+        'latency_us': {'p50': percentile(0.50), 'p90': percentile(0.90), 'p99': percentile(0.99),
+                       'max': round(latencies[-1] / 1000, 2)},
+    }
+
+
+def git_commit():
+    """The current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(users, iterations, seed):
+    """Run every benchmark against the configured database."""
+    rng = random.Random(seed)
+    user_ids = [rng.randint(1, users) for _ in range(iterations)]
+    # Past every existing account, so rerunning against a reused --db never collides
+    with bank.connection() as conn:
+        first_new_id = conn.execute('SELECT COALESCE(MAX(user_id), 0) + 1 FROM users').fetchone()[0]
+    as_of = [(START_DATE - timedelta(seconds=rng.randrange(DAYS * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+             for _ in range(iterations)]
+
+    return {
+        'hash_password': measure(lambda i: bank.hash_password('password123'), iterations),
+        'authenticate': measure(lambda i: service.authenticate(user_ids[i], password_for(user_ids[i])),
+                                iterations),
+        'post_transaction': measure(lambda i: bank.post_transaction(user_ids[i], "Deposit", 10), iterations),
+        'history_page': measure(lambda i: bank.transaction_history_page(user_ids[i], 50), iterations),
+        'balance_as_of': measure(lambda i: bank.balance_as_of(user_ids[i], as_of[i]), iterations),
+        'add_user': measure(lambda i: service.register(first_new_id + i, 'bench', 'bench'), iterations),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--db', help="reuse (or create) this dataset instead of a temporary one")
+    parser.add_argument('--output', help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = args.db or os.path.join(tmp, 'bench.db')
+        generate_seconds = None
+        if not os.path.exists(db_name):
+            start = time.perf_counter()
+            generate(db_name, args.users, args.transactions, args.seed)
+            generate_seconds = round(time.perf_counter() - start, 2)
+
+        bank.configure(db_name)
+        results = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'scale': {'users': args.users, 'transactions': args.transactions, 'seed': args.seed},
+            'generate_seconds': generate_seconds,
+            'benchmarks': run_suite(args.users, args.iterations, args.seed),
+        }
+        bank.close_connections()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Multi-process concurrent-teller load test and consistency check.
+
+Spawns several teller processes that share one database file and, for a
+fixed duration, run a weighted mix of deposits, withdrawals, logins and
+history reads against random users through the service layer. A busy or
+locked database is retried with jittered exponential backoff.
+
+The run reports throughput and latency percentiles per operation, then
+checks the database: every user's balance must equal the sum of their
+ledger, and the total of all balances must have moved by exactly the net
+amount the tellers posted successfully. --read-then-write switches postings
+to the read-modify-write pattern the app used before posting moved into SQL,
+to show the check catching lost updates.
+
+Usage:
+    python -m benchmarks.tellers [--processes 8] [--duration 10] [--users 1000]
+                                 [--mix deposit=40,withdraw=20,login=20,history=20] [--db bench.db]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import bank
+import service
+from bank import SIGNED_AMOUNT, InsufficientFunds
+from benchmarks.generate import generate, password_for
+
+MIX = {'deposit': 40, 'withdraw': 20, 'login': 20, 'history': 20}
+
+# Attempts per operation while the database stays busy
+RETRIES = 8
+
+# First and longest backoff between attempts, in seconds
+BACKOFF = 0.001
+MAX_BACKOFF = 0.1
+
+# Largest deposit or withdrawal, in cents
+MAX_AMOUNT = 5000
+
+
+def parse_mix(text):
+    """Parse "deposit=40,withdraw=20,..." into a dict of operation weights."""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in MIX:
+            raise ValueError(f"Unknown operation: {name.strip()!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def is_busy(error):
+    """True if an sqlite3 error means another connection holds the lock."""
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def with_backoff(operation, stats, rng):
+    """
+    Call `operation`, retrying while the database is busy.
+
+    Sleeps a random time up to a delay that doubles after every busy
+    attempt, so tellers that collided do not retry in lockstep.
+    """
+    delay = BACKOFF
+    for attempt in range(RETRIES):
+        try:
+            return operation()
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt == RETRIES - 1:
+                raise
+            stats['busy_retries'] += 1
+            time.sleep(rng.uniform(0, delay))
+            delay = min(delay * 2, MAX_BACKOFF)
+
+
+def read_then_write(user_id, transaction_type, amount, db_name=None):
+    """
+    Post by reading the balance, then writing the new one, in separate statements.
+
+    This is how postings worked before they became a single conditional
+    UPDATE. Two tellers posting to the same user at once can both read the
+    old balance, and one of the two updates is then lost.
+    """
+    conn = bank.get_connection(db_name)
+    row = conn.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,)).fetchone()
+    if row is None:
+        raise bank.UserNotFound(user_id)
+    balance = row[0] + amount if transaction_type == 'Deposit' else row[0] - amount
+    if balance < 0:
+        raise InsufficientFunds(user_id)
+    conn.execute('UPDATE users SET balance = ? WHERE user_id = ?', (balance, user_id))
+    conn.execute("INSERT INTO transactions (user_id, transaction_type, amount, date) "
+                 "VALUES (?, ?, ?, datetime('now'))", (user_id, transaction_type, amount))
+    return balance
+
+
+def teller(db_name, users, duration, mix, seed, unsafe, busy_timeout, barrier, results):
+    """
+    One teller process: run the mix until `duration` seconds have passed.
+
+    Puts a dict on `results` with per-operation latencies (ns), the net
+    amount posted successfully, and error counts.
+    """
+    bank.BUSY_TIMEOUT = busy_timeout
+    rng = random.Random(seed)
+    post = read_then_write if unsafe else bank.post_transaction
+    names, weights = zip(*mix.items())
+    latencies = {name: [] for name in names}
+    stats = {'busy_retries': 0, 'busy_failures': 0, 'insufficient_funds': 0, 'errors': 0}
+    net = 0
+
+    # Each returns the change it made to the bank's total balance
+    def deposit(user_id, amount):
+        post(user_id, 'Deposit', amount, db_name)
+        return amount
+
+    def withdraw(user_id, amount):
+        post(user_id, 'Withdraw', amount, db_name)
+        return -amount
+
+    def login(user_id, amount):
+        service.authenticate(user_id, password_for(user_id), db_name)
+        return 0
+
+    def history(user_id, amount):
+        service.history(user_id, 20, db_name=db_name)
+        return 0
+
+    operations = {'deposit': deposit, 'withdraw': withdraw, 'login': login, 'history': history}
+
+    bank.get_connection(db_name)
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        user_id, amount = rng.randint(1, users), rng.randint(1, MAX_AMOUNT)
+        began = time.perf_counter_ns()
+        try:
+            net += with_backoff(lambda: operations[name](user_id, amount), stats, rng)
+        except InsufficientFunds:
+            stats['insufficient_funds'] += 1
+        except sqlite3.OperationalError as e:
+            stats['busy_failures' if is_busy(e) else 'errors'] += 1
+            continue
+        latencies[name].append(time.perf_counter_ns() - began)
+
+    bank.close_connections()
+    results.put({'latencies': latencies, 'net': net, 'stats': stats})
+
+
+def total_balance(db_name=None):
+    """Return the sum of every user's balance, in cents."""
+    with bank.connection(db_name) as conn:
+        return conn.execute('SELECT COALESCE(SUM(balance), 0) FROM users').fetchone()[0]
+
+
+def check_consistency(db_name=None):
+    """
+    Compare every user's balance with the sum of their ledger, archived part included.
+
+    Returns:
+        List of (user_id, balance, ledger_sum) for every user that differs
+    """
+    with bank.connection(db_name) as conn:
+        return conn.execute(f'''
+            SELECT users.user_id, users.balance, COALESCE(ledger.net, 0) + COALESCE(checkpoint.balance, 0) AS total
+            FROM users LEFT JOIN (
+                SELECT user_id, SUM({SIGNED_AMOUNT}) AS net FROM transactions GROUP BY user_id
+            ) AS ledger ON ledger.user_id = users.user_id
+            LEFT JOIN ledger_checkpoints AS checkpoint ON checkpoint.user_id = users.user_id
+            WHERE users.balance != total
+            ORDER BY users.user_id
+        ''').fetchall()
+
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles (microseconds) of one operation."""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'count': 0}
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1000, 1)
+
+    return {
+        'count': len(latencies),
+        'ops_per_sec': round(len(latencies) / elapsed, 1),
+        'latency_us': {'p50': percentile(0.50), 'p90': percentile(0.90), 'p99': percentile(0.99),
+                       'p999': percentile(0.999), 'max': round(latencies[-1] / 1000, 1)},
+    }
+
+
+def run_load(db_name, users, processes=8, duration=10.0, mix=None, unsafe=False, busy_timeout=bank.BUSY_TIMEOUT,
+             seed=0):
+    """
+    Run the teller processes against a database and check it afterwards.
+
+    Args:
+        db_name: Database with users 1..users whose passwords follow password_for()
+        users: Number of users to pick from
+        processes: Teller processes
+        duration: Seconds each teller runs for
+        mix: Dict of operation name to weight (default: MIX)
+        unsafe: Post with read_then_write() instead of post_transaction()
+        busy_timeout: SQLite busy timeout of each teller's connection, in seconds
+        seed: Base random seed; teller n uses seed + n
+
+    Returns:
+        Report dict with per-operation throughput and latency, error counts,
+        and a 'consistency' section; 'consistent' is True if every check passed
+    """
+    before = total_balance(db_name)
+    bank.close_connections()
+
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(processes + 1)
+    results = context.Queue()
+    tellers = [context.Process(target=teller, args=(db_name, users, duration, mix or MIX, seed + n, unsafe,
+                                                    busy_timeout, barrier, results))
+               for n in range(processes)]
+    for process in tellers:
+        process.start()
+    barrier.wait()
+    start = time.perf_counter()
+    reports = [results.get() for _ in tellers]
+    elapsed = time.perf_counter() - start
+    for process in tellers:
+        process.join()
+
+    latencies, stats, net = {}, dict.fromkeys(reports[0]['stats'], 0), 0
+    for report in reports:
+        for name, values in report['latencies'].items():
+            latencies.setdefault(name, []).extend(values)
+        for name, count in report['stats'].items():
+            stats[name] += count
+        net += report['net']
+
+    mismatches = check_consistency(db_name)
+    after = total_balance(db_name)
+    bank.close_connections()
+    operations = sum(len(values) for values in latencies.values())
+    return {
+        'processes': processes,
+        'seconds': round(elapsed, 2),
+        'ops_per_sec': round(operations / elapsed, 1),
+        'operations': {name: summarize(values, elapsed) for name, values in sorted(latencies.items())},
+        'stats': stats,
+        'consistency': {
+            'mismatched_users': len(mismatches),
+            'examples': mismatches[:10],
+            'net_posted': net,
+            'balance_change': after - before,
+        },
+        'consistent': not mismatches and after - before == net,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds each teller runs for")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--transactions', type=int, default=100000, help="ledger rows to generate first")
+    parser.add_argument('--mix', type=parse_mix, default=MIX, help="operation weights, e.g. deposit=60,login=40")
+    parser.add_argument('--busy-timeout', type=float, default=bank.BUSY_TIMEOUT,
+                        help="SQLite busy timeout in seconds; lower it to exercise the retry path")
+    parser.add_argument('--read-then-write', action='store_true',
+                        help="post with the old read-modify-write pattern")
+    parser.add_argument('--db', help="existing database made by benchmarks.generate (default: a fresh one)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = args.db
+        if db_name is None:
+            db_name = os.path.join(tmp, 'tellers.db')
+            generate(db_name, args.users, args.transactions, seed=42)
+            bank.close_connections()
+        report = run_load(db_name, args.users, args.processes, args.duration, args.mix, args.read_then_write,
+                          args.busy_timeout, args.seed)
+    print(json.dumps(report, indent=2))
+    if not report['consistent']:
+        raise SystemExit("Consistency check FAILED")
+
+
+if __name__ == "__main__":
+    main()
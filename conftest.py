@@ -0,0 +1,19 @@
+import pytest
+import bank
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Point the connection manager at a fresh database file, and back at the default afterwards."""
+    path = str(tmp_path / 'bank.db')
+    bank.configure(path)
+    yield path
+    bank.close_connections()
+    bank.configure(bank.DB_NAME)
+
+
+@pytest.fixture
+def bank_db(db_path):
+    """A fresh database file with the schema created."""
+    bank.create_db()
+    return db_path
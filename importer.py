@@ -0,0 +1,254 @@
+"""
+Children's Bank of Canada - Bulk Transaction Import
+
+Loads historical ledgers and end-of-day files from CSV or JSON Lines (either
+optionally gzip-compressed) into the transactions table.
+
+The input is streamed: rows are read lazily, validated, and grouped into
+batches. Each batch is applied in one BEGIN IMMEDIATE transaction with a
+single executemany INSERT and one aggregated balance UPDATE per user, so
+memory stays bounded by the batch size however large the file is.
+
+Each input row needs user_id, transaction_type ("Deposit" or "Withdraw") and
+amount in dollars (at most two decimal places, stored as cents); date
+("YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS", UTC, not in the future) is optional
+and defaults to the time of the import.
+
+Rows dated before a user's archive cutoff (see archive.py) are rejected: that
+part of the ledger is closed.
+
+Backdated rows make the daily closing balances from their day onwards stale.
+Those are dropped in the same transaction as the rows, and rebuilt for the
+affected users once the whole file has been applied.
+"""
+
+import csv
+import gzip
+import json
+import re
+from datetime import datetime, timezone
+from itertools import islice
+
+from bank import (MAX_INTEGER, account_cache, connection, get_connection, invalidate_balance_snapshots,
+                  rebuild_balance_snapshots, to_cents)
+
+# Rows applied per transaction
+BATCH_SIZE = 50000
+
+TRANSACTION_TYPES = ("Deposit", "Withdraw")
+
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?')
+
+# SQLite host parameter limit is far higher, but small IN lists keep the plans simple
+LOOKUP_CHUNK = 500
+
+
+def open_input(path):
+    """Open a text file for reading, decompressing it if it ends in .gz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+
+def read_rows(path):
+    """
+    Stream raw records from a CSV or JSON Lines file.
+
+    Yields:
+        (line_number, record) where record is a dict, or None if the line
+        could not be parsed
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    with open_input(path) as file:
+        if name.endswith(('.jsonl', '.ndjson', '.json')):
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield line_number, record if isinstance(record, dict) else None
+        else:
+            # Line 1 is the header row
+            reader = csv.reader(file)
+            header = next(reader, [])
+            for line_number, values in enumerate(reader, start=2):
+                yield line_number, dict(zip(header, values))
+
+
+def validate(records, now):
+    """
+    Check and normalize raw records.
+
+    Args:
+        records: Iterable of (line_number, record) from read_rows()
+        now: Date used for records without one
+
+    Yields:
+        (line_number, row, reason) where row is (user_id, transaction_type,
+        amount in cents, date) for a valid record and reason is None, or row is the
+        raw record and reason explains why it was rejected
+    """
+    for line_number, record in records:
+        if record is None:
+            yield line_number, record, "unparseable line"
+            continue
+
+        try:
+            user_id = int(record.get('user_id'))
+            if abs(user_id) > MAX_INTEGER:
+                raise ValueError
+        except (TypeError, ValueError):
+            yield line_number, record, "invalid user_id"
+            continue
+
+        transaction_type = record.get('transaction_type')
+        if transaction_type not in TRANSACTION_TYPES:
+            yield line_number, record, "invalid transaction_type"
+            continue
+
+        try:
+            amount = to_cents(record.get('amount'))
+        except ValueError:
+            yield line_number, record, "invalid amount"
+            continue
+        if amount <= 0:
+            yield line_number, record, "amount must be positive"
+            continue
+
+        date = record.get('date') or now
+        if not isinstance(date, str) or not DATE_PATTERN.fullmatch(date):
+            yield line_number, record, "invalid date"
+            continue
+        if len(date) == 10:
+            date += ' 00:00:00'
+        if date > now:
+            yield line_number, record, "date in the future"
+            continue
+
+        yield line_number, (user_id, transaction_type, amount, date), None
+
+
+def batches(iterable, size):
+    """Split an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def apply_batch(conn, batch):
+    """
+    Apply one batch of validated rows on a connection inside a write transaction.
+
+    Rows for unknown users, rows dated before the user's archive cutoff, and
+    withdrawals larger than the running balance, are rejected. Accepted rows
+    are inserted with one executemany, sorted so the history index is filled
+    in key order, each user's balance is moved by their net amount in one
+    UPDATE, and their daily closing balances from the earliest imported day
+    onwards are dropped.
+
+    Args:
+        conn: Connection with an open write transaction
+        batch: List of (line_number, row) with validated rows
+
+    Returns:
+        (accepted_count, rejects) where rejects is a list of
+        (line_number, row, reason)
+    """
+    user_ids = list({row[0] for _, row in batch})
+    balances, throughs = {}, {}
+    for start in range(0, len(user_ids), LOOKUP_CHUNK):
+        chunk = user_ids[start:start + LOOKUP_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        balances.update(conn.execute(f'SELECT user_id, balance FROM users WHERE user_id IN ({placeholders})', chunk))
+        throughs.update(conn.execute(
+            f'SELECT user_id, through FROM ledger_checkpoints WHERE user_id IN ({placeholders})', chunk
+        ))
+
+    accepted, rejects, deltas = [], [], {}
+    for line_number, row in batch:
+        user_id, transaction_type, amount, date = row
+        if user_id not in balances:
+            rejects.append((line_number, row, "unknown user_id"))
+            continue
+        if date < throughs.get(user_id, ''):
+            rejects.append((line_number, row, "date in an archived period"))
+            continue
+        delta = amount if transaction_type == "Deposit" else -amount
+        if balances[user_id] + delta < 0:
+            rejects.append((line_number, row, "insufficient funds"))
+            continue
+        balances[user_id] += delta
+        deltas[user_id] = deltas.get(user_id, 0) + delta
+        accepted.append(row)
+
+    accepted.sort(key=lambda row: (row[0], row[3]))
+    conn.executemany(
+        'INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, ?)', accepted
+    )
+    conn.executemany(
+        'UPDATE users SET balance = balance + ? WHERE user_id = ?',
+        ((delta, user_id) for user_id, delta in deltas.items())
+    )
+
+    # Rows are sorted, so the first one seen for each user has their earliest date
+    first_days = {}
+    for user_id, _, _, date in accepted:
+        first_days.setdefault(user_id, date[:10])
+    invalidate_balance_snapshots(conn, first_days)
+    return len(accepted), rejects
+
+
+def import_transactions(path, batch_size=BATCH_SIZE, on_reject=None, db_name=None):
+    """
+    Import a CSV or JSON Lines ledger file.
+
+    Automatic WAL checkpoints are paused for the duration of the import and
+    one checkpoint is run at the end, instead of one after every batch.
+    Daily closing balances of every user with accepted rows are rebuilt
+    after the last batch.
+
+    Args:
+        path: File to import (.csv, .jsonl or .ndjson, optionally .gz)
+        batch_size: Rows applied per transaction
+        on_reject: Called with (line_number, record, reason) for every rejected row
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (accepted, rejected) row counts
+    """
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    accepted = rejected = 0
+    touched = set()
+
+    conn = get_connection(db_name)
+    checkpoint_interval = conn.execute('PRAGMA wal_autocheckpoint').fetchone()[0]
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    try:
+        for batch in batches(validate(read_rows(path), now), batch_size):
+            valid = []
+            for line_number, row, reason in batch:
+                if reason is None:
+                    valid.append((line_number, row))
+                    touched.add(row[0])
+                else:
+                    rejected += 1
+                    if on_reject is not None:
+                        on_reject(line_number, row, reason)
+
+            with connection(db_name, immediate=True):
+                count, rejects = apply_batch(conn, valid)
+            account_cache.clear()
+            accepted += count
+            rejected += len(rejects)
+            if on_reject is not None:
+                for reject in rejects:
+                    on_reject(*reject)
+
+        rebuild_balance_snapshots(touched, db_name)
+    finally:
+        conn.execute(f'PRAGMA wal_autocheckpoint={checkpoint_interval}')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    return accepted, rejected
@@ -0,0 +1,255 @@
+"""
+Children's Bank of Canada - Query Instrumentation
+
+Opt-in timing of every SQL statement and commit run through bank.py.
+
+When enabled, new pooled connections are opened with a sqlite3 connection
+factory that times each execute/executemany and records, per statement:
+call count, total and maximum time, a log2-bucketed latency histogram, rows
+fetched, errors, and "database is locked" failures. Lock waits that SQLite
+resolves inside its busy timeout show up as time spent in BEGIN IMMEDIATE.
+
+When disabled (the default) connections are plain sqlite3 connections, so
+there is no overhead at all.
+
+Usage:
+    instrumentation.enable(dump_path='query_stats.json', interval=60)
+    ...
+    instrumentation.snapshot()
+
+Setting BANK_PROFILE=<file> in the environment enables it at startup with
+periodic dumps to that file (every BANK_PROFILE_INTERVAL seconds, default 60).
+"""
+
+import json
+import os
+import re
+import sqlite3 as db
+import threading
+import time
+
+# Whether connections opened from now on are instrumented
+enabled = False
+
+_stats = {}
+_names = {}
+_lock = threading.Lock()
+_dumper = None
+_stop = threading.Event()
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\?(\s*,\s*\?)+')
+
+
+def statement_name(sql):
+    """
+    Return the name statistics are kept under for a SQL string.
+
+    Whitespace is collapsed and placeholder lists such as IN (?, ?, ?) are
+    folded to (?...) so variable-length lists share one entry.
+    """
+    name = _names.get(sql)
+    if name is None:
+        name = _PLACEHOLDER_LIST.sub('?...', _WHITESPACE.sub(' ', sql).strip())
+        _names[sql] = name
+    return name
+
+
+def _entry(name):
+    entry = _stats.get(name)
+    if entry is None:
+        entry = _stats[name] = {'count': 0, 'total_ns': 0, 'max_ns': 0, 'fetch_ns': 0,
+                                'rows': 0, 'errors': 0, 'busy': 0, 'histogram': {}}
+    return entry
+
+
+def record(name, elapsed_ns):
+    """Record one execution of a statement."""
+    # Bucket b holds latencies below 2**b microseconds
+    bucket = (elapsed_ns // 1000).bit_length()
+    with _lock:
+        entry = _entry(name)
+        entry['count'] += 1
+        entry['total_ns'] += elapsed_ns
+        if elapsed_ns > entry['max_ns']:
+            entry['max_ns'] = elapsed_ns
+        entry['histogram'][bucket] = entry['histogram'].get(bucket, 0) + 1
+
+
+def record_fetch(name, rows, elapsed_ns):
+    """Record rows fetched for a statement and the time spent fetching them."""
+    with _lock:
+        entry = _entry(name)
+        entry['rows'] += rows
+        entry['fetch_ns'] += elapsed_ns
+
+
+def record_error(name, error):
+    """Record a failed execution, counting lock failures separately."""
+    message = str(error)
+    busy = isinstance(error, db.OperationalError) and ('locked' in message or 'busy' in message)
+    with _lock:
+        entry = _entry(name)
+        entry['errors'] += 1
+        if busy:
+            entry['busy'] += 1
+
+
+class InstrumentedCursor(db.Cursor):
+    """Cursor that times its statements and counts the rows fetched from them."""
+
+    _name = None
+
+    def execute(self, sql, parameters=()):
+        self._name = name = statement_name(sql)
+        start = time.perf_counter_ns()
+        try:
+            result = super().execute(sql, parameters)
+        except db.Error as e:
+            record_error(name, e)
+            raise
+        record(name, time.perf_counter_ns() - start)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        self._name = name = statement_name(sql)
+        start = time.perf_counter_ns()
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+        except db.Error as e:
+            record_error(name, e)
+            raise
+        record(name, time.perf_counter_ns() - start)
+        return result
+
+    def _fetched(self, rows, start):
+        if self._name is not None:
+            record_fetch(self._name, rows, time.perf_counter_ns() - start)
+
+    def fetchone(self):
+        start = time.perf_counter_ns()
+        row = super().fetchone()
+        self._fetched(row is not None, start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter_ns()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter_ns()
+        rows = super().fetchall()
+        self._fetched(len(rows), start)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter_ns()
+        row = super().__next__()
+        self._fetched(1, start)
+        return row
+
+
+class InstrumentedConnection(db.Connection):
+    """Connection whose statements and commits all go through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter_ns()
+        super().commit()
+        record('COMMIT', time.perf_counter_ns() - start)
+
+
+def connection_factory():
+    """The sqlite3 connection class to open new connections with."""
+    return InstrumentedConnection if enabled else db.Connection
+
+
+def snapshot():
+    """
+    Return the statistics collected so far.
+
+    Returns:
+        Dict of statement name to count, total_ms, mean_us, max_us, fetch_ms,
+        rows, errors, busy and histogram ({"<2^b us" upper bound: count})
+    """
+    with _lock:
+        stats = {name: dict(entry, histogram=dict(entry['histogram'])) for name, entry in _stats.items()}
+
+    return {
+        name: {
+            'count': entry['count'],
+            'total_ms': round(entry['total_ns'] / 1e6, 3),
+            'mean_us': round(entry['total_ns'] / entry['count'] / 1e3, 2) if entry['count'] else 0,
+            'max_us': round(entry['max_ns'] / 1e3, 2),
+            'fetch_ms': round(entry['fetch_ns'] / 1e6, 3),
+            'rows': entry['rows'],
+            'errors': entry['errors'],
+            'busy': entry['busy'],
+            'histogram': {f'<{2 ** bucket}us': count for bucket, count in sorted(entry['histogram'].items())},
+        }
+        for name, entry in sorted(stats.items(), key=lambda item: -item[1]['total_ns'])
+    }
+
+
+def reset():
+    """Discard all collected statistics."""
+    with _lock:
+        _stats.clear()
+
+
+def dump(path):
+    """Write the current snapshot to a JSON file, replacing it atomically."""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'statements': snapshot()}, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def _dump_periodically(path, interval):
+    while not _stop.wait(interval):
+        dump(path)
+    dump(path)
+
+
+def enable(dump_path=None, interval=60):
+    """
+    Start instrumenting connections opened from now on.
+
+    Connections that are already open stay uninstrumented; call
+    bank.close_connections() to have the current thread reopen its own.
+
+    Args:
+        dump_path: If given, write the snapshot to this file every `interval` seconds
+        interval: Seconds between dumps
+    """
+    global enabled, _dumper
+    enabled = True
+    if dump_path and _dumper is None:
+        _stop.clear()
+        _dumper = threading.Thread(target=_dump_periodically, args=(dump_path, interval),
+                                   name="query-stats-dump", daemon=True)
+        _dumper.start()
+
+
+def disable():
+    """Stop instrumenting new connections and stop periodic dumps (writing a final one)."""
+    global enabled, _dumper
+    enabled = False
+    if _dumper is not None:
+        _stop.set()
+        _dumper.join()
+        _dumper = None
+
+
+if os.environ.get('BANK_PROFILE'):
+    enable(os.environ['BANK_PROFILE'], float(os.environ.get('BANK_PROFILE_INTERVAL', 60)))
@@ -0,0 +1,182 @@
+"""
+Children's Bank of Canada - Batch Jobs
+
+Account-wide jobs such as monthly interest and maintenance fees, applied
+with set-based SQL instead of one read-modify-write per account.
+
+Accounts are processed `chunk_size` at a time in user ID order. For each range, one
+write transaction:
+
+1. writes one ledger row for every account the rule applies to, with a
+   single INSERT ... SELECT from users,
+2. moves those accounts' balances with a single UPDATE ... FROM the new
+   ledger rows,
+3. sets their closing balance for the day, and records how far the run
+   has got in job_runs.
+
+Each run has an ID. Re-running an ID that finished does nothing, and
+re-running one that was interrupted carries on after its last committed
+range, so no account is ever charged or credited twice.
+
+Usage:
+    python jobs.py interest RUN_ID --rate-bp 25 [--db users.db]
+    python jobs.py fee RUN_ID --amount 2.50 [--waive-at 1000.00] [--db users.db]
+"""
+
+import argparse
+import json
+import time
+
+from bank import CREDIT_TYPES, account_cache, connection, get_db_name, to_cents
+
+# Accounts per write transaction
+CHUNK_SIZE = 5000
+
+
+def interest_rule(rate_bp):
+    """
+    Interest on positive balances, rounded down to the cent.
+
+    Args:
+        rate_bp: Rate for the period in basis points (25 = 0.25%)
+
+    Returns:
+        (transaction_type, amount_sql, condition_sql, params) for run_job()
+    """
+    if not isinstance(rate_bp, int) or rate_bp <= 0:
+        raise ValueError("Interest rate must be a positive whole number of basis points")
+    return 'Interest', 'balance * :rate_bp / 10000', 'balance * :rate_bp / 10000 > 0', {'rate_bp': rate_bp}
+
+
+def fee_rule(fee, waive_at=None):
+    """
+    A flat fee, charged only where the balance covers it.
+
+    Args:
+        fee: Fee in cents
+        waive_at: Balance in cents at or above which the fee is waived (default: never)
+
+    Returns:
+        (transaction_type, amount_sql, condition_sql, params) for run_job()
+    """
+    if not isinstance(fee, int) or fee <= 0:
+        raise ValueError("Fee must be a positive whole number of cents")
+    condition = 'balance >= :fee'
+    if waive_at is not None:
+        condition += ' AND balance < :waive_at'
+    return 'Fee', ':fee', condition, {'fee': fee, 'waive_at': waive_at}
+
+
+def start_run(run_id, job, params, db_name=None):
+    """
+    Register a run, or look up the one already registered under `run_id`.
+
+    Returns:
+        (last_user_id, accounts, finished) of the run
+
+    Raises:
+        ValueError: If `run_id` was used for a different job or parameters
+    """
+    with connection(db_name, immediate=True) as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO job_runs (run_id, job, params, started) VALUES (?, ?, ?, datetime('now'))",
+            (run_id, job, params)
+        )
+        row = conn.execute('SELECT job, params, last_user_id, accounts, finished FROM job_runs '
+                           'WHERE run_id = ?', (run_id,)).fetchone()
+    if row[:2] != (job, params):
+        raise ValueError(f"Run {run_id!r} was already used for {row[0]} {row[1]}")
+    return row[2:]
+
+
+def run_job(run_id, job, rule, chunk_size=CHUNK_SIZE, db_name=None):
+    """
+    Apply a rule to every account, once per run ID.
+
+    Args:
+        run_id: Unique ID of this run, e.g. "interest-2024-06"
+        job: Name of the job, recorded with the run
+        rule: (transaction_type, amount_sql, condition_sql, params) from a
+            *_rule() function. amount_sql and condition_sql are evaluated
+            against each users row
+        chunk_size: Accounts per write transaction
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        Dict with the run's accounts (affected in total), processed (accounts
+        scanned by this call), seconds and accounts_per_second
+    """
+    transaction_type, amount_sql, condition_sql, params = rule
+    last_user_id, accounts, finished = start_run(run_id, job, json.dumps(params, sort_keys=True), db_name)
+    operator = '+' if transaction_type in CREDIT_TYPES else '-'
+
+    began = time.perf_counter()
+    processed = 0
+    while not finished:
+        with connection(db_name, immediate=True) as conn:
+            bounds = conn.execute(
+                'SELECT MAX(user_id), COUNT(*) FROM (SELECT user_id FROM users WHERE user_id > ? '
+                'ORDER BY user_id LIMIT ?)', (last_user_id, chunk_size)
+            ).fetchone()
+            if bounds[1] == 0:
+                conn.execute("UPDATE job_runs SET finished = datetime('now') WHERE run_id = ?", (run_id,))
+                break
+            now = conn.execute("SELECT datetime('now')").fetchone()[0]
+            chunk = dict(params, type=transaction_type, date=now, first=last_user_id, last=bounds[0])
+            before = conn.execute('SELECT COALESCE(MAX(transaction_id), 0) FROM transactions').fetchone()[0]
+
+            affected = conn.execute(
+                f'INSERT INTO transactions (user_id, transaction_type, amount, date) '
+                f'SELECT user_id, :type, {amount_sql}, :date FROM users '
+                f'WHERE user_id > :first AND user_id <= :last AND {condition_sql}', chunk
+            ).rowcount
+            conn.execute(
+                f'UPDATE users SET balance = balance {operator} entry.amount FROM transactions AS entry '
+                f'WHERE entry.transaction_id > ? AND entry.user_id = users.user_id', (before,)
+            )
+            conn.execute(
+                'INSERT INTO daily_balances (user_id, day, balance) '
+                'SELECT users.user_id, substr(?, 1, 10), users.balance FROM transactions AS entry '
+                'JOIN users ON users.user_id = entry.user_id WHERE entry.transaction_id > ? '
+                'ON CONFLICT(user_id, day) DO UPDATE SET balance = excluded.balance', (now, before)
+            )
+            conn.execute('UPDATE job_runs SET last_user_id = ?, accounts = accounts + ? WHERE run_id = ?',
+                         (bounds[0], affected, run_id))
+        account_cache.clear()
+        last_user_id = bounds[0]
+        accounts += affected
+        processed += bounds[1]
+
+    seconds = time.perf_counter() - began
+    return {'run_id': run_id, 'accounts': accounts, 'processed': processed, 'seconds': seconds,
+            'accounts_per_second': processed / seconds if seconds else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply interest or fees to every account")
+    parser.add_argument('--db', default=None, help="database file (default: users.db or $BANK_DB)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    subparsers = parser.add_subparsers(dest='job', required=True)
+
+    interest = subparsers.add_parser('interest', help="credit interest on positive balances")
+    interest.add_argument('run_id')
+    interest.add_argument('--rate-bp', type=int, required=True, help="rate in basis points (25 = 0.25%%)")
+
+    fee = subparsers.add_parser('fee', help="charge a flat maintenance fee")
+    fee.add_argument('run_id')
+    fee.add_argument('--amount', required=True, help="fee in dollars, e.g. 2.50")
+    fee.add_argument('--waive-at', help="waive the fee at or above this balance, in dollars")
+
+    args = parser.parse_args()
+    if args.job == 'interest':
+        rule = interest_rule(args.rate_bp)
+    else:
+        rule = fee_rule(to_cents(args.amount), to_cents(args.waive_at) if args.waive_at else None)
+
+    report = run_job(args.run_id, args.job, rule, args.chunk_size, get_db_name(args.db))
+    print(f"{args.job} run {report['run_id']}: {report['accounts']} accounts affected; "
+          f"{report['processed']} scanned in {report['seconds']:.2f}s ({report['accounts_per_second']:.0f} accounts/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Children's Bank of Canada - Money Migration
+
+Converts a database that stores money as REAL dollars (users.balance and
+transactions.amount) to the current schema, where both are INTEGER cents.
+
+The conversion runs online, next to a live application:
+
+1. Empty `users_cents` and `transactions_cents` tables are created, with
+   triggers that copy every insert, update and delete on the old tables
+   into them as it happens.
+2. Existing rows are copied across in rowid ranges of `batch_size`, each
+   range in its own short write transaction. The last range copied is
+   saved after each batch, so an interrupted run picks up where it stopped.
+3. In one final write transaction the row counts and cent totals of the
+   old and new tables are compared, and the new tables replace the old
+   ones. Nothing is swapped if the totals differ.
+
+This is schema migration 2 (see migrations.py), so create_db() runs it
+automatically. Running it from the command line converts a database while
+the previous version of the application keeps serving it.
+
+Usage:
+    python migrate_money.py [users.db] [--batch-size 50000]
+"""
+
+import argparse
+import time
+
+import bank
+from bank import connection, get_db_name
+
+# Rows copied per write transaction
+BATCH_SIZE = 50000
+
+# Money column and full column list of each table converted
+TABLES = {
+    'users': ('balance', ('user_id', 'username', 'password', 'balance')),
+    'transactions': ('amount', ('transaction_id', 'user_id', 'transaction_type', 'amount', 'date')),
+}
+
+SETUP = (
+    '''
+    CREATE TABLE IF NOT EXISTS users_cents(
+        user_id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        password TEXT NOT NULL,
+        balance INTEGER DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS transactions_cents(
+        transaction_id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        transaction_type TEXT,
+        amount INTEGER,
+        date TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(user_id)
+    )
+    ''',
+    'CREATE TABLE IF NOT EXISTS money_migration(table_name TEXT PRIMARY KEY, last_rowid INTEGER NOT NULL)',
+)
+
+
+def converted(table, prefix=''):
+    """
+    Return the column list of `table` with its money column converted to cents.
+
+    Args:
+        table: Old table name
+        prefix: Prefix for every column, e.g. "NEW." inside a trigger
+    """
+    money, columns = TABLES[table]
+    return ', '.join(f'CAST(ROUND({prefix}{column} * 100) AS INTEGER)' if column == money else f'{prefix}{column}'
+                     for column in columns)
+
+
+def triggers(table):
+    """Return the statements creating the triggers that mirror `table` into its new table."""
+    new_table = f'{table}_cents'
+    columns = ', '.join(TABLES[table][1])
+    key = TABLES[table][1][0]
+    values = converted(table, 'NEW.')
+    return (
+        f'''CREATE TRIGGER IF NOT EXISTS {new_table}_insert AFTER INSERT ON {table} BEGIN
+            INSERT OR REPLACE INTO {new_table} ({columns}) VALUES ({values}); END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {new_table}_update AFTER UPDATE ON {table} BEGIN
+            DELETE FROM {new_table} WHERE {key} = OLD.{key};
+            INSERT INTO {new_table} ({columns}) VALUES ({values}); END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {new_table}_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM {new_table} WHERE {key} = OLD.{key}; END''',
+    )
+
+
+def needs_migration(db_name=None):
+    """Return True if the database still stores money as REAL dollars."""
+    with connection(db_name) as conn:
+        columns = {row[1]: row[2] for row in conn.execute('PRAGMA table_info(users)')}
+    return columns.get('balance', '').upper() == 'REAL'
+
+
+def totals(conn):
+    """
+    Return the row count and cent total of each old and new table.
+
+    Returns:
+        Dict of table name to (rows, cents) for the old tables, converted
+        row by row exactly as the copy converts them, and for the new tables
+    """
+    result = {}
+    for table, (money, _) in TABLES.items():
+        new_table = f'{table}_cents'
+        result[table] = conn.execute(
+            f'SELECT COUNT(*), COALESCE(SUM(CAST(ROUND({money} * 100) AS INTEGER)), 0) FROM {table}'
+        ).fetchone()
+        result[new_table] = conn.execute(f'SELECT COUNT(*), COALESCE(SUM({money}), 0) FROM {new_table}').fetchone()
+    return result
+
+
+def start(db_name=None):
+    """Create the new tables, the mirroring triggers and the progress table (idempotent)."""
+    with connection(db_name, immediate=True) as conn:
+        for statement in SETUP:
+            conn.execute(statement)
+        for table in TABLES:
+            for statement in triggers(table):
+                conn.execute(statement)
+            conn.execute('INSERT OR IGNORE INTO money_migration VALUES (?, 0)', (table,))
+
+
+def copy_rows(table, batch_size=BATCH_SIZE, db_name=None, on_progress=None):
+    """
+    Copy a table's existing rows into its new table, one rowid range per transaction.
+
+    Rows already written by the triggers are newer than the original and are
+    kept. Rows inserted after the copy started are left to the triggers.
+
+    Args:
+        table: Old table name
+        batch_size: Rows copied per write transaction
+        db_name: Database file name (default: the configured database)
+        on_progress: Called with (table, rows copied so far) after every batch
+
+    Returns:
+        Number of rows copied by this run
+    """
+    with connection(db_name) as conn:
+        last = conn.execute('SELECT last_rowid FROM money_migration WHERE table_name = ?', (table,)).fetchone()[0]
+        end = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM {table}').fetchone()[0]
+
+    new_table = f'{table}_cents'
+    columns = ', '.join(TABLES[table][1])
+    copied = 0
+    while last < end:
+        with connection(db_name, immediate=True) as conn:
+            upper = conn.execute(
+                f'SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? AND rowid <= ? '
+                f'ORDER BY rowid LIMIT ?)', (last, end, batch_size)
+            ).fetchone()[0] or end
+            copied += conn.execute(
+                f'INSERT OR IGNORE INTO {new_table} ({columns}) '
+                f'SELECT {converted(table)} FROM {table} WHERE rowid > ? AND rowid <= ?', (last, upper)
+            ).rowcount
+            conn.execute('UPDATE money_migration SET last_rowid = ? WHERE table_name = ?', (upper, table))
+        last = upper
+        if on_progress is not None:
+            on_progress(table, copied)
+    return copied
+
+
+def swap(db_name=None):
+    """
+    Check the totals and replace the old tables with the converted ones.
+
+    Returns:
+        totals() as checked, taken inside the swapping transaction
+
+    Raises:
+        RuntimeError: If any table's row count or cent total differs
+    """
+    with connection(db_name, immediate=True) as conn:
+        checked = totals(conn)
+        for table in TABLES:
+            if checked[table] != checked[f'{table}_cents']:
+                raise RuntimeError(f"{table}: {checked[table]} (rows, cents) before conversion "
+                                   f"but {checked[f'{table}_cents']} after")
+
+        for table in TABLES:
+            for suffix in ('insert', 'update', 'delete'):
+                conn.execute(f'DROP TRIGGER {table}_cents_{suffix}')
+        conn.execute('DROP TABLE transactions')
+        conn.execute('DROP TABLE users')
+        conn.execute('ALTER TABLE users_cents RENAME TO users')
+        conn.execute('ALTER TABLE transactions_cents RENAME TO transactions')
+        conn.execute('DROP TABLE money_migration')
+        conn.execute('CREATE INDEX idx_transactions_user_date ON transactions(user_id, date, transaction_id)')
+    bank.account_cache.clear()
+    return checked
+
+
+def migrate(db_name=None, batch_size=BATCH_SIZE, on_progress=None):
+    """
+    Convert a database from REAL dollars to INTEGER cents.
+
+    Safe to run again after an interruption, and a no-op on a database that
+    is already converted.
+
+    Args:
+        db_name: Database file name (default: the configured database)
+        batch_size: Rows copied per write transaction
+        on_progress: Called with (table, rows copied so far) after every batch
+
+    Returns:
+        Dict with the rows copied per table, the totals checked before the
+        swap, the real-valued totals before the conversion, elapsed seconds
+        and rows copied per second; None if there was nothing to do
+    """
+    if not needs_migration(db_name):
+        return None
+
+    began = time.perf_counter()
+    with connection(db_name) as conn:
+        real_totals = {table: conn.execute(f'SELECT SUM({money}) FROM {table}').fetchone()[0] or 0.0
+                       for table, (money, _) in TABLES.items()}
+
+    start(db_name)
+    copied = {table: copy_rows(table, batch_size, db_name, on_progress) for table in TABLES}
+    checked = swap(db_name)
+
+    seconds = time.perf_counter() - began
+    return {
+        'copied': copied,
+        'totals': {table: checked[table] for table in TABLES},
+        'real_totals': real_totals,
+        'seconds': seconds,
+        'rows_per_second': sum(copied.values()) / seconds if seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a bank database from REAL dollars to INTEGER cents")
+    parser.add_argument('db', nargs='?', default=None, help="database file (default: users.db or $BANK_DB)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    db_name = get_db_name(args.db)
+    report = migrate(db_name, args.batch_size,
+                     on_progress=lambda table, copied: print(f"{table}: {copied} rows copied", flush=True))
+    if report is None:
+        print(f"{db_name} already stores money as cents")
+        return
+
+    for table, (rows, cents) in report['totals'].items():
+        print(f"{table}: {rows} rows, total {bank.format_cents(cents)} "
+              f"(REAL sum before conversion: {report['real_totals'][table]!r})")
+    print(f"Converted {sum(report['copied'].values())} rows in {report['seconds']:.1f}s "
+          f"({report['rows_per_second']:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Children's Bank of Canada - Schema Migrations
+
+Ordered, versioned schema changes. The version a database has reached is
+kept in PRAGMA user_version, so create_db() costs one pragma read when the
+schema is already current, and only the missing migrations run otherwise.
+
+Migrations are registered with @migration(version, description):
+
+- A plain migration is called with a connection inside one write
+  transaction that also records its version, so it is applied entirely or
+  not at all.
+- A chunked migration (chunked=True) is called with the database name and
+  runs its own short transactions, so copying or backfilling a large table
+  never holds the write lock for long. It must be safe to run again after
+  an interruption; its version is recorded once it returns.
+
+Usage:
+    python migrations.py [users.db] [--status]
+"""
+
+import argparse
+import time
+
+import archive
+import migrate_money
+from bank import connection, get_db_name, rebuild_balance_snapshots
+
+# version: (description, chunked, apply)
+MIGRATIONS = {}
+
+# Net amount and count of each user's archived transactions (see archive.py)
+LEDGER_CHECKPOINTS = '''
+    CREATE TABLE IF NOT EXISTS ledger_checkpoints(
+        user_id INTEGER PRIMARY KEY,
+        through TEXT NOT NULL,
+        balance INTEGER NOT NULL,
+        transactions INTEGER NOT NULL
+    )
+'''
+
+
+def migration(version, description, chunked=False):
+    """
+    Register a migration.
+
+    Args:
+        version: Schema version the migration brings the database to
+        description: Short description shown in reports
+        chunked: True if the migration manages its own transactions
+    """
+    def register(apply):
+        if version in MIGRATIONS:
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS[version] = (description, chunked, apply)
+        return apply
+    return register
+
+
+def latest_version():
+    """Return the version of the newest registered migration."""
+    return max(MIGRATIONS)
+
+
+def current_version(db_name=None):
+    """Return the schema version the database has reached."""
+    with connection(db_name) as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def set_version(conn, version):
+    """Record a schema version inside the current transaction, never moving it backwards."""
+    if conn.execute('PRAGMA user_version').fetchone()[0] < version:
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def pending(db_name=None):
+    """Return (version, description) of every migration the database has not had yet."""
+    version = current_version(db_name)
+    return [(v, MIGRATIONS[v][0]) for v in sorted(MIGRATIONS) if v > version]
+
+
+def upgrade(db_name=None):
+    """
+    Apply every pending migration in version order.
+
+    Args:
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        List of (version, description, seconds) for the migrations applied
+    """
+    applied = []
+    for version, description in pending(db_name):
+        _, chunked, apply = MIGRATIONS[version]
+        began = time.perf_counter()
+        if chunked:
+            apply(db_name)
+            with connection(db_name, immediate=True) as conn:
+                set_version(conn, version)
+        else:
+            with connection(db_name, immediate=True) as conn:
+                # Another process may have applied it since pending() looked
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                    continue
+                apply(conn)
+                set_version(conn, version)
+        applied.append((version, description, time.perf_counter() - began))
+    return applied
+
+
+@migration(1, "Create users and transactions tables")
+def create_tables(conn):
+    # Create users table with user details and balance
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users(
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL,
+            balance INTEGER DEFAULT 0
+        )
+    ''')
+
+    # Create transactions table to track all financial activities
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transactions(
+            transaction_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            transaction_type TEXT,
+            amount INTEGER,
+            date TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )
+    ''')
+
+    # Index matching the history sort order so each page is a short index range scan
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+        ON transactions(user_id, date, transaction_id)
+    ''')
+
+
+@migration(2, "Convert REAL dollar columns to INTEGER cents", chunked=True)
+def money_to_cents(db_name):
+    # Does nothing on databases created with cents from the start
+    migrate_money.migrate(db_name)
+
+
+@migration(3, "Add daily closing balances for point-in-time queries", chunked=True)
+def daily_balances(db_name):
+    with connection(db_name, immediate=True) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_balances(
+                user_id INTEGER,
+                day TEXT,
+                balance INTEGER,
+                PRIMARY KEY(user_id, day)
+            ) WITHOUT ROWID
+        ''')
+        # Read by the rebuild below; normally added by migration 5
+        conn.execute(LEDGER_CHECKPOINTS)
+    rebuild_balance_snapshots(db_name=db_name)
+
+
+@migration(4, "Add job_runs for idempotent batch jobs")
+def job_runs(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS job_runs(
+            run_id TEXT PRIMARY KEY,
+            job TEXT NOT NULL,
+            params TEXT NOT NULL,
+            started TEXT NOT NULL,
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            accounts INTEGER NOT NULL DEFAULT 0,
+            finished TEXT
+        )
+    ''')
+
+
+@migration(5, "Add ledger_checkpoints for archived transactions")
+def ledger_checkpoints(conn):
+    conn.execute(LEDGER_CHECKPOINTS)
+
+
+@migration(6, "Add covering indexes for transaction search")
+def search_indexes(conn):
+    # Every column a history page or search reads is in each index, so
+    # filtered queries never look up the table rows. The history index
+    # keeps its name and leading columns, and gains the other two.
+    conn.execute('DROP INDEX IF EXISTS idx_transactions_user_date')
+    conn.execute('''
+        CREATE INDEX idx_transactions_user_date
+        ON transactions(user_id, date, transaction_id, transaction_type, amount)
+    ''')
+    # Searches for one transaction type, newest or oldest first
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_type
+        ON transactions(user_id, transaction_type, date, transaction_id, amount)
+    ''')
+    # Searches by amount range and the largest/smallest sort orders
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_amount
+        ON transactions(user_id, amount, date, transaction_id, transaction_type)
+    ''')
+
+
+@migration(7, "Add transfers pairing debit and credit ledger rows")
+def transfers(conn):
+    # One row per transfer: its Transfer Out and Transfer In ledger rows,
+    # and the batch run that posted it, if any
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transfers(
+            debit_id INTEGER PRIMARY KEY,
+            credit_id INTEGER NOT NULL UNIQUE,
+            run_id TEXT
+        )
+    ''')
+
+
+@migration(8, "Rebuild transactions with AUTOINCREMENT so IDs are never reused", chunked=True)
+def transaction_ids(db_name):
+    # Without AUTOINCREMENT, SQLite hands out the IDs of the newest rows
+    # again once the archive has deleted them. The sequence also starts
+    # above every archived ID, in case that has already happened.
+    highest = archive.highest_archived_id(db_name)
+    with connection(db_name, immediate=True) as conn:
+        table = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone()
+        if 'AUTOINCREMENT' not in table[0].upper():
+            indexes = [sql for (sql,) in conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'transactions' AND sql IS NOT NULL"
+            )]
+            conn.execute('''
+                CREATE TABLE transactions_autoincrement(
+                    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    transaction_type TEXT,
+                    amount INTEGER,
+                    date TEXT,
+                    FOREIGN KEY(user_id) REFERENCES users(user_id)
+                )
+            ''')
+            conn.execute('INSERT INTO transactions_autoincrement '
+                         '(transaction_id, user_id, transaction_type, amount, date) '
+                         'SELECT transaction_id, user_id, transaction_type, amount, date FROM transactions')
+            conn.execute('DROP TABLE transactions')
+            conn.execute('ALTER TABLE transactions_autoincrement RENAME TO transactions')
+            for sql in indexes:
+                conn.execute(sql)
+
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+        live = conn.execute('SELECT COALESCE(MAX(transaction_id), 0) FROM transactions').fetchone()[0]
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'transactions'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', ?)",
+                     (max(highest, live, sequence[0] if sequence else 0),))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring a bank database up to the latest schema version")
+    parser.add_argument('db', nargs='?', default=None, help="database file (default: users.db or $BANK_DB)")
+    parser.add_argument('--status', action='store_true', help="only list the pending migrations")
+    args = parser.parse_args()
+
+    db_name = get_db_name(args.db)
+    print(f"{db_name}: schema version {current_version(db_name)} of {latest_version()}")
+    if args.status:
+        for version, description in pending(db_name):
+            print(f"  pending {version}: {description}")
+        return
+
+    for version, description, seconds in upgrade(db_name):
+        print(f"  applied {version}: {description} ({seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ Children's Bank of Canada - Banking Application
 A simple banking application built with Python and Tkinter that allows users to:
 - Create and manage accounts
 - Perform deposits and withdrawals
-- View transaction history
+- View and search transaction history
 - Reset passwords
 
 Features:
@@ -14,75 +14,200 @@ Features:
 """
 
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, ttk
 import sqlite3 as db
-import hashlib
-
-def hash_password(password):
-    """Hash a password using SHA-256 for secure storage."""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def create_db():
-    """
-    Initialize the SQLite database and create necessary tables if they don't exist.
-    Tables:
-    - users: Stores user account information
-    - transactions: Stores transaction history
-    """
-    conn = db.connect('users.db')
-    c = conn.cursor()
-
-    # Create users table with user details and balance
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users(
-            user_id INTEGER PRIMARY KEY,
-            username TEXT NOT NULL,
-            password TEXT NOT NULL,
-            balance REAL DEFAULT 0.0
-        )
-    ''')
-
-    # Create transactions table to track all financial activities
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS transactions(
-            transaction_id INTEGER PRIMARY KEY,
-            user_id INTEGER,
-            transaction_type TEXT,
-            amount REAL,
-            date TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(user_id)
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
-
-def check_credentials(user_id, password, root):
+import argparse
+import csv
+import json
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bank import (create_db, hash_password, post_transaction, transaction_history_page, check_amount, format_cents,
+                  to_cents, account_cache, change_marker, connection, latest_transaction_id, transactions_since,
+                  InsufficientFunds, UserNotFound)
+from service import InvalidCredentials, UserExists, authenticate, get_account, register, search
+from service import reset_password as change_password
+from importer import import_transactions, BATCH_SIZE
+from exporter import export_transactions
+from analytics import monthly_statement
+
+# Number of history rows fetched each time the history table needs more
+HISTORY_PAGE_SIZE = 100
+
+# The application's single Tk root, the screens already built on it and the one on display
+app = None
+screens = {}
+current_screen = None
+
+# Worker threads for database and hashing work, and the queue that hands
+# their finished futures back to the Tk thread
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bank-worker")
+finished = queue.Queue()
+
+# Milliseconds between checks of the finished queue
+POLL_INTERVAL = 50
+
+# Milliseconds between checks for changes committed by other sessions
+CHANGE_INTERVAL = 1000
+
+# Screens that follow changes to the database, keyed by their frame: dicts of their load and show
+# callbacks, the change marker last seen and whether a background update is still pending
+live_updates = {}
+
+def get_app():
+    """Return the application's Tk root window, creating it on first use."""
+    global app
+    if app is None:
+        app = tk.Tk()
+        app.config(bg='black')
+        app.after(POLL_INTERVAL, poll_background)
+        app.after(CHANGE_INTERVAL, poll_changes)
+    return app
+
+def show_error(error):
+    """Report an unexpected error from background work."""
+    messagebox.showerror("Error", f"An error occurred: {error}")
+
+def run_in_background(work, on_done, button=None, on_error=show_error):
+    """
+    Run blocking work on a worker thread without freezing the GUI.
+
+    The result is handed back through the `finished` queue and delivered on
+    the Tk thread by poll_background(). While the work is pending, `button`
+    is disabled and shows "Working...".
+    
+    Args:
+        work: Function to run on a worker thread
+        on_done: Called on the Tk thread with the result of work()
+        button: Button that started the work, if any
+        on_error: Called on the Tk thread with the exception if work() raises
+
+    Returns:
+        The Future of the background work
+    """
+    restore = None
+    if button is not None:
+        text = button.cget('text')
+        button.config(text="Working...", state=tk.DISABLED)
+        restore = lambda: button.config(text=text, state=tk.NORMAL)
+
+    future = executor.submit(work)
+    future.add_done_callback(lambda future: finished.put((future, on_done, on_error, restore)))
+    return future
+
+def poll_background():
+    """Deliver finished background work to its callbacks, then check again later."""
+    while True:
+        try:
+            future, on_done, on_error, restore = finished.get_nowait()
+        except queue.Empty:
+            break
+
+        if restore is not None and app is not None:
+            restore()
+        try:
+            result = future.result()
+        except Exception as e:
+            on_error(e)
+        else:
+            on_done(result)
+
+    if app is not None:
+        app.after(POLL_INTERVAL, poll_background)
+
+def follow_changes(frame, load, show):
+    """
+    Bring `frame` up to date while it is on display whenever the database has changed.
+
+    The reads run in the background like any other database work; only one
+    update per screen is in flight at a time.
+
+    Args:
+        frame: Frame of the screen
+        load: Called on the Tk thread; returns the work to run in the
+            background, or None if the screen has nothing to follow yet
+        show: Called on the Tk thread with the result of that work
+    """
+    live_updates[frame] = {'load': load, 'show': show, 'marker': change_marker(), 'pending': False}
+
+def poll_changes():
+    """Bring the screen on display up to date if anything was committed since it looked, then check again later."""
+    watcher = live_updates.get(current_screen)
+    if watcher is not None and not watcher['pending']:
+        marker = change_marker()
+        work = watcher['load']() if marker != watcher['marker'] else None
+        if work is not None:
+            watcher['marker'], watcher['pending'] = marker, True
+
+            def done(result):
+                watcher['pending'] = False
+                watcher['show'](result)
+
+            def failed(error):
+                watcher['pending'] = False
+                show_error(error)
+
+            run_in_background(work, done, on_error=failed)
+
+    if app is not None:
+        app.after(CHANGE_INTERVAL, poll_changes)
+
+def show_screen(name, title, geometry, build, *args):
+    """
+    Switch the application window to a screen, building it on first use.
+
+    Each screen is built once into its own frame and cached. `build(frame)`
+    lays out the screen's widgets and returns a refresh callback, which is
+    called with `args` every time the screen is shown to load current data.
+    
+    Args:
+        name: Cache key of the screen
+        title: Window title while the screen is shown
+        geometry: Window size while the screen is shown
+        build: Function that lays out the screen and returns its refresh callback
+        args: Arguments passed to the refresh callback
+    """
+    global current_screen
+    root = get_app()
+
+    if name not in screens:
+        frame = tk.Frame(root, bg='black')
+        screens[name] = (frame, build(frame))
+    frame, refresh = screens[name]
+    refresh(*args)
+
+    if current_screen is not None and current_screen is not frame:
+        current_screen.pack_forget()
+    root.title(title)
+    root.geometry(geometry)
+    frame.pack(fill='both', expand=True)
+    current_screen = frame
+
+def check_credentials(user_id, password, button=None):
     """
     Verify user credentials during login.
+    The lookup and password hashing run in the background.
     
     Args:
         user_id: User's identification number
         password: User's password
-        root: Current Tkinter window
+        button: Login button to show as pending
     """
-    conn = db.connect('users.db')
-    c = conn.cursor()
-
-    c.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-    user = c.fetchone()
+    def done(user):
+        account_dashboard(*user)
 
-    conn.close()
-    if user is None:
-        messagebox.showerror("Failure", "User Id not found, Try again!")
-        login_page()
-    else:
-        if user[2] == hash_password(password):
-            account_dashboard(user_id, user[1], user[3])
-        else:
+    def failed(error):
+        if isinstance(error, UserNotFound):
+            messagebox.showerror("Failure", "User Id not found, Try again!")
+        elif isinstance(error, InvalidCredentials):
             messagebox.showerror("Failure", "Incorrect Password, Try again!")
-            login_page()
-        close_window(root)
+        else:
+            show_error(error)
+        login_page()
+
+    run_in_background(lambda: authenticate(user_id, password), done, button, failed)
 
 def account_dashboard(user_id, username, balance):
     """
@@ -94,286 +219,682 @@ def account_dashboard(user_id, username, balance):
         username: User's name
         balance: Current account balance
     """
-    # Create main dashboard window
-    dashboard_window = tk.Tk()
-    dashboard_window.title("Account Dashboard")
-    dashboard_window.geometry("650x400")
-    dashboard_window.config(bg='black')
+    show_screen("dashboard", "Account Dashboard", "650x400", build_dashboard_screen, user_id, username, balance)
+
+def build_dashboard_screen(frame):
+    """
+    Lay out the dashboard screen.
+
+    The balance follows postings made by other sessions while the
+    dashboard is open.
+    
+    Args:
+        frame: Frame to build the screen in
+
+    Returns:
+        Refresh callback taking (user_id, username, balance)
+    """
+    # User currently shown on the dashboard
+    current = {}
 
     # Close button configuration
-    button = tk.Button(dashboard_window, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black', 
-                      command=lambda: close_window(dashboard_window), bd=0, highlightcolor='red')
+    button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black', 
+                      command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
     button.grid(row=0, column=4, sticky='ne', padx=10, pady=5)
 
     # Bank name header
-    label = tk.Label(dashboard_window, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
+    label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
     label.grid(row=0, column=1, sticky='nsew', padx=10, pady=20)
 
     # Display user information
-    user_id_label = tk.Label(dashboard_window, text="User ID: ", font=('Arial', 14), bg='black', fg='#FFD6BA')
+    user_id_label = tk.Label(frame, text="User ID: ", font=('Arial', 14), bg='black', fg='#FFD6BA')
     user_id_label.grid(row=1, column=0, padx=25, pady=10, sticky="e")
 
-    user_id_tab = tk.Label(dashboard_window, text=user_id, font=('Arial', 14), bg='black', fg='#FAF9F9')
+    user_id_tab = tk.Label(frame, font=('Arial', 14), bg='black', fg='#FAF9F9')
     user_id_tab.grid(row=1, column=1, padx=0, pady=10, sticky="w")
 
-    username_label = tk.Label(dashboard_window, text="Username: ", font=('Arial', 14), bg='black', fg='#FFD6BA')
+    username_label = tk.Label(frame, text="Username: ", font=('Arial', 14), bg='black', fg='#FFD6BA')
     username_label.grid(row=1, column=2, padx=0, pady=10, sticky="e")
 
-    username_tab = tk.Label(dashboard_window, text=username, font=('Arial', 14), bg='black', fg='#FAF9F9')
+    username_tab = tk.Label(frame, font=('Arial', 14), bg='black', fg='#FAF9F9')
     username_tab.grid(row=1, column=3, padx=0, pady=10, sticky="w")
 
     # Balance display
-    balance_tab = tk.Label(dashboard_window, text="Balance : ", font=("Arial", 16), bg="black", fg="#FFD6BA")
+    balance_tab = tk.Label(frame, text="Balance : ", font=("Arial", 16), bg="black", fg="#FFD6BA")
     balance_tab.grid(row=3, column=1, sticky='new', padx=5, pady=10)
 
-    balance_label = tk.Label(dashboard_window, text=balance, fg="#FAF9F9", bg="black", font=("Arial", 14))
+    balance_label = tk.Label(frame, fg="#FAF9F9", bg="black", font=("Arial", 14))
     balance_label.grid(row=5, column=1, padx=5, pady=0, sticky='new')
 
     # Action buttons
-    transaction_button = tk.Button(dashboard_window, text="Make Transaction", font=('Arial', 10), 
-                                 fg='white', bg='black', command=lambda: make_transaction(user_id, dashboard_window))
+    transaction_button = tk.Button(frame, text="Make Transaction", font=('Arial', 10), 
+                                 fg='white', bg='black', command=lambda: make_transaction(current['user_id']))
     transaction_button.grid(row=6, column=0, sticky='e', padx=5, pady=70)
 
-    history_button = tk.Button(dashboard_window, text="View Transaction History", font=('Arial', 10), 
-                              fg='white', bg='black', command=lambda: view_transaction_history(user_id, dashboard_window))
+    history_button = tk.Button(frame, text="View Transaction History", font=('Arial', 10), 
+                              fg='white', bg='black', command=lambda: view_transaction_history(current['user_id']))
     history_button.grid(row=6, column=1, padx=75, pady=70)
 
-    logout_button = tk.Button(dashboard_window, text="Logout", font=('Arial', 10), 
-                            fg='white', bg='black', command=lambda: logout(dashboard_window))
+    statement_button = tk.Button(frame, text="Monthly Statement", font=('Arial', 10),
+                                fg='white', bg='black', command=lambda: view_statement(current['user_id']))
+    statement_button.grid(row=6, column=2, sticky='w', padx=5, pady=70)
+
+    search_button = tk.Button(frame, text="Search Transactions", font=('Arial', 10),
+                             fg='white', bg='black', command=lambda: search_transactions(current['user_id']))
+    search_button.grid(row=7, column=1, padx=75, pady=0)
+
+    logout_button = tk.Button(frame, text="Logout", font=('Arial', 10), 
+                            fg='white', bg='black', command=logout)
     logout_button.grid(row=7, column=3, sticky='sw', padx=5, pady=0)
 
-def make_transaction(user_id, root):
+    def refresh(user_id, username, balance):
+        """Show the given user's details."""
+        current['user_id'] = user_id
+        current['balance'] = balance
+        user_id_tab.config(text=user_id)
+        username_tab.config(text=username)
+        balance_label.config(text=f"${format_cents(balance)}")
+
+    def load_balance():
+        """Return background work that reads the balance again."""
+        user_id = current['user_id']
+
+        def work():
+            # Something committed since the last look, so the cached row may be stale
+            account_cache.invalidate(user_id)
+            return user_id, get_account(user_id)[2]
+        return work
+
+    def show_balance(result):
+        """Show the balance again if it has changed."""
+        user_id, balance = result
+        if user_id == current['user_id'] and balance != current['balance']:
+            current['balance'] = balance
+            balance_label.config(text=f"${format_cents(balance)}")
+
+    follow_changes(frame, load_balance, show_balance)
+    return refresh
+
+def make_transaction(user_id):
     """
     Handle deposit and withdrawal transactions.
     
     Args:
         user_id: User's identification number
-        root: Current Tkinter window
     """
-    close_window(root)
-    conn = db.connect('users.db')
-    c = conn.cursor()
-
     # Get user information
-    c.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-    user = c.fetchone()
-    conn.close()
-
-    if not user:
+    try:
+        user = get_account(user_id)
+    except UserNotFound:
         tk.messagebox.showerror("Error", "User not found.")
         return
 
-    # Create transaction window
-    root = tk.Tk()
-    root.geometry("650x300")
-    root.title("New Transaction")
-    root.config(bg="black")
+    show_screen("transaction", "New Transaction", "650x300", build_transaction_screen, user)
+
+def build_transaction_screen(frame):
+    """
+    Lay out the transaction screen.
+    
+    Args:
+        frame: Frame to build the screen in
+
+    Returns:
+        Refresh callback taking the user's database row
+    """
+    # User the transaction is made for
+    current = {}
 
     # Window elements
-    close_button = tk.Button(root, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
-                           command=lambda: close_window(root), bd=0, highlightcolor='red')
+    close_button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
+                           command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
     close_button.grid(row=0, column=4, sticky='ne', padx=10, pady=5)
 
-    header_label = tk.Label(root, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
+    header_label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
     header_label.grid(row=0, column=1, sticky='nsew', padx=10, pady=20)
 
     # Transaction amount input
-    amount_label = tk.Label(root, text="Amount", font=("Arial", 14), fg="#FFD6BA", bg="black")
+    amount_label = tk.Label(frame, text="Amount", font=("Arial", 14), fg="#FFD6BA", bg="black")
     amount_label.grid(row=1, column=0, sticky='e', padx=10, pady=10)
 
-    amount_entry = tk.Entry(root, font=("Arial", 14), fg="#FAF9F9", bg="#0D1821")
+    amount_entry = tk.Entry(frame, font=("Arial", 14), fg="#FAF9F9", bg="#0D1821")
     amount_entry.grid(row=1, column=1, pady=10)
 
     # Transaction type selection
-    type_label = tk.Label(root, text="Type", font=("Arial", 14), fg="#FFD6BA", bg="Black")
+    type_label = tk.Label(frame, text="Type", font=("Arial", 14), fg="#FFD6BA", bg="Black")
     type_label.grid(row=2, column=0, padx=10, pady=10)
 
     options = ["Withdraw", "Deposit"]
     selected_option = tk.StringVar(value=options[0])
 
-    dropdown = tk.OptionMenu(root, selected_option, *options)
+    dropdown = tk.OptionMenu(frame, selected_option, *options)
     dropdown.config(bg="black", fg='#FFD6BA', font=("Arial", 12))
     dropdown.grid(row=2, column=1, pady=10)
 
     def process_transaction():
         """Process the transaction and update the database."""
+        user = current['user']
         amount_str = amount_entry.get()
         transaction_type = selected_option.get()
 
-        # Validate amount
-        if not amount_str.isdigit():
-            tk.messagebox.showerror("Invalid Input", "Please enter a valid numeric amount.")
+        # Validate amount, converting dollars to exact cents
+        try:
+            amount = to_cents(amount_str)
+            check_amount(amount)
+        except ValueError:
+            tk.messagebox.showerror("Invalid Input", "Please enter a valid amount, e.g. 12.50.")
             return
 
-        amount = float(amount_str)
-
-        # Database operation
-        conn = db.connect('users.db')
-        c = conn.cursor()
-
-        # Get current balance
-        c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        current_balance = c.fetchone()[0]
+        # Database operation, run in the background
+        def done(new_balance):
+            tk.messagebox.showinfo("Success", f"{transaction_type} of ${format_cents(amount)} successful!")
+            account_dashboard(user[0], user[1], new_balance)
 
-        new_balance = current_balance
-        if transaction_type == "Withdraw":
-            if current_balance < amount:
+        def failed(error):
+            if isinstance(error, InsufficientFunds):
                 tk.messagebox.showerror("Error", "Insufficient balance for withdrawal.")
-                conn.close()
-                return
-            new_balance -= amount
-        elif transaction_type == "Deposit":
-            new_balance += amount
-
-        # Update balance
-        c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-        conn.commit()
-
-        # Record transaction
-        c.execute(
-            "INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, datetime('now'))",
-            (user_id, transaction_type, amount)
-        )
-        conn.commit()
-        conn.close()
-
-        tk.messagebox.showinfo("Success", f"{transaction_type} of ${amount} successful!")
-        root.destroy()
-        account_dashboard(user[0], user[1], new_balance)
+            elif isinstance(error, ValueError):
+                tk.messagebox.showerror("Invalid Input", "Please enter a valid numeric amount.")
+            else:
+                show_error(error)
+
+        run_in_background(lambda: post_transaction(user[0], transaction_type, amount),
+                          done, process_button, failed)
 
     # Process transaction button
-    process_button = tk.Button(root, text="Process Transaction", font=("Arial", 14), fg="#FFD6BA", bg="black",
+    process_button = tk.Button(frame, text="Process Transaction", font=("Arial", 14), fg="#FFD6BA", bg="black",
                              command=process_transaction)
     process_button.grid(row=3, column=1, pady=20)
 
-def view_transaction_history(user_id, root):
+    def refresh(user):
+        """Start a blank transaction for the given user."""
+        current['user'] = user
+        amount_entry.delete(0, tk.END)
+        selected_option.set(options[0])
+
+    return refresh
+
+def configure_table_style(widget):
+    """Define the "History.Treeview" style shared by the history and statement tables."""
+    style = ttk.Style(widget)
+    style.configure("History.Treeview", font=('Arial', 12), rowheight=24,
+                    background="black", fieldbackground="black", foreground="white")
+    style.configure("History.Treeview.Heading", font=('Arial', 12, 'bold'), background="black", foreground="#FFD6BA")
+
+def history_table(parent, user_id, first_page=None):
     """
-    Display user's transaction history in a tabular format.
+    Build a scrollable table of the user's transactions, newest first.
+
+    Rows are loaded one page at a time into a ttk.Treeview, and the next page
+    is fetched only when the user scrolls near the bottom, so opening the
+    table costs the same for ten transactions or a hundred thousand.
+    Transactions committed after the table was built are added with the
+    returned callback.
+    
+    Args:
+        parent: Widget to place the table in
+        user_id: User's identification number
+        first_page: (rows, cursor) of the first page if it was already read,
+            e.g. in the background
+
+    Returns:
+        (frame, add_transactions) where frame holds the table and
+        add_transactions takes (transaction_id, transaction_type, amount,
+        date) rows from bank.transactions_since(); None if the user has no
+        transactions
+    """
+    transactions, cursor = first_page or transaction_history_page(user_id, HISTORY_PAGE_SIZE)
+    if not transactions:
+        return None
+
+    configure_table_style(parent)
+    frame = tk.Frame(parent, bg="black")
+    tree = ttk.Treeview(frame, columns=("type", "amount", "date"), show="headings",
+                        style="History.Treeview", height=7)
+    for column, header, width in (("type", "Type", 110), ("amount", "Amount", 110), ("date", "Date", 200)):
+        tree.heading(column, text=header)
+        tree.column(column, width=width, anchor="center")
+
+    scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+
+    def load_page(rows):
+        """Append a page of transactions to the table."""
+        for transaction_type, amount, date in rows:
+            tree.insert("", tk.END, values=(transaction_type, format_cents(amount), date))
+
+    def on_scroll(first, last):
+        """Update the scrollbar and fetch the next page near the bottom."""
+        nonlocal cursor
+        scrollbar.set(first, last)
+        if cursor is not None and float(last) > 0.9:
+            rows, cursor = transaction_history_page(user_id, HISTORY_PAGE_SIZE, cursor)
+            load_page(rows)
+
+    def add_transactions(rows):
+        """Insert new transactions at their place in date order among the loaded rows."""
+        for transaction_id, transaction_type, amount, date in rows:
+            # Rows past the last loaded page come with a later page
+            if cursor is not None and (date, transaction_id) < tuple(cursor):
+                continue
+            # Newer than every loaded row, so it goes above rows of the same date
+            children = tree.get_children()
+            position = next((index for index, item in enumerate(children) if tree.set(item, "date") <= date),
+                            len(children))
+            tree.insert("", position, values=(transaction_type, format_cents(amount), date))
+
+    tree.configure(yscrollcommand=on_scroll)
+    load_page(transactions)
+
+    tree.grid(row=0, column=0, sticky="nsew")
+    scrollbar.grid(row=0, column=1, sticky="ns")
+    frame.grid_rowconfigure(0, weight=1)
+    frame.grid_columnconfigure(0, weight=1)
+    return frame, add_transactions
+
+def view_transaction_history(user_id):
+    """
+    Display user's transaction history in a scrollable table.
     
     Args:
         user_id: User's identification number
-        root: Current Tkinter window
     """
-    close_window(root)
-    conn = db.connect('users.db')
-    c = conn.cursor()
-
-    # Fetch transaction history
-    c.execute('SELECT transaction_type, amount, date FROM transactions WHERE user_id = ? ORDER BY date DESC', (user_id,))
-    transactions = c.fetchall()
-
     # Get user details
-    c.execute('SELECT user_id, username, balance FROM users WHERE user_id = ?', (user_id,))
-    user = c.fetchone()
-    conn.close()
-
-    if not user:
+    try:
+        user = get_account(user_id)
+    except UserNotFound:
         tk.messagebox.showerror("Error", "User not found.")
         return
 
-    # Create history window
-    root = tk.Tk()
-    root.title("Transaction History")
-    root.geometry("550x350")
-    root.config(bg="black")
+    show_screen("history", "Transaction History", "550x350", build_history_screen, user)
+
+def build_history_screen(frame):
+    """
+    Lay out the transaction history screen.
+
+    While the screen is open, transactions posted by other sessions are
+    added to the table and the balance is kept current.
+    
+    Args:
+        frame: Frame to build the screen in
+
+    Returns:
+        Refresh callback taking (user_id, username, balance) of the user
+    """
+    # User whose history is shown and the widget currently holding it
+    current = {}
 
     # Window elements
-    close_button = tk.Button(root, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
-                           command=lambda: close_window(root), bd=0, highlightcolor='red')
+    close_button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
+                           command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
     close_button.grid(row=0, column=3, sticky='ne', padx=10, pady=5)
 
-    bank_label = tk.Label(root, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
+    bank_label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
     bank_label.grid(row=0, column=1, columnspan=2, sticky='nsew', padx=10, pady=10)
 
-    balance_label = tk.Label(root, text=f"Current Balance: ${user[2]:.2f}", font=('Arial', 14), fg="white", bg="black")
+    balance_label = tk.Label(frame, font=('Arial', 14), fg="white", bg="black")
     balance_label.grid(row=1, column=0, columnspan=4, sticky='w', padx=10, pady=10)
 
-    # Display transaction data
-    if not transactions:
-        no_data_label = tk.Label(root, text="No transactions found.", font=('Arial', 14), fg="white", bg="black")
-        no_data_label.grid(row=2, column=0, columnspan=4, pady=20)
-    else:
-        # Headers
-        headers = ["Type", "Amount", "Date"]
-        for idx, header in enumerate(headers):
-            label = tk.Label(root, text=header, font=('Arial', 12, 'bold'), fg="#FFD6BA", bg="black",
-                           borderwidth=1, relief="solid")
-            label.grid(row=2, column=idx, padx=5, pady=5, sticky="nsew")
-
-        # Transaction data
-        for row_idx, transaction in enumerate(transactions, start=3):
-            for col_idx, value in enumerate(transaction):
-                label = tk.Label(root, text=value, font=('Arial', 12), fg="white", bg="black",
-                               borderwidth=1, relief="solid")
-                label.grid(row=row_idx, column=col_idx, padx=5, pady=5, sticky="nsew")
-
-    def combined(user_id, username, balance, root):
-        """Return to dashboard."""
-        close_window(root)
-        account_dashboard(user[0], user[1], user[2])
-
     # Back button
-    back_button = tk.Button(root, text="Back", font=("Arial", 11), fg="#FFD6BA", bg="black",
-                          command=lambda: combined(user[0], user[1], user[2], root))
-    back_button.grid(row=20, column=3, columnspan=2, padx=75, pady=55)
+    back_button = tk.Button(frame, text="Back", font=("Arial", 11), fg="#FFD6BA", bg="black",
+                          command=lambda: account_dashboard(*current['user']))
+    back_button.grid(row=20, column=3, columnspan=2, padx=75, pady=10)
+
+    def set_content(widget, **grid):
+        """Replace the table or message below the balance."""
+        if 'content' in current:
+            current['content'].destroy()
+        widget.grid(row=2, column=0, columnspan=4, **grid)
+        current['content'] = widget
+
+    def refresh(user):
+        """Show the given user's balance and load a fresh history table in the background."""
+        # Identifies this load, so results of an earlier one are ignored
+        view = current['view'] = object()
+        current['user'] = user
+        current['last_seen'] = current['add'] = None
+        balance_label.config(text=f"Current Balance: ${format_cents(user[2])}")
+        set_content(tk.Label(frame, text="Loading...", font=('Arial', 14), fg="white", bg="black"), pady=20)
+
+        def load():
+            # Read in one snapshot, so later updates pick up exactly the later rows
+            with connection():
+                return latest_transaction_id(), transaction_history_page(user[0], HISTORY_PAGE_SIZE)
+
+        def show(loaded):
+            if current['view'] is not view:
+                return
+            last_seen, first_page = loaded
+            table = history_table(frame, user[0], first_page)
+            if table is None:
+                set_content(tk.Label(frame, text="No transactions found.", font=('Arial', 14), fg="white",
+                                     bg="black"), pady=20)
+            else:
+                table, current['add'] = table
+                set_content(table, sticky="nsew", padx=10)
+            current['last_seen'] = last_seen
+
+        run_in_background(load, show)
+
+    def load_changes():
+        """Return background work that reads the user's new transactions, or None while the table is loading."""
+        if current['last_seen'] is None:
+            return None
+        view, user_id, last_seen = current['view'], current['user'][0], current['last_seen']
+        return lambda: (view, transactions_since(user_id, last_seen))
+
+    def show_changes(result):
+        """Add the user's new transactions and show the current balance."""
+        view, (balance, rows, last_seen) = result
+        if current['view'] is not view:
+            return
+        current['last_seen'] = last_seen
+        user = current['user']
+        if balance != user[2]:
+            account_cache.invalidate(user[0])
+            current['user'] = (user[0], user[1], balance)
+            balance_label.config(text=f"Current Balance: ${format_cents(balance)}")
+        if rows and current['add'] is None:
+            refresh(current['user'])
+        elif rows:
+            current['add'](rows)
+
+    follow_changes(frame, load_changes, show_changes)
+    return refresh
+
+def view_statement(user_id):
+    """
+    Display the user's monthly statement.
 
-def logout(root):
+    Args:
+        user_id: User's identification number
     """
-    Handle user logout.
-    
+    try:
+        user = get_account(user_id)
+    except UserNotFound:
+        tk.messagebox.showerror("Error", "User not found.")
+        return
+
+    show_screen("statement", "Monthly Statement", "750x380", build_statement_screen, user)
+
+def build_statement_screen(frame):
+    """
+    Lay out the monthly statement screen.
+
     Args:
-        root: Current Tkinter window
+        frame: Frame to build the screen in
+
+    Returns:
+        Refresh callback taking (user_id, username, balance) of the user
     """
-    close_window(root)
-    login_page()
+    # User whose statement is shown
+    current = {}
 
-def new_user(root):
+    close_button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
+                           command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
+    close_button.grid(row=0, column=3, sticky='ne', padx=10, pady=5)
+
+    bank_label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
+    bank_label.grid(row=0, column=1, columnspan=2, sticky='nsew', padx=10, pady=10)
+
+    status_label = tk.Label(frame, font=('Arial', 14), fg="white", bg="black")
+    status_label.grid(row=1, column=0, columnspan=4, sticky='w', padx=10, pady=10)
+
+    configure_table_style(frame)
+    table = tk.Frame(frame, bg="black")
+    table.grid(row=2, column=0, columnspan=4, sticky="nsew", padx=10)
+    columns = (("month", "Month", 80), ("deposits", "Deposits", 100), ("withdrawals", "Withdrawals", 100),
+               ("count", "Transactions", 95), ("closing", "Closing", 100), ("low", "Lowest", 100),
+               ("high", "Highest", 100))
+    tree = ttk.Treeview(table, columns=[column for column, _, _ in columns], show="headings",
+                        style="History.Treeview", height=8)
+    for column, header, width in columns:
+        tree.heading(column, text=header)
+        tree.column(column, width=width, anchor="center")
+    scrollbar = ttk.Scrollbar(table, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    tree.grid(row=0, column=0, sticky="nsew")
+    scrollbar.grid(row=0, column=1, sticky="ns")
+
+    back_button = tk.Button(frame, text="Back", font=("Arial", 11), fg="#FFD6BA", bg="black",
+                          command=lambda: account_dashboard(*current['user']))
+    back_button.grid(row=20, column=3, padx=10, pady=10)
+
+    def show(user, rows):
+        """Fill the table, unless another user's statement was opened meanwhile."""
+        if current.get('user') != user:
+            return
+        status_label.config(text=f"Statement for {user[1]}" if rows else "No transactions found.")
+        for _, month, deposits, deposit_count, withdrawals, withdrawal_count, _, closing, low, high in reversed(rows):
+            tree.insert("", tk.END, values=(month, format_cents(deposits), format_cents(withdrawals),
+                                            deposit_count + withdrawal_count, format_cents(closing),
+                                            format_cents(low), format_cents(high)))
+
+    def refresh(user):
+        """Show the given user's statement, newest month first."""
+        current['user'] = user
+        status_label.config(text="Loading statement...")
+        tree.delete(*tree.get_children())
+        run_in_background(lambda: monthly_statement(user[0]), lambda rows: show(user, rows))
+
+    return refresh
+
+def search_transactions(user_id):
     """
-    Display the new user registration window.
-    
+    Display the transaction search screen.
+
     Args:
-        root: Current Tkinter window
+        user_id: User's identification number
     """
-    close_window(root)
+    try:
+        user = get_account(user_id)
+    except UserNotFound:
+        tk.messagebox.showerror("Error", "User not found.")
+        return
+
+    show_screen("search", "Search Transactions", "650x520", build_search_screen, user)
 
-    # Create registration window
-    root2 = tk.Tk()
-    root2.title("New Account Registration")
-    root2.geometry("650x250")
-    root2.config(bg='black')
+def build_search_screen(frame):
+    """
+    Lay out the transaction search screen.
+
+    Results are loaded in the background one page at a time, and the next
+    page is fetched when the user scrolls near the bottom of the table.
+
+    Args:
+        frame: Frame to build the screen in
+
+    Returns:
+        Refresh callback taking (user_id, username, balance) of the user
+    """
+    # User being searched, the filters of the shown results and their next page
+    current = {}
 
+    close_button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
+                           command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
+    close_button.grid(row=0, column=3, sticky='ne', padx=10, pady=5)
+
+    bank_label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
+    bank_label.grid(row=0, column=1, columnspan=2, sticky='nsew', padx=10, pady=10)
+
+    # Filters
+    types = ["All", "Deposit", "Withdraw", "Transfer In", "Transfer Out", "Interest", "Fee"]
+    selected_type = tk.StringVar(value=types[0])
+    sorts = {"Newest": 'newest', "Oldest": 'oldest', "Largest": 'largest', "Smallest": 'smallest'}
+    selected_sort = tk.StringVar(value="Newest")
+
+    entries = {}
+    for row, column, name, text, widget in ((1, 0, 'type', "Type", None), (1, 2, 'sort', "Sort", None),
+                                            (2, 0, 'start', "From (YYYY-MM-DD)", 'entry'),
+                                            (2, 2, 'end', "To (YYYY-MM-DD)", 'entry'),
+                                            (3, 0, 'min', "Min Amount", 'entry'), (3, 2, 'max', "Max Amount", 'entry')):
+        label = tk.Label(frame, text=text, font=("Arial", 12), fg="#FFD6BA", bg="black")
+        label.grid(row=row, column=column, sticky='e', padx=5, pady=5)
+        if widget == 'entry':
+            entries[name] = tk.Entry(frame, font=("Arial", 12), fg="#FAF9F9", bg="#0D1821", width=12)
+            entries[name].grid(row=row, column=column + 1, sticky='w', pady=5)
+
+    type_menu = tk.OptionMenu(frame, selected_type, *types)
+    type_menu.config(bg="black", fg='#FFD6BA', font=("Arial", 11))
+    type_menu.grid(row=1, column=1, sticky='w', pady=5)
+
+    sort_menu = tk.OptionMenu(frame, selected_sort, *sorts)
+    sort_menu.config(bg="black", fg='#FFD6BA', font=("Arial", 11))
+    sort_menu.grid(row=1, column=3, sticky='w', pady=5)
+
+    status_label = tk.Label(frame, font=('Arial', 12), fg="white", bg="black")
+    status_label.grid(row=4, column=0, columnspan=3, sticky='w', padx=10, pady=5)
+
+    search_button = tk.Button(frame, text="Search", font=('Arial', 10), fg='white', bg='black',
+                              command=lambda: run_search())
+    search_button.grid(row=4, column=3, sticky='w', pady=5)
+
+    # Results
+    configure_table_style(frame)
+    table = tk.Frame(frame, bg="black")
+    table.grid(row=5, column=0, columnspan=4, sticky="nsew", padx=10)
+    tree = ttk.Treeview(table, columns=("type", "amount", "date"), show="headings",
+                        style="History.Treeview", height=8)
+    for column, header, width in (("type", "Type", 150), ("amount", "Amount", 150), ("date", "Date", 250)):
+        tree.heading(column, text=header)
+        tree.column(column, width=width, anchor="center")
+    scrollbar = ttk.Scrollbar(table, orient="vertical", command=tree.yview)
+    tree.grid(row=0, column=0, sticky="nsew")
+    scrollbar.grid(row=0, column=1, sticky="ns")
+
+    back_button = tk.Button(frame, text="Back", font=("Arial", 11), fg="#FFD6BA", bg="black",
+                          command=lambda: account_dashboard(*current['user']))
+    back_button.grid(row=20, column=3, padx=10, pady=10)
+
+    def filters():
+        """Read the form into search() keyword arguments; raises ValueError on bad input."""
+        start, end = entries['start'].get().strip(), entries['end'].get().strip()
+        low, high = entries['min'].get().strip(), entries['max'].get().strip()
+        return {
+            'transaction_type': None if selected_type.get() == "All" else selected_type.get(),
+            'start': start or None,
+            'end': end or None,
+            'min_amount': to_cents(low) if low else None,
+            'max_amount': to_cents(high) if high else None,
+            'sort': sorts[selected_sort.get()],
+        }
+
+    def load_page(query, cursor=None, button=None):
+        """Fetch a page in the background and append it, unless a newer search replaced this one."""
+        current['loading'] = True
+        user_id = current['user'][0]
+
+        def show(page):
+            rows, next_cursor = page
+            if current.get('query') is not query:
+                return
+            current['loading'] = False
+            current['cursor'] = next_cursor
+            for transaction_type, amount, date in rows:
+                tree.insert("", tk.END, values=(transaction_type, format_cents(amount), date))
+            count = len(tree.get_children())
+            status_label.config(text=f"{count}{'+' if next_cursor else ''} transactions found"
+                                if count else "No transactions found.")
+
+        def failed(error):
+            if current.get('query') is query:
+                current['loading'] = False
+                status_label.config(text="")
+            if isinstance(error, ValueError):
+                messagebox.showerror("Error", f"Invalid search: {error}")
+            else:
+                show_error(error)
+
+        run_in_background(lambda: search(user_id, page_size=HISTORY_PAGE_SIZE, cursor=cursor, **query),
+                          show, button, failed)
+
+    def run_search():
+        """Start a new search with the form's filters."""
+        try:
+            query = filters()
+        except ValueError:
+            messagebox.showerror("Error", "Amounts must be numbers with at most two decimals.")
+            return
+        current['query'] = query
+        current['cursor'] = None
+        tree.delete(*tree.get_children())
+        status_label.config(text="Searching...")
+        load_page(query, button=search_button)
+
+    def on_scroll(first, last):
+        """Update the scrollbar and fetch the next page near the bottom."""
+        scrollbar.set(first, last)
+        if current.get('cursor') is not None and not current.get('loading') and float(last) > 0.9:
+            load_page(current['query'], current['cursor'])
+
+    tree.configure(yscrollcommand=on_scroll)
+
+    def refresh(user):
+        """Clear the form and show the given user's newest transactions."""
+        current['user'] = user
+        selected_type.set(types[0])
+        selected_sort.set("Newest")
+        for entry in entries.values():
+            entry.delete(0, tk.END)
+        run_search()
+
+    return refresh
+
+def logout():
+    """Handle user logout."""
+    login_page()
+
+def new_user():
+    """Display the new user registration screen."""
+    show_screen("new_user", "New Account Registration", "650x250", build_new_user_screen)
+
+def build_new_user_screen(frame):
+    """
+    Lay out the registration screen.
+    
+    Args:
+        frame: Frame to build the screen in
+
+    Returns:
+        Refresh callback that clears the form
+    """
     # Window elements
-    button = tk.Button(root2, text="X", font=("Arial Black", 12), fg='red', bg='black',
-                      command=lambda: close_window(root2), bd=0, highlightcolor='red')
+    button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='red', bg='black',
+                      command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
     button.grid(row=0, column=4, sticky='ne', padx=10, pady=5)
 
-    label = tk.Label(root2, text="Children's Bank of Canada", font=('Arial', 18), fg='sky blue', bg='black')
+    label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='sky blue', bg='black')
     label.grid(row=0, column=1, sticky='nsew', padx=10, pady=20)
 
     # User input fields
-    user_id_label = tk.Label(root2, text='User Id', font=('Arial', 14), bg='black', fg='white')
+    user_id_label = tk.Label(frame, text='User Id', font=('Arial', 14), bg='black', fg='white')
     user_id_label.grid(row=1, column=0, padx=25, pady=10, sticky="e")
 
-    user_id_entry = tk.Entry(root2, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    user_id_entry = tk.Entry(frame, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     user_id_entry.grid(row=1, column=1, padx=0, pady=10)
 
-    username_label = tk.Label(root2, text='Username', font=('Arial', 14), bg='black', fg='white')
+    username_label = tk.Label(frame, text='Username', font=('Arial', 14), bg='black', fg='white')
     username_label.grid(row=2, column=0, padx=25, pady=10, sticky="e")
 
-    username_entry = tk.Entry(root2, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    username_entry = tk.Entry(frame, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     username_entry.grid(row=2, column=1, padx=0, pady=10)
 
-    password_label = tk.Label(root2, text='Password', font=('Arial', 14), bg='black', fg='white')
+    password_label = tk.Label(frame, text='Password', font=('Arial', 14), bg='black', fg='white')
     password_label.grid(row=3, column=0, padx=25, pady=10, sticky="e")
 
-    password_entry = tk.Entry(root2, show='*', font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    password_entry = tk.Entry(frame, show='*', font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     password_entry.grid(row=3, column=1, padx=0, pady=10)
 
-    submit_button2 = tk.Button(root2, command=lambda: create_acc(user_id_entry, username_entry, password_entry, root2),
+    submit_button2 = tk.Button(frame, command=lambda: create_acc(user_id_entry, username_entry, password_entry),
                               text='Submit', font=('Arial', 10), fg='white', bg='black')
     submit_button2.grid(row=3, column=2, padx=5, pady=10)
 
-def create_acc(user_id_entry, username_entry, password_entry, root2):
+    def refresh():
+        """Clear the form."""
+        for entry in (user_id_entry, username_entry, password_entry):
+            entry.delete(0, tk.END)
+
+    return refresh
+
+def create_acc(user_id_entry, username_entry, password_entry):
     """
     Create a new user account with the provided information.
     
@@ -381,7 +902,6 @@ def create_acc(user_id_entry, username_entry, password_entry, root2):
         user_id_entry: Entry widget containing user ID
         username_entry: Entry widget containing username
         password_entry: Entry widget containing password
-        root2: Current Tkinter window
     """
     user_id = user_id_entry.get()
     username = username_entry.get()
@@ -393,9 +913,9 @@ def create_acc(user_id_entry, username_entry, password_entry, root2):
         user_id_entry.delete(0, tk.END)
         username_entry.delete(0, tk.END)
         password_entry.delete(0, tk.END)
-        add_user(user_id, username, password, root2)
+        add_user(user_id, username, password, get_app())
 
-def add_user(user_id, username, password, root2, db_name='users.db'):
+def add_user(user_id, username, password, root2, db_name=None):
     """
     Add a new user to the database.
     
@@ -403,123 +923,130 @@ def add_user(user_id, username, password, root2, db_name='users.db'):
         user_id: User's identification number
         username: User's chosen username
         password: User's password
-        root2: Current Tkinter window
-        db_name: Database file name (default: 'users.db')
+        root2: Application window, or None to add the user without any dialogs
+        db_name: Database file name (default: the configured database)
     """
-    conn = db.connect(db_name)
-    c = conn.cursor()
-
-    # Check for existing user
-    c.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-    existing_user = c.fetchone()
-
-    if existing_user:
+    try:
+        register(user_id, username, password, db_name)
+    except UserExists:
         if root2:
             messagebox.showerror("Failure", "User Id already exists, please try a different one.")
-    else:
-        try:
-            c.execute(
-                'INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)',
-                (user_id, username, hash_password(password))
-            )
-            conn.commit()
-            if root2:
-                messagebox.showinfo("Success", "User added successfully!")
-                close_window(root2)
-                login_page()
-        except db.Error as e:
-            if root2:
-                messagebox.showerror("Error", f"An error occurred: {e}")
-        finally:
-            conn.close()
+        return
+    except ValueError as e:
+        if root2:
+            messagebox.showerror("Input Error", str(e))
+        return
+    except db.Error as e:
+        if root2:
+            messagebox.showerror("Error", f"An error occurred: {e}")
+        return
+
+    if root2:
+        messagebox.showinfo("Success", "User added successfully!")
+        login_page()
 
 def close_window(root):
     """
-    Close the current Tkinter window.
+    Close a Tkinter window.
     
     Args:
         root: Tkinter window to close
     """
+    global app, current_screen
     root.destroy()
+    if root is app:
+        app = None
+        current_screen = None
+        screens.clear()
+        live_updates.clear()
 
-def submit_action(entry, entry2, root):
+def submit_action(entry, entry2, button=None):
     """
     Handle login form submission.
     
     Args:
         entry: User ID entry widget
         entry2: Password entry widget
-        root: Current Tkinter window
+        button: Login button to show as pending
     """
     user_id = entry.get()
     password = entry2.get()
     if not user_id or not password:
         messagebox.showerror("Input Error", "Both user_id and password are required")
     else:
-        check_credentials(user_id, password, root)
+        check_credentials(user_id, password, button)
 
-def forgot_password_window(root):
+def forgot_password_window():
+    """Display the password reset screen."""
+    show_screen("forgot_password", "Change Password", "650x300", build_forgot_password_screen)
+
+def build_forgot_password_screen(frame):
     """
-    Display the password reset window.
+    Lay out the password reset screen.
     
     Args:
-        root: Current Tkinter window
-    """
-    close_window(root)
-
-    root2 = tk.Tk()
-    root2.title("Change Password")
-    root2.geometry("650x300")
-    root2.config(bg='black')
+        frame: Frame to build the screen in
 
+    Returns:
+        Refresh callback that clears the form
+    """
     # Window elements
-    button = tk.Button(root2, text="X", font=("Arial Black", 12), fg='red', bg='black',
-                      command=lambda: close_window(root2), bd=0, highlightcolor='red')
+    button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='red', bg='black',
+                      command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
     button.grid(row=0, column=4, sticky='ne', padx=10, pady=5)
 
-    label = tk.Label(root2, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
+    label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
     label.grid(row=0, column=1, sticky='nsew', padx=10, pady=20)
 
     # User input fields
-    user_id_label = tk.Label(root2, text='User Id', font=('Arial', 14), bg='black', fg='white')
+    user_id_label = tk.Label(frame, text='User Id', font=('Arial', 14), bg='black', fg='white')
     user_id_label.grid(row=1, column=0, sticky='ew', padx=25, pady=10)
 
-    user_id_entry = tk.Entry(root2, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    user_id_entry = tk.Entry(frame, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     user_id_entry.grid(row=1, column=1, padx=0, pady=10)
 
-    username_label = tk.Label(root2, text='Username', font=('Arial', 14), bg='black', fg='white')
+    username_label = tk.Label(frame, text='Username', font=('Arial', 14), bg='black', fg='white')
     username_label.grid(row=2, column=0, sticky='ew', padx=25, pady=10)
 
-    username_entry = tk.Entry(root2, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    username_entry = tk.Entry(frame, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     username_entry.grid(row=2, column=1, padx=0, pady=10)
 
-    password_label = tk.Label(root2, text='New Password', font=('Arial', 14), bg='black', fg='white')
+    password_label = tk.Label(frame, text='New Password', font=('Arial', 14), bg='black', fg='white')
     password_label.grid(row=3, column=0, sticky='ew', padx=25, pady=10)
 
-    password_entry = tk.Entry(root2, show='*', font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    password_entry = tk.Entry(frame, show='*', font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     password_entry.grid(row=3, column=1, padx=0, pady=10)
 
-    confirm_password_label = tk.Label(root2, text='Confirm Password', font=('Arial', 14), bg='black', fg='white')
+    confirm_password_label = tk.Label(frame, text='Confirm Password', font=('Arial', 14), bg='black', fg='white')
     confirm_password_label.grid(row=4, column=0, sticky='ew', padx=25, pady=10)
 
-    confirm_password_entry = tk.Entry(root2, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    confirm_password_entry = tk.Entry(frame, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     confirm_password_entry.grid(row=4, column=1, padx=0, pady=10)
 
-    submit_button2 = tk.Button(root2, command=lambda: reset_password(user_id_entry, username_entry,
-                                                                   password_entry, confirm_password_entry, root2),
+    submit_button2 = tk.Button(frame, command=lambda: reset_password(user_id_entry, username_entry,
+                                                                   password_entry, confirm_password_entry,
+                                                                   submit_button2),
                               text='Submit', font=('Arial', 10), fg='white', bg='black')
     submit_button2.grid(row=4, column=2, padx=5, pady=10)
 
-def reset_password(user_id_entry, username_entry, password_entry, confirm_password_entry, root2):
+    def refresh():
+        """Clear the form."""
+        for entry in (user_id_entry, username_entry, password_entry, confirm_password_entry):
+            entry.delete(0, tk.END)
+
+    return refresh
+
+def reset_password(user_id_entry, username_entry, password_entry, confirm_password_entry, button=None):
     """
     Process password reset request.
+    The database update and password hashing run in the background.
     
     Args:
         user_id_entry: Entry widget containing user ID
         username_entry: Entry widget containing username
         password_entry: Entry widget containing new password
         confirm_password_entry: Entry widget containing password confirmation
-        root2: Current Tkinter window
+        button: Submit button to show as pending
     """
     user_id = user_id_entry.get()
     username = username_entry.get()
@@ -531,75 +1058,169 @@ def reset_password(user_id_entry, username_entry, password_entry, confirm_passwo
     elif new_password != confirm_password:
         messagebox.showerror("Input Error", "Passwords do not match")
     else:
-        conn = db.connect('users.db')
-        c = conn.cursor()
-
-        c.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user = c.fetchone()
-
-        if user:
-            c.execute('UPDATE users SET password = ? WHERE user_id = ?', (hash_password(new_password), user_id))
-            conn.commit()
+        def done(result):
             messagebox.showinfo("Success", "Password updated successfully!")
-            close_window(root2)
             login_page()
-        else:
-            messagebox.showerror("Failure", "User ID not found!")
-        conn.close()
+
+        def failed(error):
+            if isinstance(error, UserNotFound):
+                messagebox.showerror("Failure", "User ID not found!")
+            else:
+                show_error(error)
+
+        run_in_background(lambda: change_password(user_id, new_password), done, button, failed)
 
 def login_page():
     """Display the main login page."""
-    root = tk.Tk()
-    root.title("Main Project")
-    root.geometry("550x300")
-    root.config(bg='black')
+    show_screen("login", "Main Project", "550x300", build_login_screen)
 
+def build_login_screen(frame):
+    """
+    Lay out the login screen.
+    
+    Args:
+        frame: Frame to build the screen in
+
+    Returns:
+        Refresh callback that clears the form
+    """
     # Window elements
-    button = tk.Button(root, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
-                      command=lambda: close_window(root), bd=0, highlightcolor='red')
+    button = tk.Button(frame, text="X", font=("Arial Black", 12), fg='#fdf4dc', bg='black',
+                      command=lambda: close_window(get_app()), bd=0, highlightcolor='red')
     button.grid(row=0, column=4, sticky='ne', padx=10, pady=5)
 
-    label = tk.Label(root, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
+    label = tk.Label(frame, text="Children's Bank of Canada", font=('Arial', 18), fg='#ED254E', bg='black')
     label.grid(row=0, column=1, sticky='nsew', padx=10, pady=20)
 
     # Login form
-    user_id_label = tk.Label(root, text='User Id', font=('Arial', 14), bg='black', fg='#FFD6BA')
+    user_id_label = tk.Label(frame, text='User Id', font=('Arial', 14), bg='black', fg='#FFD6BA')
     user_id_label.grid(row=1, column=0, padx=25, pady=10, sticky="e")
 
-    entry = tk.Entry(root, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    entry = tk.Entry(frame, font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     entry.grid(row=1, column=1, padx=0, pady=10)
 
-    password_label = tk.Label(root, text='Password', font=('Arial', 14), bg='black', fg='#FFD6BA')
+    password_label = tk.Label(frame, text='Password', font=('Arial', 14), bg='black', fg='#FFD6BA')
     password_label.grid(row=2, column=0, padx=25, pady=10, sticky="e")
 
-    entry2 = tk.Entry(root, show='*', font=('Arial', 14), bg='#28282B', fg='white', bd=0)
+    entry2 = tk.Entry(frame, show='*', font=('Arial', 14), bg='#28282B', fg='white', bd=0)
     entry2.grid(row=2, column=1, padx=0, pady=10)
 
     # Buttons
-    submit_button2 = tk.Button(root, command=lambda: submit_action(entry, entry2, root),
+    submit_button2 = tk.Button(frame, command=lambda: submit_action(entry, entry2, submit_button2),
                               text='Log in', font=('Arial', 10), fg='white', bg='black')
     submit_button2.grid(row=2, column=2, sticky='w', padx=5, pady=10)
 
-    forgot_password_label = tk.Label(root, text="Forgot Password?", font=("Arial", 10), bd=0, fg="#FFD6BA", bg="black")
+    forgot_password_label = tk.Label(frame, text="Forgot Password?", font=("Arial", 10), bd=0, fg="#FFD6BA", bg="black")
     forgot_password_label.grid(row=3, column=0, sticky='e', padx=0, pady=10)
 
-    forgot_password_button = tk.Button(root, text="Reset Password", font=("Arial", 10),
-                                     fg='white', bg='black', command=lambda: forgot_password_window(root))
+    forgot_password_button = tk.Button(frame, text="Reset Password", font=("Arial", 10),
+                                     fg='white', bg='black', command=forgot_password_window)
     forgot_password_button.grid(row=3, column=1, sticky='w', padx=5, pady=10)
 
-    new_account_label = tk.Label(root, text="New User ?", font=("Arial", 10), bd=0, fg="#FFD6BA", bg="black")
+    new_account_label = tk.Label(frame, text="New User ?", font=("Arial", 10), bd=0, fg="#FFD6BA", bg="black")
     new_account_label.grid(row=4, column=0, sticky='e', padx=0, pady=10)
 
-    create_account_button = tk.Button(root, text="Create Account", font=("Arial", 10),
-                                    fg='white', bg='black', command=lambda: new_user(root))
+    create_account_button = tk.Button(frame, text="Create Account", font=("Arial", 10),
+                                    fg='white', bg='black', command=new_user)
     create_account_button.grid(row=4, column=1, sticky='w', padx=5, pady=10)
 
-    root.mainloop()
+    def refresh():
+        """Clear the form."""
+        entry.delete(0, tk.END)
+        entry2.delete(0, tk.END)
+
+    return refresh
+
+def import_command(args):
+    """
+    Import a ledger file from the command line and report the result.
+    
+    Args:
+        args: Parsed arguments with file, batch_size and rejects
+    """
+    # Rejected rows go to the --rejects CSV, or the first few are printed
+    shown = []
+    rejects_file = open(args.rejects, 'w', newline='') if args.rejects else None
+    writer = csv.writer(rejects_file) if rejects_file else None
+    if writer:
+        writer.writerow(["line", "reason", "record"])
+
+    def on_reject(line_number, record, reason):
+        if writer:
+            writer.writerow([line_number, reason, json.dumps(record)])
+        elif len(shown) < 20:
+            shown.append(f"  line {line_number}: {reason}")
+
+    create_db()
+    start = time.perf_counter()
+    try:
+        accepted, rejected = import_transactions(args.file, args.batch_size, on_reject)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Imported {accepted} rows, rejected {rejected} rows in {elapsed:.2f}s "
+          f"({(accepted + rejected) / max(elapsed, 1e-9):.0f} rows/sec)")
+    if shown:
+        print("Rejected rows:", *shown, sep="\n", file=sys.stderr)
+        if rejected > len(shown):
+            print(f"  ... and {rejected - len(shown)} more (use --rejects FILE to save them all)", file=sys.stderr)
+
+def export_command(args):
+    """
+    Export transactions from the command line and report the result.
+    
+    Args:
+        args: Parsed arguments with output, format, user_id, start and end
+    """
+    start = time.perf_counter()
+    count = export_transactions(args.output, args.format, args.user_id, args.start, args.end)
+    elapsed = time.perf_counter() - start
+
+    # Keep stdout clean when the export itself is written there
+    report = sys.stderr if args.output == '-' else sys.stdout
+    print(f"Exported {count} rows in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f} rows/sec)", file=report)
+
+def run_command(argv):
+    """
+    Run a command-line tool instead of the GUI.
+    
+    Args:
+        argv: Command-line arguments after the program name
+    """
+    parser = argparse.ArgumentParser(prog="project.py", description="Children's Bank of Canada tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="bulk import transactions from CSV or JSON Lines")
+    import_parser.add_argument("file", help=".csv, .jsonl or .ndjson file, optionally gzip-compressed (.gz)")
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    import_parser.add_argument("--rejects", help="write every rejected row and its reason to this CSV file")
+    import_parser.set_defaults(handler=import_command)
+
+    export_parser = commands.add_parser("export", help="export transactions to CSV or JSON Lines")
+    export_parser.add_argument("output", help="output file ('-' for stdout); add .gz to compress")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file name")
+    export_parser.add_argument("--user-id", type=int, help="only this user's transactions")
+    export_parser.add_argument("--from", dest="start", help="first date to include, YYYY-MM-DD")
+    export_parser.add_argument("--to", dest="end", help="date to stop before, YYYY-MM-DD (exclusive)")
+    export_parser.set_defaults(handler=export_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
 
 def main():
-    """Initialize the application by creating the database and launching the login page."""
+    """
+    Initialize the application by creating the database and launching the login page.
+    With command-line arguments, run the requested tool instead (see run_command).
+    """
+    if len(sys.argv) > 1:
+        run_command(sys.argv[1:])
+        return
+
     create_db()
     login_page()
+    get_app().mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
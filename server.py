@@ -0,0 +1,330 @@
+"""
+Children's Bank of Canada - Local JSON/HTTP API
+
+A small asyncio HTTP/1.1 server over the service layer so scripts and other
+processes can drive the bank. Every endpoint takes a JSON object in a POST
+body and answers with JSON. Blocking SQLite and hashing work runs in a
+thread pool, so one slow write never stalls the other clients. Amounts and
+balances are integer cents.
+
+Endpoints:
+    POST /register        {user_id, username, password}
+    POST /authenticate    {user_id, password}
+    POST /deposit         {user_id, amount}
+    POST /withdraw        {user_id, amount}
+    POST /transfer        {from_id, to_id, amount}
+    POST /history         {user_id, page_size?, cursor?}
+    POST /search          {user_id, type?, start?, end?, min_amount?, max_amount?, sort?, page_size?, cursor?}
+    POST /balance-as-of   {user_id, timestamp}
+    POST /reset-password  {user_id, new_password}
+
+With --shards N, users are spread over N database files (see shards.py).
+
+Usage:
+    python server.py [--host 127.0.0.1] [--port 8050] [--workers 8] [--shards N]
+"""
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import bank
+import service
+from bank import SEARCH_SORTS, BankError, InsufficientFunds, UserNotFound
+from service import InvalidCredentials, UserExists
+from shards import ShardedBank
+
+# Largest request body accepted, in bytes
+MAX_BODY = 64 * 1024
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+# Handles the account operations: the service module, or a ShardedBank with the same methods
+backend = service
+
+# HTTP status for each error the service layer can raise
+ERROR_STATUS = (
+    (UserNotFound, 404),
+    (InvalidCredentials, 401),
+    (InsufficientFunds, 409),
+    (UserExists, 409),
+    (BankError, 400),
+    (ValueError, 400),
+)
+
+# Default for field() when the field must be present
+REQUIRED = object()
+
+# JSON type of each cursor column
+CURSOR_TYPES = {'date': str, 'amount': int, 'transaction_id': int}
+
+
+def field(body, name, kind, default=REQUIRED):
+    """
+    Read one field of a request body, checking its JSON type.
+
+    Args:
+        body: Decoded request body
+        name: Field name
+        kind: Type, or tuple of types, the value must have
+        default: Value when the field is absent or null, or REQUIRED
+
+    Returns:
+        The field's value, or `default`
+
+    Raises:
+        ValueError: If a required field is missing, or the value has the wrong type or
+            is an integer too large for SQLite
+    """
+    value = body.get(name)
+    if value is None:
+        if default is REQUIRED:
+            raise ValueError(f"Missing field: {name}")
+        return default
+    kinds = kind if isinstance(kind, tuple) else (kind,)
+    if not isinstance(value, kinds) or isinstance(value, bool):
+        raise ValueError(f"Field {name} must be {' or '.join(t.__name__ for t in kinds)}")
+    if isinstance(value, int) and abs(value) > bank.MAX_INTEGER:
+        raise ValueError(f"Field {name} is out of range")
+    return value
+
+
+def page(body, keys):
+    """
+    Read the page_size and cursor fields of a paginated request.
+
+    Args:
+        body: Decoded request body
+        keys: Columns the cursor is made of, in order
+
+    Returns:
+        (page_size, cursor as a tuple or None)
+
+    Raises:
+        ValueError: If the page size is not positive or the cursor does not match `keys`
+    """
+    page_size = field(body, 'page_size', int, 50)
+    if page_size < 1:
+        raise ValueError("Field page_size must be positive")
+    cursor = field(body, 'cursor', list, None)
+    if cursor is not None:
+        if len(cursor) != len(keys) or not all(
+                isinstance(value, CURSOR_TYPES[key]) and not isinstance(value, bool)
+                for key, value in zip(keys, cursor)):
+            raise ValueError("Invalid cursor")
+        cursor = tuple(cursor)
+    return page_size, cursor
+
+
+def register(body):
+    user_id = field(body, 'user_id', (int, str))
+    backend.register(user_id, field(body, 'username', str), field(body, 'password', str))
+    return 201, {'user_id': user_id}
+
+
+def authenticate(body):
+    user_id, username, balance = backend.authenticate(field(body, 'user_id', int), field(body, 'password', str))
+    return 200, {'user_id': user_id, 'username': username, 'balance': balance}
+
+
+def deposit(body):
+    return 200, {'balance': backend.deposit(field(body, 'user_id', int), field(body, 'amount', int))}
+
+
+def withdraw(body):
+    return 200, {'balance': backend.withdraw(field(body, 'user_id', int), field(body, 'amount', int))}
+
+
+def transfer(body):
+    payer, payee = backend.transfer(field(body, 'from_id', int), field(body, 'to_id', int),
+                                    field(body, 'amount', int))
+    return 200, {'from_balance': payer, 'to_balance': payee}
+
+
+def history(body):
+    page_size, cursor = page(body, ('date', 'transaction_id'))
+    rows, next_cursor = backend.history(field(body, 'user_id', int), page_size, cursor)
+    return 200, {'transactions': [{'type': t, 'amount': a, 'date': d} for t, a, d in rows],
+                 'next_cursor': next_cursor}
+
+
+def search(body):
+    sort = field(body, 'sort', str, 'newest')
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f"Unknown sort order: {sort!r}")
+    page_size, cursor = page(body, SEARCH_SORTS[sort][0])
+    rows, next_cursor = backend.search(field(body, 'user_id', int), field(body, 'type', str, None),
+                                       field(body, 'start', str, None), field(body, 'end', str, None),
+                                       field(body, 'min_amount', int, None), field(body, 'max_amount', int, None),
+                                       sort, page_size, cursor)
+    return 200, {'transactions': [{'type': t, 'amount': a, 'date': d} for t, a, d in rows],
+                 'next_cursor': next_cursor}
+
+
+def balance_as_of(body):
+    return 200, {'balance': backend.balance_at(field(body, 'user_id', int), field(body, 'timestamp', str))}
+
+
+def reset_password(body):
+    backend.reset_password(field(body, 'user_id', int), field(body, 'new_password', str))
+    return 200, {}
+
+
+ROUTES = {
+    '/register': register,
+    '/authenticate': authenticate,
+    '/deposit': deposit,
+    '/withdraw': withdraw,
+    '/transfer': transfer,
+    '/history': history,
+    '/search': search,
+    '/balance-as-of': balance_as_of,
+    '/reset-password': reset_password,
+}
+
+
+def dispatch(path, body):
+    """
+    Run one API call. Called on a worker thread.
+
+    Returns:
+        (status, payload) for the response
+    """
+    try:
+        return ROUTES[path](body)
+    except tuple(error for error, _ in ERROR_STATUS) as e:
+        status = next(status for error, status in ERROR_STATUS if isinstance(e, error))
+        return status, {'error': type(e).__name__, 'detail': str(e)}
+
+
+def encode_response(status, payload, keep_alive):
+    """Serialize a JSON response with its status line and headers."""
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+async def read_request(reader):
+    """
+    Read one request from the connection.
+
+    Returns:
+        (method, path, headers, body), or None when the client has closed
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+async def handle_client(reader, writer, executor):
+    """Serve requests on one keep-alive connection until the client closes it."""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(encode_response(400, {'error': 'BadRequest'}, False))
+                break
+            if request is None:
+                break
+
+            method, path, headers, body = request
+            keep_alive = headers.get('connection', '').lower() != 'close'
+
+            if path not in ROUTES:
+                status, payload = 404, {'error': 'NotFound'}
+            elif method != 'POST':
+                status, payload = 405, {'error': 'MethodNotAllowed'}
+            else:
+                try:
+                    data = json.loads(body or b'{}')
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    status, payload = 400, {'error': 'BadRequest', 'detail': 'Body must be a JSON object'}
+                else:
+                    try:
+                        status, payload = await loop.run_in_executor(executor, partial(dispatch, path, data))
+                    except Exception as e:
+                        status, payload = 500, {'error': type(e).__name__}
+
+            writer.write(encode_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8050, workers=8, ready=None):
+    """
+    Run the API server until cancelled.
+
+    Args:
+        host: Interface to listen on (local only by default)
+        port: TCP port to listen on
+        workers: Threads available for blocking database work
+        ready: Optional callback called with the bound port once listening
+    """
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+    server = await asyncio.start_server(lambda r, w: handle_client(r, w, executor), host, port)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[1])
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local JSON/HTTP API for the Children's Bank of Canada")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--db', default=None, help="database file (default: users.db or $BANK_DB)")
+    parser.add_argument('--shards', type=int, default=None,
+                        help="spread users over this many shard files derived from the database name")
+    args = parser.parse_args()
+
+    global backend
+    if args.db:
+        bank.configure(args.db)
+    if args.shards:
+        backend = ShardedBank(shards=args.shards)
+        backend.create()
+    else:
+        bank.create_db()
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Children's Bank of Canada - Service Layer
+
+GUI-free banking operations shared by the Tkinter application, the local
+HTTP API (server.py) and scripts. Every function either returns plain data
+or raises a BankError subclass; none of them touch Tkinter. Amounts and
+balances are integer cents.
+"""
+
+from bank import (BankError, UserNotFound, account_cache, balance_as_of, check_user_id, connection, hash_password,
+                  post_transaction, search_transactions, transaction_history_page)
+from bank import transfer as post_transfer
+
+
+class UserExists(BankError):
+    """Raised when registering a user ID that is already taken."""
+
+
+class InvalidCredentials(BankError):
+    """Raised when a password does not match the stored hash."""
+
+
+def register(user_id, username, password, db_name=None):
+    """
+    Create a new account with a zero balance.
+
+    Args:
+        user_id: User's identification number
+        username: User's chosen username
+        password: User's password
+        db_name: Database file name (default: the configured database)
+
+    Raises:
+        ValueError: If any field is empty or the user ID is not a whole number
+        UserExists: If the user ID is already taken
+    """
+    if not user_id or not username or not password:
+        raise ValueError("All fields are required")
+    user_id = check_user_id(user_id)
+
+    with connection(db_name, immediate=True) as conn:
+        # The write lock is held from here, so the ID cannot be taken between the check and the insert;
+        # any other constraint failure on the insert is a real error and propagates
+        if conn.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,)).fetchone() is not None:
+            raise UserExists(user_id)
+        conn.execute(
+            'INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)',
+            (user_id, username, hash_password(password))
+        )
+
+
+def authenticate(user_id, password, db_name=None):
+    """
+    Check a user's password.
+
+    Args:
+        user_id: User's identification number
+        password: User's password
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (user_id, username, balance) of the authenticated user
+
+    Raises:
+        UserNotFound: If the user does not exist
+        InvalidCredentials: If the password is wrong
+    """
+    generation = account_cache.generation
+    with connection(db_name) as conn:
+        user = conn.execute('SELECT user_id, username, password, balance FROM users WHERE user_id = ?',
+                            (user_id,)).fetchone()
+
+    if user is None:
+        raise UserNotFound(user_id)
+    if user[2] != hash_password(password):
+        raise InvalidCredentials(user_id)
+    account = user[0], user[1], user[3]
+    account_cache.put(account, generation, db_name)
+    return account
+
+
+def get_account(user_id, db_name=None):
+    """
+    Look up an account, reading through the account cache.
+
+    Args:
+        user_id: User's identification number
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (user_id, username, balance) of the user
+
+    Raises:
+        UserNotFound: If the user does not exist
+    """
+    user = account_cache.get(user_id, db_name)
+    if user is not None:
+        return user
+
+    generation = account_cache.generation
+    with connection(db_name) as conn:
+        user = conn.execute('SELECT user_id, username, balance FROM users WHERE user_id = ?',
+                            (user_id,)).fetchone()
+
+    if user is None:
+        raise UserNotFound(user_id)
+    account_cache.put(user, generation, db_name)
+    return user
+
+
+def deposit(user_id, amount, db_name=None):
+    """Deposit `amount` cents into the account and return the new balance in cents."""
+    return post_transaction(user_id, "Deposit", amount, db_name)
+
+
+def withdraw(user_id, amount, db_name=None):
+    """Withdraw `amount` cents from the account and return the new balance in cents."""
+    return post_transaction(user_id, "Withdraw", amount, db_name)
+
+
+def transfer(from_id, to_id, amount, db_name=None):
+    """
+    Transfer money from one user to another.
+
+    Args:
+        from_id: User ID of the payer
+        to_id: User ID of the payee
+        amount: Positive amount in cents
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (payer's new balance, payee's new balance), in cents
+    """
+    return post_transfer(from_id, to_id, amount, db_name)
+
+
+def history(user_id, page_size=50, cursor=None, db_name=None):
+    """
+    Return one page of the user's transaction history, newest first.
+
+    Args:
+        user_id: User's identification number
+        page_size: Maximum number of rows to return
+        cursor: Cursor returned with the previous page, or None for the first page
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (rows, next_cursor) as returned by bank.transaction_history_page()
+    """
+    return transaction_history_page(user_id, page_size, cursor, db_name)
+
+
+def search(user_id, transaction_type=None, start=None, end=None, min_amount=None, max_amount=None, sort='newest',
+           page_size=50, cursor=None, db_name=None):
+    """
+    Return one page of the user's transactions matching the given filters.
+
+    Args:
+        user_id: User's identification number
+        transaction_type: Only transactions of this type (default: every type)
+        start: Earliest date to include (inclusive)
+        end: Date to stop at (exclusive)
+        min_amount: Smallest amount to include, in cents
+        max_amount: Largest amount to include, in cents
+        sort: "newest", "oldest", "largest" or "smallest"
+        page_size: Maximum number of rows to return
+        cursor: Cursor returned with the previous page, or None for the first page
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        (rows, next_cursor) as returned by bank.search_transactions()
+    """
+    return search_transactions(user_id, transaction_type, start, end, min_amount, max_amount, sort, page_size,
+                               cursor, db_name)
+
+
+def balance_at(user_id, timestamp, db_name=None):
+    """
+    Return the user's balance in cents at a point in time.
+
+    Args:
+        user_id: User's identification number
+        timestamp: "YYYY-MM-DD HH:MM:SS" (UTC), or "YYYY-MM-DD" for the close of that day
+        db_name: Database file name (default: the configured database)
+    """
+    return balance_as_of(user_id, timestamp, db_name)
+
+
+def reset_password(user_id, new_password, db_name=None):
+    """
+    Replace a user's password.
+
+    Args:
+        user_id: User's identification number
+        new_password: New password
+        db_name: Database file name (default: the configured database)
+
+    Raises:
+        ValueError: If the new password is empty
+        UserNotFound: If the user does not exist
+    """
+    if not new_password:
+        raise ValueError("A new password is required")
+
+    with connection(db_name, immediate=True) as conn:
+        updated = conn.execute('UPDATE users SET password = ? WHERE user_id = ?',
+                               (hash_password(new_password), user_id)).rowcount
+    account_cache.invalidate(user_id, db_name)
+    if not updated:
+        raise UserNotFound(user_id)
@@ -0,0 +1,282 @@
+"""
+Children's Bank of Canada - Sharded Storage
+
+SQLite lets one writer at a time into a database file, so with a single
+users.db every posting from every user waits for the same lock. In sharded
+mode the users and their transactions are spread over N database files by
+a hash of user_id, and each operation is routed to the one file holding its
+user, so postings for users on different shards commit side by side.
+
+Shard i of N for the base path users.db is users.shard-i-of-N.db. Every
+shard is a complete bank database with the usual schema, so the functions
+in bank.py and service.py work on a shard unchanged when given its path.
+A user's whole history lives on one shard; transaction IDs are only unique
+within a shard.
+
+Bank-wide admin work (totals, exports) runs once per shard in a pool of
+worker processes, and the per-shard results are merged.
+
+Usage:
+    python shards.py --shards 4 [--db users.db] init
+    python shards.py --shards 4 [--db users.db] totals [--workers N]
+    python shards.py --shards 4 [--db users.db] export FILE [--from DATE] [--to DATE] [--workers N]
+"""
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import sys
+import tempfile
+import zlib
+
+import exporter
+import service
+from bank import BankError, connection, create_db, format_cents, get_db_name, process_pool
+
+# Default number of shard files
+SHARDS = 4
+
+SHARD_PATTERN = re.compile(r'\.shard-\d+-of-(\d+)$')
+
+
+def shard_paths(base, count):
+    """Return the file names of the `count` shards of base path `base`, in shard order."""
+    stem, ext = os.path.splitext(base)
+    return [f'{stem}.shard-{i}-of-{count}{ext}' for i in range(count)]
+
+
+def shard_index(user_id, count):
+    """
+    Return the shard a user lives on.
+
+    Uses CRC-32 of the user ID, so the mapping is the same in every process
+    and on every run (unlike hash(), which is randomized per process).
+
+    Raises:
+        ValueError: If the user ID is not a whole number
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid user ID: {user_id!r}") from None
+    return zlib.crc32(user_id.to_bytes(8, 'big', signed=True)) % count
+
+
+def _shard_totals(path):
+    # Runs in a worker process
+    with connection(path) as conn:
+        users, balance = conn.execute('SELECT COUNT(*), COALESCE(SUM(balance), 0) FROM users').fetchone()
+        transactions = conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+    return {'path': path, 'users': users, 'balance': balance, 'transactions': transactions}
+
+
+def part_path(directory, path, fmt):
+    """Return the file a shard's part of a bank-wide export is written to."""
+    return os.path.join(directory, f'{os.path.basename(path)}.{fmt}')
+
+
+def _export_shard(path, directory, fmt, start, end):
+    # Runs in a worker process
+    return exporter.export_transactions(part_path(directory, path, fmt), fmt, start=start, end=end, db_name=path)
+
+
+class ShardedBank:
+    """
+    Router over a set of shard files.
+
+    Offers the account operations of service.py under the same names and
+    arguments (without db_name), each run on the shard of its user_id, so
+    it can stand in for the service module, e.g. behind server.py.
+
+    Usage:
+        bank = ShardedBank('users.db', shards=4)
+        bank.create()
+        bank.deposit(42, 500)
+    """
+
+    def __init__(self, base=None, shards=SHARDS):
+        """
+        Args:
+            base: Base database path the shard names are derived from
+                (default: the configured database)
+            shards: Number of shard files
+
+        Raises:
+            ValueError: If shard files for a different shard count already exist
+        """
+        if shards < 1:
+            raise ValueError("The number of shards must be at least 1")
+        self.base = get_db_name(base)
+        self.count = shards
+        self.paths = shard_paths(self.base, shards)
+
+        stem, ext = os.path.splitext(self.base)
+        for path in glob.glob(f'{glob.escape(stem)}.shard-*-of-*{glob.escape(ext)}'):
+            match = SHARD_PATTERN.search(os.path.splitext(path)[0])
+            if match and int(match.group(1)) != shards:
+                raise ValueError(f"{path} belongs to a {match.group(1)}-shard layout, not {shards}")
+
+    def path_for(self, user_id):
+        """Return the shard file holding a user."""
+        return self.paths[shard_index(user_id, self.count)]
+
+    def create(self):
+        """
+        Create every shard, or bring its schema up to date.
+
+        Returns:
+            Dict of shard path to the migrations applied to it
+        """
+        return {path: create_db(path) for path in self.paths}
+
+    def register(self, user_id, username, password):
+        return service.register(user_id, username, password, self.path_for(user_id))
+
+    def authenticate(self, user_id, password):
+        return service.authenticate(user_id, password, self.path_for(user_id))
+
+    def get_account(self, user_id):
+        return service.get_account(user_id, self.path_for(user_id))
+
+    def deposit(self, user_id, amount):
+        return service.deposit(user_id, amount, self.path_for(user_id))
+
+    def withdraw(self, user_id, amount):
+        return service.withdraw(user_id, amount, self.path_for(user_id))
+
+    def transfer(self, from_id, to_id, amount):
+        # A transaction cannot span two database files
+        path = self.path_for(from_id)
+        if self.path_for(to_id) != path:
+            raise BankError(f"Users {from_id} and {to_id} are on different shards")
+        return service.transfer(from_id, to_id, amount, path)
+
+    def history(self, user_id, page_size=50, cursor=None):
+        return service.history(user_id, page_size, cursor, self.path_for(user_id))
+
+    def search(self, user_id, *filters, **options):
+        return service.search(user_id, *filters, db_name=self.path_for(user_id), **options)
+
+    def balance_at(self, user_id, timestamp):
+        return service.balance_at(user_id, timestamp, self.path_for(user_id))
+
+    def reset_password(self, user_id, new_password):
+        return service.reset_password(user_id, new_password, self.path_for(user_id))
+
+    def fan_out(self, function, *args, workers=None):
+        """
+        Call `function(shard_path, *args)` for every shard, in worker processes.
+
+        Args:
+            function: Module-level function (it is pickled by name)
+            args: Further arguments, the same for every shard
+            workers: Worker processes (default: one per CPU, at most one per
+                shard); 1 runs every shard in this process
+
+        Returns:
+            List of results in shard order
+        """
+        workers = min(workers or os.cpu_count() or 1, self.count)
+        if workers == 1:
+            return [function(path, *args) for path in self.paths]
+        with process_pool(workers) as pool:
+            return list(pool.map(function, self.paths, *([arg] * self.count for arg in args)))
+
+    def totals(self, workers=None):
+        """
+        Count users and transactions and sum balances across every shard.
+
+        Returns:
+            Dict with users, balance (cents), transactions, and per-shard
+            figures under 'shards' for spotting an uneven spread
+        """
+        shards = self.fan_out(_shard_totals, workers=workers)
+        return {
+            'users': sum(shard['users'] for shard in shards),
+            'balance': sum(shard['balance'] for shard in shards),
+            'transactions': sum(shard['transactions'] for shard in shards),
+            'shards': shards,
+        }
+
+    def export(self, path, fmt=None, user_id=None, start=None, end=None, workers=None):
+        """
+        Export transactions from every shard into one CSV or JSON Lines file.
+
+        A single user's export is read from their shard alone. A bank-wide
+        export has each shard written to a part file by a worker process;
+        the parts are then appended to the output in shard order.
+
+        Args:
+            path: Output file ('-' for stdout); a .gz suffix compresses it
+            fmt: "csv" or "jsonl" (default: guessed from the file name)
+            user_id: Only this user's transactions (default: everyone)
+            start: Earliest date to include (inclusive)
+            end: Date to stop at (exclusive)
+            workers: Worker processes, as for fan_out()
+
+        Returns:
+            Number of rows written
+        """
+        fmt = fmt or exporter.format_for(path)
+        if user_id is not None:
+            return exporter.export_transactions(path, fmt, user_id, start, end, db_name=self.path_for(user_id))
+        if fmt not in ('csv', 'jsonl'):
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(self.base))) as tmp:
+            counts = self.fan_out(_export_shard, tmp, fmt, start, end, workers=workers)
+            file = exporter.open_output(path)
+            try:
+                for i, shard in enumerate(self.paths):
+                    with open(part_path(tmp, shard, fmt), newline='') as source:
+                        # Keep only the first part's CSV header
+                        if fmt == 'csv' and i > 0:
+                            source.readline()
+                        shutil.copyfileobj(source, file)
+            finally:
+                if file is not sys.stdout:
+                    file.close()
+        return sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and administer a sharded bank")
+    parser.add_argument('--db', default=None, help="base database path (default: users.db or $BANK_DB)")
+    parser.add_argument('--shards', type=int, default=SHARDS)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('init', help="create the shard files")
+
+    totals = subparsers.add_parser('totals', help="count users and transactions across shards")
+    totals.add_argument('--workers', type=int, default=None)
+
+    export = subparsers.add_parser('export', help="export every shard's transactions to one file")
+    export.add_argument('file')
+    export.add_argument('--user-id', type=int, default=None)
+    export.add_argument('--from', dest='start', default=None)
+    export.add_argument('--to', dest='end', default=None)
+    export.add_argument('--workers', type=int, default=None)
+
+    args = parser.parse_args()
+    shards = ShardedBank(args.db, args.shards)
+
+    if args.command == 'init':
+        for path, applied in shards.create().items():
+            print(f"{path}: {len(applied)} migrations applied")
+    elif args.command == 'totals':
+        result = shards.totals(args.workers)
+        for shard in result['shards']:
+            print(f"{shard['path']}: {shard['users']} users, {shard['transactions']} transactions, "
+                  f"balance {format_cents(shard['balance'])}")
+        print(f"total: {result['users']} users, {result['transactions']} transactions, "
+              f"balance {format_cents(result['balance'])}")
+    else:
+        count = shards.export(args.file, user_id=args.user_id, start=args.start, end=args.end,
+                              workers=args.workers)
+        print(f"Exported {count} transactions to {args.file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+import bank
+import analytics
+
+
+@pytest.fixture
+def ledger(bank_db):
+    """Two users with transactions spread over January and March 2024."""
+    with bank.connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, '')",
+                         [(1, 'one'), (2, 'two'), (3, 'three')])
+        conn.executemany(
+            "INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, ?)",
+            [(1, 'Deposit', 1000, '2024-01-05 10:00:00'), (1, 'Withdraw', 700, '2024-01-20 10:00:00'),
+             (1, 'Deposit', 50, '2024-01-31 23:59:59'), (1, 'Withdraw', 350, '2024-03-02 08:00:00'),
+             (2, 'Deposit', 200, '2024-03-01 00:00:00')]
+        )
+    return bank_db
+
+
+EXPECTED = [
+    (1, '2024-01', 1050, 2, 700, 1, 0, 350, 0, 1000),
+    (1, '2024-03', 0, 0, 350, 1, 350, 0, 0, 350),
+    (2, '2024-03', 200, 1, 0, 0, 0, 200, 0, 200),
+]
+
+
+def test_monthly_statements(ledger):
+    """Totals, counts, opening/closing and lowest/highest balances per user and month."""
+    assert analytics.monthly_statements() == EXPECTED
+    assert analytics.monthly_statement(2) == EXPECTED[2:]
+    assert analytics.monthly_statement(3) == []
+
+
+def test_statements_follow_dates_not_ids(ledger):
+    """Transactions inserted out of date order still fold in date order."""
+    with bank.connection() as conn:
+        rows = conn.execute('SELECT user_id, transaction_type, amount, date FROM transactions '
+                            'ORDER BY transaction_id DESC').fetchall()
+        conn.execute('DELETE FROM transactions')
+        conn.executemany('INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, ?)', rows)
+    assert analytics.monthly_statements(chunk_size=1) == EXPECTED
+
+
+def test_statements_sort_rows_out_of_order(ledger, monkeypatch):
+    """Rows that group_concat() hands over out of order are sorted by date, then ID, before folding."""
+    assert analytics.in_order([2, 1], np.array([5, 6, 1]), np.array([1, 2, 3]))
+    assert not analytics.in_order([2, 1], np.array([6, 5, 1]), np.array([1, 2, 3]))
+    assert not analytics.in_order([2], np.array([5, 5]), np.array([2, 1]))
+    assert analytics.months_of(np.array([0, 1706745599, 1706745600])).tolist() == [197001, 202401, 202402]
+
+    monkeypatch.setattr(analytics, 'in_order', lambda counts, times, ids: False)
+    assert analytics.monthly_statements() == EXPECTED
+
+
+def test_analyze_in_worker_processes(ledger):
+    """Splitting users across processes gives the same rows as one pass."""
+    assert analytics.user_slices(2) == [(None, 2), (2, None)]
+    assert analytics.analyze(workers=2) == EXPECTED
+
+
+def test_rollup(ledger):
+    """Bank-wide months carry balances of accounts that were idle that month."""
+    assert analytics.rollup(analytics.analyze(workers=1)) == [
+        ('2024-01', 1050, 2, 700, 1, 1, 350),
+        ('2024-03', 200, 1, 350, 1, 2, 200),
+    ]
@@ -0,0 +1,124 @@
+import csv
+
+import pytest
+import bank
+import analytics
+import archive
+import audit
+from exporter import iter_transactions
+from importer import import_transactions
+
+
+@pytest.fixture
+def ledger(bank_db, tmp_path):
+    """Two users with transactions from 2023 to today."""
+    with bank.connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, '')", [(1, 'one'), (2, 'two')])
+
+    rows = [(user_id, 'Deposit', f'{month}.00', f'2023-{month:02d}-{day:02d} 12:00:00')
+            for user_id in (1, 2) for month in range(1, 13) for day in (3, 17)]
+    rows += [(1, 'Withdraw', '5.00', '2023-06-20 09:00:00'), (2, 'Deposit', '1.50', '2024-02-01 00:00:00')]
+    source = tmp_path / 'ledger.csv'
+    with open(source, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('user_id', 'transaction_type', 'amount', 'date'))
+        writer.writerows(rows)
+    import_transactions(str(source))
+    bank.post_transaction(1, 'Deposit', 700)
+    return bank_db
+
+
+def all_history(user_id, page_size=7):
+    """Every history row of a user, fetched page by page."""
+    rows, cursor = bank.transaction_history_page(user_id, page_size)
+    while cursor is not None:
+        page, cursor = bank.transaction_history_page(user_id, page_size, cursor)
+        rows += page
+    return rows
+
+
+def snapshot():
+    """Everything the read-through paths return for both users."""
+    return {
+        'history': [all_history(user_id) for user_id in (1, 2)],
+        'export': [sum(iter_transactions(user_id=user_id, chunk_size=5), []) for user_id in (1, 2)],
+        'range': sorted(sum(iter_transactions(start='2023-06-01', end='2023-08-01'), [])),
+        'everything': sorted(sum(iter_transactions(), [])),
+        'as_of': [bank.balance_as_of(user_id, timestamp) for user_id in (1, 2)
+                  for timestamp in ('2023-02-01', '2023-06-20 08:59:59', '2023-06-20', '2024-02-01 00:00:00')],
+    }
+
+
+def test_archive_reads_through(ledger):
+    """History, exports and point-in-time balances are unchanged by archiving."""
+    before = snapshot()
+    report = archive.archive('2024-01-01')
+    assert (report['users'], report['transactions'], report['blocks']) == (2, 49, 2)
+
+    with bank.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions WHERE date < '2024-01-01'").fetchone()[0] == 0
+        assert conn.execute('SELECT * FROM ledger_checkpoints ORDER BY user_id').fetchall() == [
+            (1, '2024-01-01', 15100, 25), (2, '2024-01-01', 15600, 24)]
+    assert snapshot() == before
+    assert audit.run_audit(workers=1)['clean']
+    # Statements start after the cutoff, opening with the archived balance
+    assert analytics.monthly_statement(2)[0][1:2] + analytics.monthly_statement(2)[0][6:8] == ('2024-02', 15600, 15750)
+
+
+def test_rerun_after_interruption(ledger):
+    """Blocks committed before an interruption are merged, not duplicated."""
+    with bank.connection() as conn:
+        rows = conn.execute("SELECT transaction_id, user_id, transaction_type, amount, date FROM transactions "
+                            "WHERE user_id = 1 AND date < '2023-04-01'").fetchall()
+    archive.store_blocks(rows)
+
+    before = snapshot()
+    assert archive.archive('2024-01-01')['transactions'] == 49
+    assert archive.archive('2024-01-01')['transactions'] == 0
+    assert snapshot() == before
+    assert audit.run_audit(workers=1)['clean']
+
+
+def test_archived_period_is_closed(ledger, tmp_path):
+    """Imports dated before a user's cutoff are rejected; rebuilt snapshots start from the checkpoint."""
+    archive.archive('2024-01-01')
+    source = tmp_path / 'late.csv'
+    source.write_text('user_id,transaction_type,amount,date\n'
+                      '1,Deposit,1.00,2023-12-31\n'
+                      '1,Deposit,2.00,2024-01-15\n')
+    rejects = []
+    assert import_transactions(str(source), on_reject=lambda *reject: rejects.append(reject[-1])) == (1, 1)
+    assert rejects == ["date in an archived period"]
+    assert bank.balance_as_of(1, '2024-01-15') == 15100 + 200
+    assert audit.run_audit(workers=1)['clean']
+
+
+def test_invalid_cutoff(ledger):
+    """Cutoffs must be the first day of a month that has started."""
+    for cutoff in ('2024-01-15', '2024-1-01', '9999-01-01'):
+        with pytest.raises(ValueError):
+            archive.archive(cutoff)
+
+
+def test_archived_ids_are_never_reused(bank_db, tmp_path):
+    """Archiving the whole ledger, posting again and archiving again keeps every archived row."""
+    with bank.connection() as conn:
+        conn.execute("INSERT INTO users (user_id, username, password) VALUES (1, 'one', '')")
+
+    def post(*rows):
+        source = tmp_path / 'post.csv'
+        source.write_text('user_id,transaction_type,amount,date\n' + ''.join(f'1,{row}\n' for row in rows))
+        assert import_transactions(str(source)) == (len(rows), 0)
+
+    post('Deposit,10.00,2023-01-05 10:00:00', 'Withdraw,2.50,2023-03-01 10:00:00')
+    first = sum(iter_transactions(), [])
+    assert archive.archive('2023-06-01')['transactions'] == 2
+    with bank.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 0
+
+    post('Deposit,1.00,2023-07-01 10:00:00')
+    assert archive.archive('2023-08-01')['transactions'] == 1
+    archived = sum(iter_transactions(), [])
+    assert archived[:2] == first
+    assert len({row[0] for row in archived}) == 3
+    assert audit.run_audit(workers=1)['clean']
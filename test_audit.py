@@ -0,0 +1,49 @@
+import pytest
+import bank
+import audit
+
+
+@pytest.fixture
+def ledger(bank_db):
+    """Three users whose balances match their ledgers."""
+    with bank.connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, '')",
+                         [(1, 'one'), (2, 'two'), (3, 'three')])
+    bank.post_transaction(1, 'Deposit', 1000)
+    bank.post_transaction(1, 'Withdraw', 400)
+    bank.post_transaction(2, 'Deposit', 250)
+    return bank_db
+
+
+def test_clean_ledger(ledger):
+    """Matching balances produce an empty report."""
+    report = audit.run_audit(workers=1)
+    assert report['clean']
+    assert (report['users'], report['transactions']) == (3, 3)
+
+
+def test_finds_mismatches_orphans_and_negative_balances(ledger):
+    """Each kind of problem is reported with its details."""
+    with bank.connection() as conn:
+        conn.execute('UPDATE users SET balance = 700 WHERE user_id = 1')
+        conn.execute('UPDATE users SET balance = -5 WHERE user_id = 3')
+        conn.execute("INSERT INTO transactions (user_id, transaction_type, amount, date) "
+                     "VALUES (99, 'Deposit', 30, '2024-01-01 00:00:00')")
+
+    report = audit.run_audit(workers=1)
+    assert not report['clean']
+    assert report['mismatches']['listed'] == [(1, 700, 600), (3, -5, 0)]
+    assert report['orphans']['listed'] == [(99, 1, 30)]
+    assert report['negative_balances']['listed'] == [(3, -5)]
+
+
+def test_parallel_ranges_match_single_scan(ledger):
+    """Aggregating transaction ID ranges in worker processes gives the same report."""
+    with bank.connection() as conn:
+        conn.execute('UPDATE users SET balance = 1 WHERE user_id = 2')
+    assert audit.id_ranges(1, 10, 3) == [(1, 4), (5, 8), (9, 10)]
+
+    single, parallel = audit.run_audit(workers=1), audit.run_audit(workers=2)
+    assert parallel['workers'] == 2
+    for key in ('mismatches', 'orphans', 'negative_balances', 'transactions'):
+        assert parallel[key] == single[key]
@@ -0,0 +1,330 @@
+import pytest
+import sqlite3 as db
+import threading
+import bank
+from bank import create_db, hash_password
+
+
+@pytest.fixture
+def account(db_path):
+    """Create the schema and one user with a balance of 100 cents."""
+    create_db()
+    with bank.connection() as conn:
+        conn.execute("INSERT INTO users (user_id, username, password, balance) VALUES (?, ?, ?, ?)",
+                     (1, 'test_user', hash_password('test_password'), 100))
+    return 1
+
+
+def test_connection_is_reused(db_path):
+    """The same thread gets the same connection on every call."""
+    assert bank.get_connection() is bank.get_connection()
+
+
+def test_connection_is_per_thread(db_path):
+    """Each thread opens its own connection."""
+    conns = []
+    thread = threading.Thread(target=lambda: (conns.append(bank.get_connection()), bank.close_connections()))
+    thread.start()
+    thread.join()
+    assert conns[0] is not bank.get_connection()
+
+
+def test_pragmas_applied(db_path):
+    """New connections use WAL journaling."""
+    conn = bank.get_connection()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+
+
+def test_connection_commits(db_path):
+    """Work inside the block is committed on exit."""
+    with bank.connection() as conn:
+        conn.execute('CREATE TABLE t(x)')
+        conn.execute('INSERT INTO t VALUES (1)')
+
+    other = db.connect(db_path)
+    assert other.execute('SELECT x FROM t').fetchall() == [(1,)]
+    other.close()
+
+
+def test_connection_rolls_back(db_path):
+    """An exception inside the block undoes its work."""
+    with bank.connection() as conn:
+        conn.execute('CREATE TABLE t(x)')
+
+    with pytest.raises(ValueError):
+        with bank.connection() as conn:
+            conn.execute('INSERT INTO t VALUES (1)')
+            raise ValueError
+
+    with bank.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+
+def test_nested_connection_joins_outer(db_path):
+    """A nested block shares the outer transaction."""
+    with bank.connection() as outer:
+        outer.execute('CREATE TABLE t(x)')
+        with bank.connection() as inner:
+            assert inner is outer
+            inner.execute('INSERT INTO t VALUES (1)')
+        assert outer.in_transaction
+
+
+@pytest.mark.parametrize("transaction_type,amount,expected", [
+    ("Deposit", 50, 150),
+    ("Withdraw", 40, 60),
+    ("Withdraw", 100, 0),
+])
+def test_post_transaction(account, transaction_type, amount, expected):
+    """Postings return the new balance and write one ledger row."""
+    assert bank.post_transaction(account, transaction_type, amount) == expected
+
+    with bank.connection() as conn:
+        rows = conn.execute('SELECT transaction_type, amount FROM transactions WHERE user_id = ?',
+                            (account,)).fetchall()
+    assert rows == [(transaction_type, amount)]
+
+
+def test_post_transaction_insufficient_funds(account):
+    """An overdraft is refused and nothing is written."""
+    with pytest.raises(bank.InsufficientFunds):
+        bank.post_transaction(account, "Withdraw", 101)
+
+    with bank.connection() as conn:
+        assert conn.execute('SELECT balance FROM users WHERE user_id = ?', (account,)).fetchone()[0] == 100
+        assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("user_id,transaction_type,amount,error", [
+    (2, "Deposit", 10, bank.UserNotFound),
+    (1, "Deposit", 0, ValueError),
+    (1, "Transfer", 10, ValueError),
+    (1, "Deposit", 0.5, ValueError),
+])
+def test_post_transaction_rejects(account, user_id, transaction_type, amount, error):
+    """Invalid postings raise without touching the ledger."""
+    with pytest.raises(error):
+        bank.post_transaction(user_id, transaction_type, amount)
+
+
+def test_post_transaction_concurrent(account):
+    """Concurrent postings from many threads never lose an update."""
+    def worker():
+        for _ in range(25):
+            bank.post_transaction(account, "Deposit", 1)
+            bank.post_transaction(account, "Withdraw", 2)
+        bank.close_connections()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with bank.connection() as conn:
+        assert conn.execute('SELECT balance FROM users WHERE user_id = ?', (account,)).fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 200
+
+
+def test_posting_queue(account):
+    """Queued postings resolve to running balances in submission order."""
+    with bank.PostingQueue(max_latency=0.05) as postings:
+        futures = [postings.submit(account, "Deposit", 10) for _ in range(5)]
+        overdraft = postings.submit(account, "Withdraw", 1000)
+        missing = postings.submit(2, "Deposit", 10)
+
+    assert [f.result() for f in futures] == [110, 120, 130, 140, 150]
+    with pytest.raises(bank.InsufficientFunds):
+        overdraft.result()
+    with pytest.raises(bank.UserNotFound):
+        missing.result()
+
+    with bank.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 5
+
+
+def test_posting_queue_many_threads(account):
+    """Postings submitted from many threads are all applied exactly once."""
+    with bank.PostingQueue(max_batch=50, max_latency=0.05) as postings:
+        futures = []
+        threads = [threading.Thread(target=lambda: futures.extend(
+            postings.submit(account, "Deposit", 1) for _ in range(50))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        balances = sorted(f.result() for f in futures)
+
+    assert balances == [100 + i for i in range(1, 201)]
+
+
+def test_transaction_history_page(account):
+    """Pages walk the whole history newest first without gaps or repeats."""
+    with bank.connection() as conn:
+        conn.executemany(
+            "INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, 'Deposit', ?, ?)",
+            [(account, i, f'2024-01-{i % 5 + 1:02d} 00:00:00') for i in range(23)]
+        )
+
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = bank.transaction_history_page(account, page_size=10, cursor=cursor)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert len(rows) == 23
+    assert sorted(row[1] for row in rows) == list(range(23))
+    assert [row[2] for row in rows] == sorted((row[2] for row in rows), reverse=True)
+
+
+def test_transaction_history_page_empty(account):
+    """A user without transactions gets an empty final page."""
+    assert bank.transaction_history_page(account) == ([], None)
+
+
+def test_transaction_history_page_uses_index(account):
+    """History pages are served by the composite index without a sort."""
+    with bank.connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT transaction_id, transaction_type, amount, date FROM transactions '
+            'WHERE user_id = ? AND (date, transaction_id) < (?, ?) '
+            'ORDER BY date DESC, transaction_id DESC LIMIT ?', (1, '2024', 1, 10)))
+    assert 'idx_transactions_user_date' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_account_cache_lru(db_path):
+    """The cache evicts the least recently used account and counts hits and misses."""
+    cache = bank.AccountCache(max_size=2)
+    for user_id in (1, 2):
+        cache.put((user_id, f'user{user_id}', 0.0), cache.generation)
+    assert cache.get('1') == (1, 'user1', 0.0)
+    cache.put((3, 'user3', 0.0), cache.generation)
+
+    assert cache.get(2) is None
+    assert cache.get(3) == (3, 'user3', 0.0)
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3, 'size': 2}
+
+
+def test_account_cache_drops_stale_reads(db_path):
+    """A row read before an invalidation is not stored."""
+    cache = bank.AccountCache()
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.put((1, 'user1', 0.0), generation)
+    assert cache.get(1) is None
+
+
+@pytest.mark.parametrize("amount,cents", [
+    ("12.50", 1250), ("0.1", 10), (0.3, 30), (7, 700), (" 3 ", 300), ("-1.25", -125),
+])
+def test_to_cents(amount, cents):
+    """Dollar amounts convert to exact cents."""
+    assert bank.to_cents(amount) == cents
+
+
+@pytest.mark.parametrize("amount", ["1.005", "abc", "", None, "nan", "inf", "99999999999999999999"])
+def test_to_cents_invalid(amount):
+    with pytest.raises(ValueError):
+        bank.to_cents(amount)
+
+
+def test_format_cents():
+    assert [bank.format_cents(c) for c in (0, 5, 1250, -125)] == ["0.00", "0.05", "12.50", "-1.25"]
+
+
+def test_create_db_converts_real_money(db_path):
+    """A database that still stores dollars as REAL is converted to cents."""
+    with bank.connection() as conn:
+        conn.execute('CREATE TABLE users(user_id INTEGER PRIMARY KEY, username TEXT NOT NULL, '
+                     'password TEXT NOT NULL, balance REAL DEFAULT 0.0)')
+        conn.execute("INSERT INTO users VALUES (1, 'a', '', 12.5)")
+    create_db()
+    with bank.connection() as conn:
+        assert conn.execute('SELECT balance FROM users').fetchone()[0] == 1250
+
+
+def test_posting_updates_daily_balance(account):
+    """Every posting records the new balance as today's closing balance."""
+    bank.post_transaction(account, "Deposit", 50)
+    bank.post_transaction(account, "Withdraw", 20)
+    with bank.connection() as conn:
+        assert conn.execute("SELECT day = date('now'), balance FROM daily_balances WHERE user_id = ?",
+                            (account,)).fetchall() == [(1, 130)]
+
+
+def test_balance_as_of(account):
+    """Point-in-time balances match a full replay, with or without snapshots."""
+    with bank.connection() as conn:
+        conn.execute('UPDATE users SET balance = 0')
+        conn.executemany(
+            "INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (1, ?, ?, ?)",
+            [("Deposit", 100, '2024-01-01 09:00:00'), ("Deposit", 50, '2024-01-01 18:00:00'),
+             ("Withdraw", 30, '2024-01-03 12:00:00'), ("Deposit", 5, '2024-01-10 00:00:00')]
+        )
+    expected = {'2023-12-31': 0, '2024-01-01 12:00:00': 100, '2024-01-01': 150, '2024-01-03 11:59:59': 150,
+                '2024-01-03 12:00:00': 120, '2024-01-09': 120, '2024-02-01': 125}
+
+    for rebuilt in (False, True):
+        if rebuilt:
+            assert bank.rebuild_balance_snapshots() == 3
+        for timestamp, balance in expected.items():
+            assert bank.balance_as_of(account, timestamp) == balance
+
+    with pytest.raises(bank.UserNotFound):
+        bank.balance_as_of(2, '2024-01-01')
+    with pytest.raises(ValueError):
+        bank.balance_as_of(account, '01/01/2024')
+
+
+def test_balance_as_of_uses_checkpoint(account):
+    """Only the transactions after the nearest snapshot are read."""
+    with bank.connection() as conn:
+        conn.execute("INSERT INTO daily_balances VALUES (1, '2024-01-05', 999)")
+        conn.execute("INSERT INTO transactions (user_id, transaction_type, amount, date) "
+                     "VALUES (1, 'Deposit', 1, '2024-01-06 10:00:00')")
+    assert bank.balance_as_of(account, '2024-01-06') == 1000
+
+
+def test_change_marker(account):
+    """The marker moves on commits from this or another connection, and only then."""
+    marker = bank.change_marker()
+    assert bank.change_marker() == marker
+    bank.transaction_history_page(account)
+    assert bank.change_marker() == marker
+
+    bank.post_transaction(account, 'Deposit', 5)
+    assert bank.change_marker() != marker
+    marker = bank.change_marker()
+
+    thread = threading.Thread(target=lambda: (bank.post_transaction(account, 'Deposit', 5), bank.close_connections()))
+    thread.start()
+    thread.join()
+    assert bank.change_marker() != marker
+
+
+def test_transactions_since(account):
+    """Only the user's transactions after the last seen ID come back, from a primary key range scan."""
+    with bank.connection() as conn:
+        conn.execute("INSERT INTO users (user_id, username, password) VALUES (2, 'other', '')")
+    bank.post_transaction(account, 'Deposit', 10)
+    last_seen = bank.latest_transaction_id()
+    bank.post_transaction(2, 'Deposit', 20)
+    bank.post_transaction(account, 'Withdraw', 30)
+
+    balance, rows, last_seen = bank.transactions_since(account, last_seen)
+    assert balance == 80
+    assert [row[1:3] for row in rows] == [('Withdraw', 30)]
+    assert last_seen == bank.latest_transaction_id()
+    assert bank.transactions_since(account, last_seen) == (80, [], last_seen)
+
+    with bank.connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT transaction_id, transaction_type, amount, date FROM transactions '
+            'WHERE transaction_id > ? AND +user_id = ? ORDER BY transaction_id', (0, 1)))
+    assert 'INTEGER PRIMARY KEY' in plan
+    assert 'TEMP B-TREE' not in plan
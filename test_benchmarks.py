@@ -0,0 +1,60 @@
+import bank
+from benchmarks.generate import generate, password_for
+from benchmarks.suite import measure
+from benchmarks.tellers import check_consistency, run_load
+import service
+
+
+def test_generate_is_seeded_and_consistent(tmp_path):
+    """The generator is deterministic and balances match the ledger."""
+    snapshots = []
+    for name in ('a.db', 'b.db'):
+        path = str(tmp_path / name)
+        generate(path, users=20, transactions=500, seed=7)
+        conn = bank.get_connection(path)
+        snapshots.append(conn.execute('SELECT user_id, transaction_type, amount, date FROM transactions '
+                                      'ORDER BY transaction_id').fetchall())
+
+        ledger = dict(conn.execute(
+            "SELECT user_id, SUM(CASE WHEN transaction_type = 'Deposit' THEN amount ELSE -amount END) "
+            "FROM transactions GROUP BY user_id"))
+        for user_id, balance in conn.execute('SELECT user_id, balance FROM users'):
+            assert balance == ledger.get(user_id, 0)
+            assert balance >= 0
+
+    assert len(snapshots[0]) == 500
+    assert snapshots[0] == snapshots[1]
+    assert service.authenticate(3, password_for(3), db_name=path)[0] == 3
+    bank.close_connections()
+
+
+def test_measure():
+    """measure() reports throughput and ordered percentiles."""
+    result = measure(lambda i: None, 100)
+    assert result['iterations'] == 100
+    assert result['ops_per_sec'] > 0
+    latency = result['latency_us']
+    assert latency['p50'] <= latency['p90'] <= latency['p99'] <= latency['max']
+
+
+def test_teller_load_stays_consistent(tmp_path):
+    """Concurrent teller processes leave every balance equal to its ledger."""
+    path = str(tmp_path / 'load.db')
+    generate(path, users=10, transactions=200, seed=1)
+    bank.close_connections()
+    report = run_load(path, users=10, processes=2, duration=0.5)
+    assert report['consistent']
+    assert report['operations']['deposit']['count'] > 0
+    assert report['consistency']['balance_change'] == report['consistency']['net_posted']
+
+
+def test_check_consistency_finds_drift(tmp_path):
+    """A balance that no longer matches the ledger is reported."""
+    path = str(tmp_path / 'drift.db')
+    generate(path, users=5, transactions=100, seed=1)
+    assert check_consistency(path) == []
+    with bank.connection(path) as conn:
+        balance = conn.execute('UPDATE users SET balance = balance + 1 WHERE user_id = 3 RETURNING balance'
+                               ).fetchone()[0]
+    assert check_consistency(path) == [(3, balance, balance - 1)]
+    bank.close_connections()
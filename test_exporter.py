@@ -0,0 +1,51 @@
+import csv
+import gzip
+import json
+import pytest
+import bank
+from exporter import export_transactions, iter_transactions
+
+
+@pytest.fixture
+def ledger(bank_db):
+    """A database where users 1 and 2 each have a deposit on the 1st-5th of January."""
+    with bank.connection() as conn:
+        conn.executemany(
+            "INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, 'Deposit', ?, ?)",
+            [(user_id, day, f'2024-01-{day:02d} 12:00:00') for day in range(5, 0, -1) for user_id in (1, 2)]
+        )
+
+
+def test_iter_transactions_chunks(ledger):
+    """Rows come back in chunks of at most chunk_size."""
+    chunks = list(iter_transactions(chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+
+
+def test_export_csv_user_and_dates(ledger, tmp_path):
+    """A user's statement is filtered by date range and sorted by date."""
+    path = tmp_path / 'statement.csv'
+    assert export_transactions(str(path), user_id=1, start='2024-01-02', end='2024-01-04') == 2
+
+    with open(path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [(row['user_id'], row['amount'], row['date']) for row in rows] == [
+        ('1', '0.02', '2024-01-02 12:00:00'), ('1', '0.03', '2024-01-03 12:00:00')
+    ]
+
+
+def test_export_jsonl_gzip(ledger, tmp_path):
+    """A .jsonl.gz export holds one compressed JSON object per transaction."""
+    path = tmp_path / 'ledger.jsonl.gz'
+    assert export_transactions(str(path), chunk_size=4) == 10
+
+    with gzip.open(path, 'rt') as file:
+        rows = [json.loads(line) for line in file]
+    assert len(rows) == 10
+    assert set(rows[0]) == {'transaction_id', 'user_id', 'transaction_type', 'amount', 'date'}
+    assert [row['transaction_id'] for row in rows] == sorted(row['transaction_id'] for row in rows)
+
+
+def test_export_unknown_format(ledger, tmp_path):
+    with pytest.raises(ValueError):
+        export_transactions(str(tmp_path / 'out.xml'), fmt='xml')
@@ -0,0 +1,100 @@
+import gzip
+import json
+import pytest
+import bank
+from importer import import_transactions
+
+
+@pytest.fixture
+def db_path(bank_db):
+    """A fresh database with users 1 and 2, both starting at a zero balance."""
+    with bank.connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, '')",
+                         [(1, 'one'), (2, 'two')])
+    return bank_db
+
+
+def balances():
+    with bank.connection() as conn:
+        return dict(conn.execute('SELECT user_id, balance FROM users'))
+
+
+def test_import_csv(db_path, tmp_path):
+    """Valid rows are posted and invalid ones reported with a reason."""
+    path = tmp_path / 'ledger.csv'
+    path.write_text(
+        "user_id,transaction_type,amount,date\n"
+        "1,Deposit,100,2024-01-01\n"
+        "1,Withdraw,30.25,2024-01-02 10:00:00\n"
+        "2,Deposit,0.05,\n"
+        "1,Withdraw,500,2024-01-03\n"
+        "3,Deposit,10,2024-01-03\n"
+        "x,Deposit,10,2024-01-03\n"
+        "1,Transfer,10,2024-01-03\n"
+        "1,Deposit,-4,2024-01-03\n"
+        "1,Deposit,4,yesterday\n"
+        "1,Deposit,1.005,2024-01-03\n"
+        "1,Deposit,99999999999999999999,2024-01-03\n"
+        "99999999999999999999,Deposit,10,2024-01-03\n"
+    )
+    rejects = []
+    accepted, rejected = import_transactions(str(path), batch_size=2,
+                                             on_reject=lambda *reject: rejects.append(reject))
+
+    assert (accepted, rejected) == (3, 9)
+    assert balances() == {1: 6975, 2: 5}
+    assert sorted((line, reason) for line, _, reason in rejects) == [
+        (5, "insufficient funds"), (6, "unknown user_id"), (7, "invalid user_id"),
+        (8, "invalid transaction_type"), (9, "amount must be positive"), (10, "invalid date"),
+        (11, "invalid amount"), (12, "invalid amount"), (13, "invalid user_id"),
+    ]
+
+    with bank.connection() as conn:
+        dates = [row[0] for row in conn.execute("SELECT date FROM transactions WHERE user_id = 1 ORDER BY date")]
+    assert dates == ['2024-01-01 00:00:00', '2024-01-02 10:00:00']
+
+
+def test_import_jsonl_gzip(db_path, tmp_path):
+    """Gzipped JSON Lines files are streamed the same way."""
+    path = tmp_path / 'ledger.jsonl.gz'
+    with gzip.open(path, 'wt') as file:
+        for i in range(250):
+            file.write(json.dumps({'user_id': 2, 'transaction_type': 'Deposit', 'amount': 2}) + '\n')
+        file.write('not json\n')
+
+    assert import_transactions(str(path), batch_size=100) == (250, 1)
+    assert balances() == {1: 0, 2: 50000}
+
+
+def test_import_overdraft_uses_running_balance(db_path, tmp_path):
+    """A withdrawal is accepted once earlier rows in the file have funded it."""
+    path = tmp_path / 'ledger.csv'
+    path.write_text(
+        "user_id,transaction_type,amount\n"
+        "1,Withdraw,10\n"
+        "1,Deposit,10\n"
+        "1,Withdraw,10\n"
+    )
+    assert import_transactions(str(path)) == (2, 1)
+    assert balances()[1] == 0
+
+
+def test_import_rebuilds_daily_balances(db_path, tmp_path):
+    """Backdated rows leave correct closing balances behind, and future rows are refused."""
+    bank.post_transaction(1, "Deposit", 1000)
+    path = tmp_path / 'ledger.csv'
+    path.write_text(
+        "user_id,transaction_type,amount,date\n"
+        "1,Deposit,1,2024-01-02\n"
+        "1,Deposit,2,2024-01-01\n"
+        "1,Deposit,3,2999-01-01\n"
+    )
+    rejects = []
+    assert import_transactions(str(path), on_reject=lambda *reject: rejects.append(reject)) == (2, 1)
+    assert rejects[0][2] == "date in the future"
+
+    with bank.connection() as conn:
+        snapshots = conn.execute('SELECT day, balance FROM daily_balances WHERE user_id = 1 ORDER BY day').fetchall()
+    assert snapshots[:2] == [('2024-01-01', 200), ('2024-01-02', 300)]
+    assert snapshots[-1][1] == 1300
+    assert bank.balance_as_of(1, '2024-01-01') == 200
@@ -0,0 +1,63 @@
+import json
+import sqlite3 as db
+import pytest
+import bank
+import instrumentation
+
+
+@pytest.fixture
+def profiled(db_path):
+    """Enable instrumentation for connections to a fresh database."""
+    instrumentation.enable()
+    bank.create_db()
+    with bank.connection() as conn:
+        conn.execute("INSERT INTO users (user_id, username, password, balance) VALUES (1, 'a', '', 10)")
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_statements_are_recorded(profiled):
+    """Executions, commits and fetched rows are counted per statement."""
+    bank.post_transaction(1, "Deposit", 5)
+    bank.post_transaction(1, "Deposit", 5)
+    stats = instrumentation.snapshot()
+
+    update = stats['UPDATE users SET balance = balance + ? WHERE user_id = ? RETURNING balance']
+    assert update['count'] == 2
+    assert update['rows'] == 2
+    assert sum(update['histogram'].values()) == 2
+    assert stats['BEGIN IMMEDIATE']['count'] == 2
+    assert stats['COMMIT']['count'] >= 2
+
+
+def test_errors_are_recorded(profiled):
+    with pytest.raises(db.OperationalError):
+        bank.get_connection().execute('SELECT * FROM missing')
+    assert instrumentation.snapshot()['SELECT * FROM missing']['errors'] == 1
+
+
+def test_statement_name_folds_placeholder_lists():
+    assert instrumentation.statement_name('SELECT x\n  FROM t WHERE id IN (?, ?,?)') == \
+        'SELECT x FROM t WHERE id IN (?...)'
+
+
+def test_dump(profiled, tmp_path):
+    bank.get_connection().execute('SELECT 1').fetchall()
+    path = tmp_path / 'stats.json'
+    instrumentation.dump(str(path))
+    assert json.loads(path.read_text())['statements']['SELECT 1']['rows'] == 1
+
+
+def test_disabled_connections_are_plain(db_path):
+    """With instrumentation off, pooled connections are ordinary sqlite3 connections."""
+    assert type(bank.get_connection()) is db.Connection
+
+
+def test_periodic_dump(tmp_path):
+    """Stopping the periodic dump writes a final snapshot."""
+    path = tmp_path / 'stats.json'
+    instrumentation.enable(str(path), interval=60)
+    instrumentation.disable()
+    assert 'statements' in json.loads(path.read_text())
@@ -0,0 +1,65 @@
+import pytest
+import bank
+import jobs
+
+
+@pytest.fixture
+def accounts(bank_db):
+    """Users 1-4 with balances of $100.00, $0.50, $0.00 and $2,000.00."""
+    with bank.connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, username, password, balance) VALUES (?, 'u', '', ?)",
+                         [(1, 10000), (2, 50), (3, 0), (4, 200000)])
+
+
+def balances():
+    with bank.connection() as conn:
+        return dict(conn.execute('SELECT user_id, balance FROM users'))
+
+
+def ledger():
+    with bank.connection() as conn:
+        return conn.execute('SELECT user_id, transaction_type, amount FROM transactions ORDER BY user_id').fetchall()
+
+
+def test_interest(accounts):
+    """Interest is credited once per account it rounds to at least a cent for."""
+    report = jobs.run_job('interest-1', 'interest', jobs.interest_rule(25), chunk_size=3)
+    assert (report['accounts'], report['processed']) == (2, 4)
+    assert balances() == {1: 10025, 2: 50, 3: 0, 4: 200500}
+    assert ledger() == [(1, 'Interest', 25), (4, 'Interest', 500)]
+    assert bank.balance_as_of(4, '2999-01-01') == 200500
+
+    # Same run again: nothing happens
+    assert jobs.run_job('interest-1', 'interest', jobs.interest_rule(25))['processed'] == 0
+    assert balances()[1] == 10025
+
+
+def test_fee_with_waiver(accounts):
+    """Fees are only charged where the balance covers them and is under the waiver."""
+    jobs.run_job('fee-1', 'fee', jobs.fee_rule(250, waive_at=100000))
+    assert balances() == {1: 9750, 2: 50, 3: 0, 4: 200000}
+    assert ledger() == [(1, 'Fee', 250)]
+    with bank.connection() as conn:
+        assert conn.execute("SELECT balance FROM daily_balances WHERE user_id = 1").fetchone()[0] == 9750
+
+
+def test_interrupted_run_resumes(accounts, monkeypatch):
+    """A run stopped part-way carries on without crediting anyone twice."""
+    def interrupt():
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(bank.account_cache, 'clear', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        jobs.run_job('interest-2', 'interest', jobs.interest_rule(100), chunk_size=2)
+    monkeypatch.undo()
+
+    assert balances()[1] == 10100
+    report = jobs.run_job('interest-2', 'interest', jobs.interest_rule(100), chunk_size=2)
+    assert (report['accounts'], report['processed']) == (2, 2)
+    assert balances() == {1: 10100, 2: 50, 3: 0, 4: 202000}
+
+
+def test_run_id_reused_for_other_job(accounts):
+    jobs.run_job('june', 'interest', jobs.interest_rule(25))
+    with pytest.raises(ValueError):
+        jobs.run_job('june', 'fee', jobs.fee_rule(100))
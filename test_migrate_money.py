@@ -0,0 +1,59 @@
+import pytest
+import bank
+import migrate_money
+
+
+@pytest.fixture
+def legacy_db(db_path):
+    """A database in the old layout, with money stored as REAL dollars."""
+    with bank.connection() as conn:
+        conn.execute('CREATE TABLE users(user_id INTEGER PRIMARY KEY, username TEXT NOT NULL, '
+                     'password TEXT NOT NULL, balance REAL DEFAULT 0.0)')
+        conn.execute('CREATE TABLE transactions(transaction_id INTEGER PRIMARY KEY, user_id INTEGER, '
+                     'transaction_type TEXT, amount REAL, date TEXT, FOREIGN KEY(user_id) REFERENCES users(user_id))')
+        conn.executemany('INSERT INTO users VALUES (?, ?, ?, ?)',
+                         [(user_id, f'user{user_id}', '', 0.1 + 0.2) for user_id in range(1, 11)])
+        conn.executemany("INSERT INTO transactions (user_id, transaction_type, amount, date) "
+                         "VALUES (?, 'Deposit', ?, '2024-01-01 00:00:00')",
+                         [(i % 10 + 1, i + 0.1) for i in range(95)])
+    return db_path
+
+
+def test_migrate(legacy_db):
+    """Money is converted to exact cents and the schema is usable afterwards."""
+    report = migrate_money.migrate(batch_size=7)
+
+    assert report['copied'] == {'users': 10, 'transactions': 95}
+    assert report['totals'] == {'users': (10, 300), 'transactions': (95, sum(100 * i + 10 for i in range(95)))}
+    assert not migrate_money.needs_migration()
+    assert migrate_money.migrate() is None
+
+    bank.create_db()
+    assert bank.post_transaction(1, "Deposit", 5) == 35
+    with bank.connection() as conn:
+        assert conn.execute('SELECT typeof(amount) FROM transactions LIMIT 1').fetchone()[0] == 'integer'
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'idx_transactions_user_date'").fetchone()
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%cents%' "
+                            "OR name = 'money_migration'").fetchone()[0] == 0
+
+
+def test_migrate_resumes_and_sees_live_writes(legacy_db):
+    """An interrupted run resumes, and writes made during the copy are carried over."""
+    def interrupt(table, copied):
+        with bank.connection() as conn:
+            conn.execute('UPDATE users SET balance = balance + 1.25 WHERE user_id = 1')
+            conn.execute("INSERT INTO transactions (user_id, transaction_type, amount, date) "
+                         "VALUES (2, 'Deposit', 0.07, '2024-01-02 00:00:00')")
+        raise KeyboardInterrupt
+
+    migrate_money.start()
+    with pytest.raises(KeyboardInterrupt):
+        migrate_money.copy_rows('users', batch_size=4, on_progress=interrupt)
+
+    report = migrate_money.migrate(batch_size=4)
+    assert report['copied']['users'] == 6
+    assert report['totals']['users'] == (10, 300 + 125)
+    assert report['totals']['transactions'][0] == 96
+    assert bank.account_cache.get(1) is None
+    with bank.connection() as conn:
+        assert conn.execute('SELECT balance FROM users WHERE user_id = 1').fetchone()[0] == 155
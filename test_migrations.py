@@ -0,0 +1,84 @@
+import pytest
+import archive
+import bank
+import migrations
+
+
+@pytest.fixture
+def db_path(db_path, monkeypatch):
+    """A fresh database file and a private copy of the migration registry."""
+    monkeypatch.setattr(migrations, 'MIGRATIONS', dict(migrations.MIGRATIONS))
+    return db_path
+
+
+def test_create_db_applies_all_then_nothing(db_path):
+    """A new database gets every migration once; later startups skip them."""
+    applied = bank.create_db()
+    assert [version for version, _, _ in applied] == sorted(migrations.MIGRATIONS)
+    assert all(seconds >= 0 for _, _, seconds in applied)
+    assert migrations.current_version() == migrations.latest_version()
+    assert bank.create_db() == []
+    assert migrations.pending() == []
+
+
+def test_new_migrations_run_in_order(db_path):
+    """Only migrations newer than the stored version run, in version order."""
+    bank.create_db()
+    calls = []
+
+    @migrations.migration(101, "second")
+    def second(conn):
+        calls.append(101)
+        conn.execute('CREATE TABLE second(x)')
+
+    @migrations.migration(100, "backfill", chunked=True)
+    def first(db_name):
+        calls.append(100)
+
+    assert [version for version, _, _ in bank.create_db()] == [100, 101]
+    assert calls == [100, 101]
+    assert bank.create_db() == []
+
+
+def test_failed_migration_rolls_back(db_path):
+    """A plain migration that fails leaves neither its changes nor its version behind."""
+    bank.create_db()
+    version = migrations.current_version()
+
+    @migrations.migration(100, "broken")
+    def broken(conn):
+        conn.execute('CREATE TABLE half_done(x)')
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        bank.create_db()
+    assert migrations.current_version() == version
+    with bank.connection() as conn:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+
+def test_transaction_ids_start_above_archived_ones(db_path):
+    """After the AUTOINCREMENT rebuild, new transactions never get the ID of an archived one."""
+    rebuild = migrations.MIGRATIONS.pop(8)
+    bank.create_db()
+    with bank.connection() as conn:
+        conn.execute("INSERT INTO users (user_id, username, password) VALUES (1, 'one', '')")
+        conn.executemany("INSERT INTO transactions (user_id, transaction_type, amount, date) "
+                         "VALUES (1, 'Deposit', 100, ?)", [('2023-01-01',), ('2023-02-01',), ('2023-03-01',)])
+    assert archive.archive('2024-01-01')['transactions'] == 3
+
+    migrations.MIGRATIONS[8] = rebuild
+    bank.create_db()
+    with bank.connection() as conn:
+        table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'transactions'").fetchone()[0]
+        assert 'AUTOINCREMENT' in table_sql
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE tbl_name = 'transactions' "
+                            "AND type = 'index'").fetchone()[0] == 3
+    bank.post_transaction(1, 'Deposit', 5)
+    with bank.connection() as conn:
+        assert conn.execute('SELECT transaction_id FROM transactions').fetchall() == [(4,)]
+
+
+def test_duplicate_version(db_path):
+    with pytest.raises(ValueError):
+        migrations.migration(1, "again")(lambda conn: None)
@@ -1,6 +1,7 @@
 import pytest
 import sqlite3 as db
-from project import hash_password, create_db, add_user, check_credentials
+import time
+from project import hash_password, create_db, add_user, check_credentials, run_in_background, poll_background
 
 @pytest.fixture
 def setup_database():
@@ -13,7 +14,7 @@ def setup_database():
             user_id INTEGER PRIMARY KEY,
             username TEXT NOT NULL,
             password TEXT NOT NULL,
-            balance REAL DEFAULT 0.0
+            balance INTEGER DEFAULT 0
         )
     ''')
 
@@ -22,7 +23,7 @@ def setup_database():
             transaction_id INTEGER PRIMARY KEY,
             user_id INTEGER,
             transaction_type TEXT,
-            amount REAL,
+            amount INTEGER,
             date TEXT,
             FOREIGN KEY(user_id) REFERENCES users(user_id)
         )
@@ -41,7 +42,7 @@ def setup_users(setup_database):
 
     # Add test user
     c.execute("INSERT INTO users (user_id, username, password, balance) VALUES (?, ?, ?, ?)",
-              (1, 'test_user', hash_password('test_password'), 100.0))
+              (1, 'test_user', hash_password('test_password'), 10000))
     conn.commit()
     yield conn  # Provide the connection to the test
 
@@ -100,3 +101,29 @@ def test_check_credentials(setup_users):
     c.execute("DELETE FROM users WHERE user_id = ?", (1,))
     conn.commit()
 
+
+def test_create_db_history_index():
+    """Test that create_db adds the transaction history index."""
+    create_db()
+    conn = db.connect('users.db')
+    c = conn.cursor()
+
+    c.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_transactions_user_date'")
+    assert c.fetchone() is not None
+
+    conn.close()
+
+def test_run_in_background():
+    """Test that background work is delivered by poll_background."""
+    results = []
+    future = run_in_background(lambda: 6 * 7, results.append)
+    assert future.result() == 42
+
+    # The result only reaches the callback once the queue is polled
+    assert results == []
+    deadline = time.monotonic() + 2
+    while not results and time.monotonic() < deadline:
+        poll_background()
+        time.sleep(0.01)
+
+    assert results == [42]
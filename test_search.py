@@ -0,0 +1,87 @@
+import pytest
+import bank
+import archive
+
+
+TYPES = ('Deposit', 'Withdraw', 'Interest', 'Fee')
+
+
+@pytest.fixture
+def ledger(bank_db):
+    """Two users with 200 transactions each, spread over 2023 and 2024."""
+    with bank.connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, '')", [(1, 'one'), (2, 'two')])
+        conn.executemany(
+            'INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, ?)',
+            [(user_id, TYPES[i % 4], (i * 37) % 50 * 100, f'{2023 + i % 2}-{i % 12 + 1:02d}-{i % 9 + 1:02d} 10:00:00')
+             for user_id in (1, 2) for i in range(200)]
+        )
+    return bank_db
+
+
+def search_all(user_id, page_size=7, **filters):
+    """Every result of a search, fetched page by page."""
+    rows, cursor = bank.search_transactions(user_id, page_size=page_size, **filters)
+    while cursor is not None:
+        page, cursor = bank.search_transactions(user_id, page_size=page_size, cursor=cursor, **filters)
+        rows += page
+    return rows
+
+
+def expected(user_id, transaction_type=None, start=None, end=None, min_amount=None, max_amount=None, sort='newest'):
+    """The same search done in Python over the whole table."""
+    with bank.connection() as conn:
+        rows = conn.execute('SELECT transaction_id, transaction_type, amount, date FROM transactions '
+                            'WHERE user_id = ?', (user_id,)).fetchall()
+    rows = [row for row in rows if (transaction_type is None or row[1] == transaction_type)
+            and (start is None or row[3] >= start) and (end is None or row[3] < end)
+            and (min_amount is None or row[2] >= min_amount) and (max_amount is None or row[2] <= max_amount)]
+    keys, descending = bank.SEARCH_SORTS[sort]
+    rows.sort(key=lambda row: tuple(row[bank.SEARCH_COLUMNS.index(key)] for key in keys), reverse=descending)
+    return [row[1:] for row in rows]
+
+
+SEARCHES = [
+    {},
+    {'sort': 'oldest'},
+    {'transaction_type': 'Fee'},
+    {'start': '2023-03-01', 'end': '2023-09-01'},
+    {'transaction_type': 'Deposit', 'start': '2024-01-01', 'sort': 'oldest'},
+    {'min_amount': 1000, 'max_amount': 2500},
+    {'sort': 'largest'},
+    {'min_amount': 4000, 'sort': 'smallest'},
+    {'transaction_type': 'Withdraw', 'max_amount': 1500, 'sort': 'largest'},
+    {'start': '2024-06-01', 'min_amount': 3000},
+]
+
+
+@pytest.mark.parametrize('filters', SEARCHES)
+def test_search_pages_match_filters(ledger, filters):
+    """Paging through a search returns exactly the matching rows in sort order."""
+    assert search_all(1, **filters) == expected(1, **filters)
+
+
+@pytest.mark.parametrize('filters', SEARCHES + [{'cursor': ('2024-01-01 00:00:00', 5)},
+                                                {'sort': 'largest', 'cursor': (2000, '2024-01-01', 5)}])
+def test_search_uses_covering_index(ledger, filters):
+    """Every search is answered from an index alone, without a sort."""
+    sql, params = bank.search_query(1, **filters)
+    with bank.connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+    assert 'USING COVERING INDEX' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_search_reads_through_archive(ledger):
+    """Archived transactions are found by the same searches, in the same order."""
+    before = [search_all(1, **filters) for filters in SEARCHES]
+    assert archive.archive('2024-01-01')['transactions'] == 200
+    assert [search_all(1, **filters) for filters in SEARCHES] == before
+
+
+def test_invalid_search(ledger):
+    """Unknown sort orders and malformed dates are rejected."""
+    with pytest.raises(ValueError):
+        bank.search_transactions(1, sort='cheapest')
+    with pytest.raises(ValueError):
+        bank.search_transactions(1, start='01/02/2024')
@@ -0,0 +1,120 @@
+import asyncio
+import http.client
+import json
+import threading
+import pytest
+import server
+
+
+@pytest.fixture
+def api(bank_db):
+    """Run the API server on a free port against a fresh database."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    port = []
+
+    def ready(bound_port):
+        port.append(bound_port)
+        started.set()
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    task = loop.create_task(server.serve(port=0, workers=2, ready=ready))
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait(5)
+
+    conn = http.client.HTTPConnection('127.0.0.1', port[0], timeout=5)
+    yield conn
+
+    conn.close()
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    loop.close()
+
+
+def call(conn, path, body, method='POST'):
+    """Send one request and return (status, decoded JSON)."""
+    conn.request(method, path, json.dumps(body), {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_api_flow(api):
+    """Register, log in, post and read history over one keep-alive connection."""
+    assert call(api, '/register', {'user_id': 1, 'username': 'amy', 'password': 'pw'})[0] == 201
+    assert call(api, '/authenticate', {'user_id': 1, 'password': 'pw'}) == \
+        (200, {'user_id': 1, 'username': 'amy', 'balance': 0})
+    assert call(api, '/deposit', {'user_id': 1, 'amount': 50}) == (200, {'balance': 50})
+    assert call(api, '/withdraw', {'user_id': 1, 'amount': 20}) == (200, {'balance': 30})
+
+    status, page = call(api, '/history', {'user_id': 1, 'page_size': 1})
+    assert status == 200
+    assert len(page['transactions']) == 1
+    status, page = call(api, '/history', {'user_id': 1, 'cursor': page['next_cursor']})
+    assert len(page['transactions']) == 1
+    assert page['next_cursor'] is None
+
+    status, page = call(api, '/search', {'user_id': 1, 'type': 'Withdraw', 'sort': 'largest'})
+    assert [row['amount'] for row in page['transactions']] == [20]
+
+    assert call(api, '/balance-as-of', {'user_id': 1, 'timestamp': '2000-01-01'}) == (200, {'balance': 0})
+    assert call(api, '/reset-password', {'user_id': 1, 'new_password': 'new'})[0] == 200
+    assert call(api, '/authenticate', {'user_id': 1, 'password': 'new'})[0] == 200
+
+    assert call(api, '/register', {'user_id': 2, 'username': 'bo', 'password': 'pw'})[0] == 201
+    assert call(api, '/transfer', {'from_id': 1, 'to_id': 2, 'amount': 10}) == \
+        (200, {'from_balance': 20, 'to_balance': 10})
+
+
+@pytest.mark.parametrize("path,body,status", [
+    ('/authenticate', {'user_id': 9, 'password': 'pw'}, 404),
+    ('/withdraw', {'user_id': 1, 'amount': 1000}, 409),
+    ('/register', {'user_id': 1, 'username': 'amy', 'password': 'pw'}, 409),
+    ('/register', {'user_id': 'abc', 'username': 'amy', 'password': 'pw'}, 400),
+    ('/deposit', {'user_id': 1, 'amount': -5}, 400),
+    ('/deposit', {'user_id': 1}, 400),
+    ('/deposit', {'user_id': 1, 'amount': 2**63}, 400),
+    ('/authenticate', {'user_id': 1, 'password': 'wrong'}, 401),
+    ('/search', {'user_id': 1, 'sort': 'cheapest'}, 400),
+    ('/transfer', {'from_id': 1, 'to_id': 1, 'amount': 5}, 400),
+    ('/transfer', {'from_id': '1', 'to_id': 1, 'amount': 5}, 400),
+    ('/authenticate', {'user_id': 1}, 400),
+    ('/authenticate', {'user_id': 1, 'password': 5}, 400),
+    ('/deposit', {'user_id': [1], 'amount': 5}, 400),
+    ('/deposit', {'user_id': True, 'amount': 5}, 400),
+    ('/history', {'user_id': 1, 'page_size': 0}, 400),
+    ('/history', {'user_id': 1, 'page_size': '5'}, 400),
+    ('/history', {'user_id': 1, 'cursor': 5}, 400),
+    ('/history', {'user_id': 1, 'cursor': ['2000-01-01']}, 400),
+    ('/history', {'user_id': 1, 'cursor': [['2000-01-01'], 1]}, 400),
+    ('/search', {'user_id': 1, 'sort': 'largest', 'cursor': ['2000-01-01', 1]}, 400),
+    ('/search', {'user_id': 1, 'min_amount': {}}, 400),
+    ('/balance-as-of', {'user_id': 1, 'timestamp': 20000101}, 400),
+    ('/nowhere', {}, 404),
+])
+def test_api_errors(api, path, body, status):
+    """Service errors map to HTTP status codes."""
+    call(api, '/register', {'user_id': 1, 'username': 'amy', 'password': 'pw'})
+    assert call(api, path, body)[0] == status
+
+
+def test_api_reports_internal_errors(api, monkeypatch):
+    """A bug in the service layer is a server error, not a bad request."""
+    def broken(user_id, amount):
+        return {}['balance']
+
+    monkeypatch.setattr(server.backend, 'deposit', broken)
+    assert call(api, '/deposit', {'user_id': 1, 'amount': 5}) == (500, {'error': 'KeyError'})
+
+
+def test_api_rejects_get(api):
+    """Endpoints only accept POST."""
+    api.request('GET', '/history')
+    response = api.getresponse()
+    response.read()
+    assert response.status == 405
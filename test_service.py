@@ -0,0 +1,77 @@
+import pytest
+import bank
+import service
+
+
+@pytest.fixture
+def user(bank_db):
+    """Register one user."""
+    service.register(1, 'test_user', 'test_password')
+    return 1
+
+
+def test_register(user):
+    """A registered user starts with a zero balance."""
+    assert service.get_account(user) == (1, 'test_user', 0)
+
+
+@pytest.mark.parametrize("user_id,username,password,error", [
+    (1, 'other', 'pw', service.UserExists),
+    (2, '', 'pw', ValueError),
+    (2, 'other', '', ValueError),
+    ('1', 'other', 'pw', service.UserExists),
+    ('abc', 'other', 'pw', ValueError),
+    (2.5, 'other', 'pw', ValueError),
+    (2**63, 'other', 'pw', ValueError),
+])
+def test_register_rejects(user, user_id, username, password, error):
+    """Duplicate IDs, IDs that are not whole numbers and empty fields are refused."""
+    with pytest.raises(error):
+        service.register(user_id, username, password)
+
+
+def test_authenticate(user):
+    """The right password returns the account, wrong ones raise."""
+    assert service.authenticate(user, 'test_password') == (1, 'test_user', 0)
+    with pytest.raises(service.InvalidCredentials):
+        service.authenticate(user, 'wrong')
+    with pytest.raises(bank.UserNotFound):
+        service.authenticate(2, 'test_password')
+
+
+def test_deposit_withdraw_history(user):
+    """Postings change the balance and show up in the history."""
+    assert service.deposit(user, 100) == 100
+    assert service.withdraw(user, 30) == 70
+    with pytest.raises(bank.InsufficientFunds):
+        service.withdraw(user, 71)
+
+    rows, cursor = service.history(user)
+    assert sorted(row[:2] for row in rows) == [("Deposit", 100), ("Withdraw", 30)]
+    assert cursor is None
+
+
+def test_reset_password(user):
+    """A reset password is the only one that authenticates afterwards."""
+    service.reset_password(user, 'new_password')
+    assert service.authenticate(user, 'new_password')[0] == user
+    with pytest.raises(service.InvalidCredentials):
+        service.authenticate(user, 'test_password')
+    with pytest.raises(bank.UserNotFound):
+        service.reset_password(2, 'new_password')
+
+
+def test_get_account_cached(user, monkeypatch):
+    """Repeated lookups are served from the cache until a write invalidates them."""
+    bank.account_cache.reset_stats()
+    service.get_account(user)
+    monkeypatch.setattr(bank, 'get_connection', None)
+    assert service.get_account(user) == (1, 'test_user', 0)
+    assert bank.account_cache.stats()['hits'] == 1
+    monkeypatch.undo()
+
+    service.deposit(user, 25)
+    assert service.get_account(user) == (1, 'test_user', 25)
+    with bank.PostingQueue() as postings:
+        postings.submit(user, "Withdraw", 5).result()
+    assert service.get_account(user) == (1, 'test_user', 20)
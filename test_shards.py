@@ -0,0 +1,71 @@
+import csv
+
+import pytest
+import bank
+from service import InvalidCredentials
+from shards import ShardedBank, shard_index, shard_paths
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    """A three-shard bank with users 1-30, each holding user_id dollars."""
+    shards = ShardedBank(str(tmp_path / 'bank.db'), shards=3)
+    shards.create()
+    for user_id in range(1, 31):
+        shards.register(user_id, f'user{user_id}', 'pw')
+        shards.deposit(user_id, user_id * 100)
+    yield shards
+    bank.close_connections()
+
+
+def test_routing_is_stable_and_spread():
+    """A user always maps to the same shard, and users spread over all shards."""
+    assert shard_index(42, 4) == shard_index('42', 4)
+    counts = [0] * 4
+    for user_id in range(1, 10001):
+        counts[shard_index(user_id, 4)] += 1
+    assert min(counts) > 2300
+    with pytest.raises(ValueError):
+        shard_index('abc', 4)
+
+
+def test_operations_stay_on_the_users_shard(sharded):
+    """Every operation for a user reads and writes only their shard."""
+    home = sharded.path_for(7)
+    assert sharded.withdraw(7, 200) == 500
+    assert sharded.authenticate(7, 'pw') == (7, 'user7', 500)
+    with pytest.raises(InvalidCredentials):
+        sharded.authenticate(7, 'wrong')
+    assert [row[:2] for row in sharded.history(7)[0]] == [('Withdraw', 200), ('Deposit', 700)]
+
+    for path in sharded.paths:
+        conn = bank.get_connection(path)
+        found = conn.execute('SELECT COUNT(*) FROM transactions WHERE user_id = 7').fetchone()[0]
+        assert found == (2 if path == home else 0)
+
+
+def test_totals_merge_every_shard(sharded):
+    """Totals fan out over worker processes and add up across shards."""
+    for workers in (1, 3):
+        totals = sharded.totals(workers=workers)
+        assert (totals['users'], totals['transactions'], totals['balance']) == (30, 30, 46500)
+        assert [shard['path'] for shard in totals['shards']] == sharded.paths
+        assert all(shard['users'] for shard in totals['shards'])
+
+
+def test_export_merges_every_shard(sharded, tmp_path):
+    """A bank-wide export has one header and every shard's rows."""
+    path = str(tmp_path / 'all.csv')
+    assert sharded.export(path, workers=2) == 30
+    with open(path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert sorted(int(row['user_id']) for row in rows) == list(range(1, 31))
+
+    assert sharded.export(str(tmp_path / 'one.jsonl'), user_id=5) == 1
+
+
+def test_shard_count_mismatch(sharded, tmp_path):
+    """Opening existing shards with another shard count is refused."""
+    assert shard_paths('bank.db', 2) == ['bank.shard-0-of-2.db', 'bank.shard-1-of-2.db']
+    with pytest.raises(ValueError):
+        ShardedBank(str(tmp_path / 'bank.db'), shards=4)
@@ -0,0 +1,137 @@
+import pytest
+import bank
+import archive
+import audit
+import transfers
+from bank import InsufficientFunds, UserNotFound
+
+
+@pytest.fixture
+def accounts(bank_db):
+    """A funding account (user 1) holding 1000.00 and four payees with 10.00 each."""
+    with bank.connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, '')",
+                         [(user_id, f'user{user_id}') for user_id in range(1, 6)])
+    bank.post_transaction(1, 'Deposit', 100000)
+    for user_id in range(2, 6):
+        bank.post_transaction(user_id, 'Deposit', 1000)
+    return bank_db
+
+
+def balances():
+    with bank.connection() as conn:
+        return dict(conn.execute('SELECT user_id, balance FROM users'))
+
+
+def test_transfer(accounts):
+    """A transfer posts a linked debit and credit and keeps the ledger balanced."""
+    assert bank.transfer(2, 3, 400) == (600, 1400)
+    with bank.connection() as conn:
+        debit, credit = conn.execute('SELECT debit_id, credit_id FROM transfers').fetchone()
+        rows = dict(conn.execute('SELECT transaction_id, transaction_type FROM transactions '
+                                 'WHERE transaction_id IN (?, ?)', (debit, credit)))
+    assert rows == {debit: 'Transfer Out', credit: 'Transfer In'}
+    assert bank.balance_as_of(3, '9999-12-31') == 1400
+    assert audit.run_audit(workers=1)['clean']
+
+
+def test_failed_transfer_changes_nothing(accounts):
+    """Overdrafts, unknown payees and self-transfers are rejected without writing anything."""
+    before = balances()
+    with pytest.raises(InsufficientFunds):
+        bank.transfer(2, 3, 1001)
+    with pytest.raises(UserNotFound):
+        bank.transfer(2, 99, 10)
+    for from_id, to_id in ((2, 2), ('2', 2), (2, ' 2 '), ('abc', 2), (2, 2.0)):
+        with pytest.raises(ValueError):
+            bank.transfer(from_id, to_id, 10)
+    assert balances() == before
+    with bank.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions "
+                            "WHERE transaction_type LIKE 'Transfer%'").fetchone() == (0,)
+
+
+def test_transfer_with_string_ids(accounts):
+    """IDs given as strings, as a form or JSON body may send them, name the same accounts."""
+    assert bank.transfer('2', 3, 100) == (900, 1100)
+    assert transfers.run_batch('mixed', '1', [('2', 100), (3, 100)])['posted'] == 2
+    assert transfers.run_batch('mixed', 1, [(2, 100), ('3', 100)])['posted'] == 0
+    assert balances() == {1: 99800, 2: 1000, 3: 1200, 4: 1000, 5: 1000}
+
+
+def test_batch_in_chunks_once_per_run(accounts):
+    """A batch is posted chunk by chunk, and running its ID again posts nothing."""
+    batch = [(2, 100), (3, 200), (4, 300), (5, 400), (2, 500)]
+    report = transfers.run_batch('payroll-1', 1, batch, chunk_size=2)
+    assert (report['transfers'], report['posted'], report['total']) == (5, 5, 1500)
+    assert balances() == {1: 98500, 2: 1600, 3: 1200, 4: 1300, 5: 1400}
+
+    assert transfers.run_batch('payroll-1', 1, batch)['posted'] == 0
+    assert balances()[1] == 98500
+    with pytest.raises(ValueError):
+        transfers.run_batch('payroll-1', 1, batch[:2])
+    with bank.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transfers WHERE run_id = 'payroll-1'").fetchone() == (5,)
+    assert audit.run_audit(workers=1)['clean']
+
+
+def test_batch_rejected_up_front(accounts):
+    """Unknown recipients or an uncovered total reject the whole batch before anything is posted."""
+    before = balances()
+    with pytest.raises(UserNotFound, match='98, 99'):
+        transfers.run_batch('bad', 1, [(2, 100), (99, 100), (98, 100)])
+    with pytest.raises(InsufficientFunds):
+        transfers.run_batch('bad', 1, [(2, 60000), (3, 60000)])
+    for from_id, batch in ((1, [(1, 100)]), ('1', [(1, 100)]), (1, [(2, 100), ('1', 100)])):
+        with pytest.raises(ValueError):
+            transfers.run_batch('bad', from_id, batch)
+    with pytest.raises(ValueError):
+        transfers.check_batch('1', [(1, 100)])
+    assert balances() == before
+
+    # Nothing was registered, so the corrected batch can use the same ID
+    assert transfers.run_batch('bad', 1, [(2, 100)])['posted'] == 1
+
+
+def test_interrupted_batch_resumes(accounts, monkeypatch):
+    """A run stopped by a balance drop mid-run carries on after its last committed chunk."""
+    batch = [(user_id, 10000) for user_id in (2, 3, 4, 5)] * 2
+    original = transfers.post_chunk
+    calls = []
+
+    def drain_after_first_chunk(conn, *args):
+        if calls:
+            conn.execute('UPDATE users SET balance = 0 WHERE user_id = 1')
+        calls.append(1)
+        original(conn, *args)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(transfers, 'post_chunk', drain_after_first_chunk)
+        with pytest.raises(InsufficientFunds):
+            transfers.run_batch('payroll-2', 1, batch, chunk_size=4)
+    assert balances()[1] == 60000
+
+    report = transfers.run_batch('payroll-2', 1, batch, chunk_size=4)
+    assert (report['transfers'], report['posted']) == (8, 4)
+    assert balances() == {1: 20000, 2: 21000, 3: 21000, 4: 21000, 5: 21000}
+    assert audit.run_audit(workers=1)['clean']
+
+
+def test_transfer_after_archive(accounts):
+    """Archiving moves transfer pairings with their ledger rows, and transfers keep working afterwards."""
+    bank.transfer(2, 3, 400)
+    with bank.connection() as conn:
+        conn.execute("UPDATE transactions SET date = '2024-01-15 10:00:00'")
+        archived = conn.execute('SELECT debit_id, credit_id, run_id FROM transfers').fetchall()
+    assert archive.archive('2024-06-01')['transactions'] == 7
+
+    assert bank.transfer(1, 2, 50) == (99950, 650)
+    assert transfers.run_batch('after-archive', 1, [(3, 100)])['posted'] == 1
+    with bank.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM transfers '
+                            'WHERE debit_id NOT IN (SELECT transaction_id FROM transactions) '
+                            'OR credit_id NOT IN (SELECT transaction_id FROM transactions)').fetchone() == (0,)
+        assert conn.execute('SELECT COUNT(*) FROM transfers').fetchone() == (2,)
+    with bank.connection(archive.archive_path()) as conn:
+        assert conn.execute('SELECT debit_id, credit_id, run_id FROM transfers').fetchall() == archived
+    assert audit.run_audit(workers=1)['clean']
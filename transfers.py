@@ -0,0 +1,248 @@
+"""
+Children's Bank of Canada - Batch Transfers
+
+Payroll-style runs that move money from one funding account to many
+recipients. Every transfer is a pair of ledger rows, a "Transfer Out" on the
+funding account and a "Transfer In" on the recipient, linked in the
+transfers table.
+
+A batch is checked in full before anything is written: every amount must be
+a positive number of cents, every recipient must exist and differ from the
+funding account, and the funding balance must cover the whole batch.
+
+Transfers are then posted `chunk_size` at a time in batch order. For each
+chunk, one write transaction:
+
+1. debits the funding account by the chunk's total with a conditional
+   UPDATE, so a balance that has dropped since the check stops the run,
+2. writes the chunk's ledger rows with one executemany, a Transfer Out and
+   its Transfer In next to each other, and pairs them in transfers,
+3. credits the recipients with a single UPDATE ... FROM the new ledger rows
+   (a recipient listed twice is credited twice),
+4. sets the closing balance for the day of every account it touched, and
+   records how many transfers the run has posted in job_runs.
+
+Each transaction takes the write lock up front (BEGIN IMMEDIATE) and
+updates the funding account before any recipient, so runs never wait on
+each other in a different order, and a run's ledger rows get their IDs in
+batch order. Like the jobs in jobs.py, each run has an ID: re-running an ID
+that finished does nothing, and re-running one that was interrupted carries
+on after its last committed chunk. An ID can only be reused for the same
+funding account and batch.
+
+Usage:
+    python transfers.py send FROM_ID TO_ID AMOUNT [--db users.db]
+    python transfers.py batch RUN_ID FROM_ID FILE [--chunk-size 5000] [--db users.db]
+
+FILE is a .csv or .jsonl file (optionally .gz) with user_id and amount (in
+dollars) on every row.
+"""
+
+import argparse
+import hashlib
+import json
+import time
+
+from bank import (InsufficientFunds, UserNotFound, account_cache, check_amount, check_user_id, connection, format_cents,
+                  get_db_name, to_cents, transfer)
+from importer import read_rows
+from jobs import start_run
+
+# Transfers per write transaction
+CHUNK_SIZE = 5000
+
+# Missing recipients named in the error of a rejected batch
+MAX_LISTED = 10
+
+
+def read_batch(path):
+    """
+    Read a batch file into (user_id, amount in cents) pairs.
+
+    Raises:
+        ValueError: On the first row without a whole-number user_id or a valid
+            positive amount, naming its line
+    """
+    batch = []
+    for line_number, record in read_rows(path):
+        try:
+            if record is None:
+                raise ValueError("unreadable row")
+            user_id, amount = int(record['user_id']), to_cents(record['amount'])
+            check_amount(amount)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}, line {line_number}: {e}") from None
+        batch.append((user_id, amount))
+    return batch
+
+
+def batch_params(from_id, batch):
+    """Describe a batch for job_runs: the funding account, size, total and a digest of the transfers."""
+    digest = hashlib.sha256(json.dumps(batch, separators=(',', ':')).encode()).hexdigest()
+    return json.dumps({'from': from_id, 'transfers': len(batch), 'total': sum(amount for _, amount in batch),
+                       'sha256': digest}, sort_keys=True)
+
+
+def check_batch(from_id, batch, db_name=None):
+    """
+    Check a batch against the database before any of it is posted.
+
+    Args:
+        from_id: User ID of the funding account
+        batch: (user_id, amount in cents) transfers still to post
+        db_name: Database file name (default: the configured database)
+
+    Raises:
+        ValueError: If a user ID or amount is invalid, or the funding account is also a recipient
+        UserNotFound: If the funding account or any recipient does not exist
+        InsufficientFunds: If the funding balance does not cover the batch
+    """
+    from_id = check_user_id(from_id)
+    for user_id, amount in batch:
+        check_amount(amount)
+        if check_user_id(user_id) == from_id:
+            raise ValueError(f"The funding account {from_id} cannot pay itself")
+
+    with connection(db_name) as conn:
+        funding = conn.execute('SELECT balance FROM users WHERE user_id = ?', (from_id,)).fetchone()
+        if funding is None:
+            raise UserNotFound(from_id)
+        missing = [user_id for (user_id,) in conn.execute(
+            'SELECT DISTINCT value FROM json_each(?) '
+            'WHERE NOT EXISTS (SELECT 1 FROM users WHERE user_id = value) ORDER BY value',
+            (json.dumps([user_id for user_id, _ in batch]),)
+        )]
+    if missing:
+        raise UserNotFound(', '.join(map(str, missing[:MAX_LISTED])) + (' ...' if len(missing) > MAX_LISTED else ''))
+    if sum(amount for _, amount in batch) > funding[0]:
+        raise InsufficientFunds(from_id)
+
+
+def post_chunk(conn, run_id, from_id, chunk):
+    """
+    Post one chunk of transfers on a connection inside a write transaction.
+
+    Raises:
+        InsufficientFunds: If the funding balance no longer covers the chunk
+    """
+    total = sum(amount for _, amount in chunk)
+    if not conn.execute('UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ? RETURNING 1',
+                        (total, from_id, total)).fetchall():
+        raise InsufficientFunds(from_id)
+
+    now = conn.execute("SELECT datetime('now')").fetchone()[0]
+    before = conn.execute('SELECT COALESCE(MAX(transaction_id), 0) FROM transactions').fetchone()[0]
+    conn.executemany(
+        'INSERT INTO transactions (user_id, transaction_type, amount, date) VALUES (?, ?, ?, ?)',
+        (entry for user_id, amount in chunk
+         for entry in ((from_id, 'Transfer Out', amount, now), (user_id, 'Transfer In', amount, now)))
+    )
+    # Each Transfer Out was inserted right before its Transfer In
+    conn.execute(
+        "INSERT INTO transfers (debit_id, credit_id, run_id) SELECT transaction_id, transaction_id + 1, ? "
+        "FROM transactions WHERE transaction_id > ? AND transaction_type = 'Transfer Out'", (run_id, before)
+    )
+    # NOT INDEXED keeps the GROUP BY from walking a whole user_id index instead of the new rows
+    conn.execute(
+        'UPDATE users SET balance = balance + credit.total FROM ('
+        "    SELECT user_id, SUM(amount) AS total FROM transactions NOT INDEXED WHERE transaction_id > ? "
+        "    AND transaction_type = 'Transfer In' GROUP BY user_id"
+        ') AS credit WHERE credit.user_id = users.user_id', (before,)
+    )
+    conn.execute(
+        'INSERT INTO daily_balances (user_id, day, balance) '
+        'SELECT user_id, substr(?, 1, 10), balance FROM users WHERE user_id IN ('
+        '    SELECT user_id FROM transactions WHERE transaction_id > ?) '
+        'ON CONFLICT(user_id, day) DO UPDATE SET balance = excluded.balance', (now, before)
+    )
+
+
+def run_batch(run_id, from_id, batch, chunk_size=CHUNK_SIZE, db_name=None):
+    """
+    Post a batch of transfers from one funding account, once per run ID.
+
+    Args:
+        run_id: Unique ID of this run, e.g. "payroll-2024-06"
+        from_id: User ID of the funding account
+        batch: (user_id, amount in cents) pairs, posted in this order
+        chunk_size: Transfers per write transaction
+        db_name: Database file name (default: the configured database)
+
+    Returns:
+        Dict with the run's transfers (posted in total), total (cents in the
+        batch), posted (transfers posted by this call), seconds and
+        transfers_per_second
+
+    Raises:
+        ValueError: If the batch is invalid, or `run_id` was used for a different batch
+        UserNotFound: If the funding account or a recipient does not exist
+        InsufficientFunds: If the funding balance does not cover the rest of
+            the batch; chunks committed before a balance drop mid-run stay
+            posted, and re-running the ID carries on from there
+    """
+    path = get_db_name(db_name)
+    # Normalised before the batch is described, so '5' and 5 post and digest the same
+    from_id = check_user_id(from_id)
+    batch = [(check_user_id(user_id), amount) for user_id, amount in batch]
+    with connection(path) as conn:
+        resumed = conn.execute('SELECT 1 FROM job_runs WHERE run_id = ?', (run_id,)).fetchone() is not None
+    if not resumed:
+        # Checked before the run is registered, so a rejected batch can be fixed and sent under the same ID
+        check_batch(from_id, batch, path)
+    # job_runs counts the transfers a run has posted in its accounts column
+    _, position, finished = start_run(run_id, 'transfer', batch_params(from_id, batch), path)
+    remaining = [] if finished else batch[position:]
+    if resumed:
+        check_batch(from_id, remaining, path)
+
+    began = time.perf_counter()
+    try:
+        for start in range(0, len(remaining), chunk_size):
+            chunk = remaining[start:start + chunk_size]
+            with connection(path, immediate=True) as conn:
+                post_chunk(conn, run_id, from_id, chunk)
+                conn.execute('UPDATE job_runs SET accounts = accounts + ? WHERE run_id = ?', (len(chunk), run_id))
+            position += len(chunk)
+        if not finished:
+            with connection(path) as conn:
+                conn.execute("UPDATE job_runs SET finished = datetime('now') WHERE run_id = ?", (run_id,))
+    finally:
+        account_cache.clear()
+
+    seconds = time.perf_counter() - began
+    posted = len(remaining)
+    return {'run_id': run_id, 'transfers': position, 'total': sum(amount for _, amount in batch), 'posted': posted,
+            'seconds': seconds, 'transfers_per_second': posted / seconds if seconds else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move money between accounts")
+    parser.add_argument('--db', default=None, help="database file (default: users.db or $BANK_DB)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    send = subparsers.add_parser('send', help="transfer between two accounts")
+    send.add_argument('from_id', type=int)
+    send.add_argument('to_id', type=int)
+    send.add_argument('amount', help="amount in dollars, e.g. 12.50")
+
+    batch = subparsers.add_parser('batch', help="pay many accounts from one funding account")
+    batch.add_argument('run_id')
+    batch.add_argument('from_id', type=int)
+    batch.add_argument('file', help=".csv or .jsonl file of user_id and amount (dollars), optionally .gz")
+    batch.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="transfers per transaction")
+
+    args = parser.parse_args()
+    db_name = get_db_name(args.db)
+    if args.command == 'send':
+        payer, payee = transfer(args.from_id, args.to_id, to_cents(args.amount), db_name)
+        print(f"Transferred {args.amount} from {args.from_id} (balance {format_cents(payer)}) "
+              f"to {args.to_id} (balance {format_cents(payee)})")
+        return
+
+    report = run_batch(args.run_id, args.from_id, read_batch(args.file), args.chunk_size, db_name)
+    print(f"transfer run {report['run_id']}: {report['transfers']} transfers of {format_cents(report['total'])} total; "
+          f"{report['posted']} posted in {report['seconds']:.2f}s ({report['transfers_per_second']:.0f} transfers/s)")
+
+
+if __name__ == "__main__":
+    main()